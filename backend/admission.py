@@ -0,0 +1,105 @@
+import abc
+import math
+import time
+from collections import OrderedDict
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class BucketStore(abc.ABC):
+    """Token-bucket state keyed by client.
+
+    take() spends one token from the bucket `key`, which refills at `rate`
+    tokens per second up to `burst`, and returns 0 on success or the seconds
+    until a token is available. A backend shared between processes (Redis,
+    for example) plugs in by implementing take() atomically.
+    """
+
+    @abc.abstractmethod
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        ...
+
+
+class MemoryBucketStore(BucketStore):
+    """Per-process buckets, at most max_keys of them. The least recently used
+    bucket is dropped first; a dropped bucket comes back full."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class AdmissionTicket:
+    """Holds one of the controller's concurrency slots until exited."""
+
+    def __init__(self, controller: 'AdmissionController'):
+        self.controller = controller
+        self.started = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.controller._release(time.monotonic() - self.started)
+
+
+class AdmissionController:
+    """Decides whether an auth request may go on to bcrypt at all.
+
+    A request must get a token from its client IP's bucket and from its
+    email's bucket (429 otherwise), then a slot under max_concurrent (503
+    otherwise). All of it runs before the request reads the database or
+    touches the hash pool, so a rejected request costs almost nothing.
+    """
+
+    def __init__(self, store: BucketStore, ip_rate: float, ip_burst: float,
+                 email_rate: float, email_burst: float, max_concurrent: int):
+        self.store = store
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+        self.email_rate = email_rate
+        self.email_burst = email_burst
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        # Smoothed time a request holds its slot; a 503 suggests retrying
+        # after about one of these, when the next slot should free up.
+        self.average_seconds = 0.5
+
+    async def admit(self, ip: str, email: str) -> AdmissionTicket:
+        wait = await self.store.take(f"ip:{ip}", self.ip_rate, self.ip_burst)
+        if wait:
+            raise AdmissionRejected(429, "ip", wait)
+        wait = await self.store.take(f"email:{email.lower()}", self.email_rate, self.email_burst)
+        if wait:
+            raise AdmissionRejected(429, "email", wait)
+        if self.in_flight >= self.max_concurrent:
+            raise AdmissionRejected(503, "concurrency", self.average_seconds)
+        self.in_flight += 1
+        return AdmissionTicket(self)
+
+    def _release(self, seconds: float):
+        self.in_flight -= 1
+        self.average_seconds += 0.1 * (seconds - self.average_seconds)
@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# Quiz answers submissions are broken down by; every submission also counts
+# towards the (TOTAL, TOTAL) bucket of its day.
+DIMENSIONS = ("state", "category", "income")
+TOTAL = "all"
+
+COUNTERS = ("submissions", "eligible_matches", "no_match")
+
+
+def rollup_keys(doc: dict) -> list:
+    """(day, dimension, value) buckets a quiz submission counts towards."""
+    day = doc['submitted_at'][:10]
+    return [(day, TOTAL, TOTAL), *((day, d, str(doc.get(d))) for d in DIMENSIONS)]
+
+
+def rollup_id(day: str, dimension: str, value: str) -> str:
+    return f"{day}|{dimension}|{value}"
+
+
+def add_counts(counts: dict, doc: dict, eligible_count: int):
+    for key in rollup_keys(doc):
+        bucket = counts.get(key)
+        if bucket is None:
+            bucket = counts[key] = [0, 0, 0]
+        bucket[0] += 1
+        bucket[1] += eligible_count
+        bucket[2] += eligible_count == 0
+
+
+def today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+class RollupAggregator:
+    """Daily submission counters per dimension value, kept in quiz_rollups.
+
+    record() only bumps in-memory counters. A background task writes them
+    every flush_interval seconds as a single unordered bulk_write of $inc
+    upserts, one per bucket touched since the last flush, so the request
+    path never waits on the rollup collection. Counts from a failed flush
+    are merged back and go out with the next one.
+
+    Days before closed_before belong to a RollupBackfill, which replaces
+    their buckets with totals from the stored submissions; counting them
+    here as well would add the same submissions twice.
+    """
+
+    def __init__(self, collection, flush_interval: float = 5.0):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self.closed_before = ''
+        self._pending = {}
+        self._flushing = asyncio.Lock()
+        self._task = None
+        self.flushes = 0
+        self.buckets_written = 0
+        self.failed_flushes = 0
+        self.last_flush_seconds = 0.0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def record(self, doc: dict, eligible_count: int):
+        if doc['submitted_at'][:10] < self.closed_before:
+            return
+        add_counts(self._pending, doc, eligible_count)
+
+    async def close_days(self, before: str):
+        """Stop counting days before `before` and drop what is pending for
+        them, once any flush in flight has finished."""
+        async with self._flushing:
+            self.closed_before = max(self.closed_before, before)
+            self._pending = {key: v for key, v in self._pending.items() if key[0] >= self.closed_before}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        async with self._flushing:
+            await self._flush()
+
+    async def _flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        keys = list(batch)
+        requests = [
+            UpdateOne(
+                {"_id": rollup_id(*key)},
+                {"$inc": dict(zip(COUNTERS, batch[key])),
+                 "$setOnInsert": {"day": key[0], "dimension": key[1], "value": key[2]}},
+                upsert=True,
+            )
+            for key in keys
+        ]
+        start = time.perf_counter()
+        try:
+            await self.collection.bulk_write(requests, ordered=False)
+            self.buckets_written += len(keys)
+        except BulkWriteError as e:
+            failed = [keys[error['index']] for error in e.details['writeErrors']]
+            self._merge({key: batch[key] for key in failed})
+            self.buckets_written += len(keys) - len(failed)
+            self.failed_flushes += 1
+            logger.warning("Rollup flush: %d of %d buckets failed, retrying next flush", len(failed), len(keys))
+        except Exception:
+            self._merge(batch)
+            self.failed_flushes += 1
+            logger.exception("Rollup flush of %d buckets failed, retrying next flush", len(keys))
+        self.flushes += 1
+        self.last_flush_seconds = time.perf_counter() - start
+
+    def _merge(self, counts: dict):
+        for key, values in counts.items():
+            if key[0] < self.closed_before:
+                continue
+            bucket = self._pending.setdefault(key, [0, 0, 0])
+            for i, value in enumerate(values):
+                bucket[i] += value
+
+    async def stop(self):
+        """Cancel the flush loop and write whatever is still pending."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending_buckets": len(self._pending),
+            "flushes": self.flushes,
+            "buckets_written": self.buckets_written,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_seconds": self.last_flush_seconds,
+        }
+
+
+async def read_rollups(collection, dimension: str, start: str, end: str) -> dict:
+    """Per-day counts and range totals for one dimension; reads only the
+    rollup documents in range, never raw submissions."""
+    cursor = collection.find(
+        {"dimension": dimension, "day": {"$gte": start, "$lte": end}},
+        {"_id": 0, "day": 1, "value": 1, **{c: 1 for c in COUNTERS}},
+    ).sort([("day", 1), ("value", 1)])
+    days = await cursor.to_list(None)
+    totals = {}
+    for row in days:
+        total = totals.setdefault(row['value'], dict.fromkeys(COUNTERS, 0))
+        for counter in COUNTERS:
+            total[counter] += row.get(counter, 0)
+    return {"dimension": dimension, "start": start, "end": end, "days": days, "totals": totals}
+
+
+class RollupBackfill:
+    """Rebuilds quiz_rollups for closed days (before today, UTC) from raw
+    quiz_submissions.
+
+    Submissions are read in _id order, chunk_size at a time, resuming each
+    chunk after the last _id seen, with only the answer fields projected.
+    Counts for every closed day are then written with replace upserts, and
+    buckets no submission maps to any more are deleted. Today's buckets are
+    left to the live aggregator. Submissions stored before eligible_count
+    was recorded are matched again with match_count, which is given the
+    match_fields of the stored document.
+
+    Before reading, the backfill closes its days in `aggregator` and waits
+    for `drain`, which should return once every submission already
+    counted live is stored, so each one is counted by exactly one side.
+    """
+
+    def __init__(self, submissions, rollups, match_count, match_fields=(), chunk_size: int = 1000,
+                 aggregator: RollupAggregator = None, drain=None):
+        self.submissions = submissions
+        self.rollups = rollups
+        self.match_count = match_count
+        self.aggregator = aggregator
+        self.drain = drain
+        self.projection = {f: 1 for f in ("submitted_at", "eligible_count", *DIMENSIONS, *match_fields)}
+        self.chunk_size = chunk_size
+        self._task = None
+        self.status = {"state": "idle"}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> bool:
+        if self.running:
+            return False
+        self._task = asyncio.create_task(self._run(today()))
+        return True
+
+    async def _run(self, before: str):
+        self.status = {"state": "running", "before": before, "processed": 0, "rematched": 0,
+                       "started_at": datetime.now(timezone.utc).isoformat()}
+        try:
+            if self.aggregator:
+                await self.aggregator.close_days(before)
+            if self.drain:
+                await self.drain()
+            counts = {}
+            query = {"submitted_at": {"$lt": before}}
+            while True:
+                chunk = await self.submissions.find(query, self.projection).sort("_id", 1).limit(
+                    self.chunk_size).to_list(self.chunk_size)
+                if not chunk:
+                    break
+                for doc in chunk:
+                    eligible_count = doc.get('eligible_count')
+                    if eligible_count is None:
+                        eligible_count = self.match_count(doc)
+                        self.status["rematched"] += 1
+                    add_counts(counts, doc, eligible_count)
+                query["_id"] = {"$gt": chunk[-1]['_id']}
+                self.status["processed"] += len(chunk)
+                self.status["last_id"] = str(chunk[-1]['_id'])
+
+            ids = []
+            requests = []
+            for (day, dimension, value), values in counts.items():
+                ids.append(rollup_id(day, dimension, value))
+                requests.append(ReplaceOne(
+                    {"_id": ids[-1]},
+                    {"day": day, "dimension": dimension, "value": value, **dict(zip(COUNTERS, values))},
+                    upsert=True,
+                ))
+            for start in range(0, len(requests), self.chunk_size):
+                await self.rollups.bulk_write(requests[start:start + self.chunk_size], ordered=False)
+            stale = await self.rollups.delete_many({"day": {"$lt": before}, "_id": {"$nin": ids}})
+            self.status.update(state="done", buckets=len(requests), deleted=stale.deleted_count)
+        except asyncio.CancelledError:
+            self.status.update(state="cancelled")
+            raise
+        except Exception as e:
+            logger.exception("Rollup backfill failed")
+            self.status.update(state="failed", error=str(e))
+        self.status["finished_at"] = datetime.now(timezone.utc).isoformat()
+
+    async def stop(self):
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,59 @@
+"""Bulk eligibility throughput: per-row index.match_with_fallback vs
+vectorized match_batch, which return the same eligible positions and near
+misses.
+
+"distinct" rows are all different profiles; "repeated" rows are drawn from a
+pool of 500 profiles, closer to what a district upload looks like. At large
+catalogs both paths are dominated by turning each row's matches into a
+Python list, which the batch path cannot avoid either, so on distinct
+profiles it is only slightly ahead; the win comes from evaluating repeated
+profiles once. Each timing is the best of REPEATS runs.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_batch
+"""
+import random
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_profiles, make_schemes
+from matching import EligibilityIndex
+from server import QuizSubmission
+
+SCHEMES = (100, 1_000, 10_000)
+ROWS = 20_000
+REPEATS = 3
+
+
+def best_of(run) -> tuple:
+    """(result, seconds) of the fastest of REPEATS calls."""
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+def main():
+    pool = make_profiles(500, seed=3)
+    workloads = {
+        "distinct": make_profiles(ROWS),
+        "repeated": random.Random(5).choices(pool, k=ROWS),
+    }
+    print(f"{'workload':>9} {'schemes':>8} {'per-row s':>10} {'batch s':>8} {'rows/s':>10}")
+    for name, profiles in workloads.items():
+        frame = pd.DataFrame(profiles)
+        quizzes = [QuizSubmission(**p) for p in profiles]
+        for size in SCHEMES:
+            index = EligibilityIndex(make_schemes(size))
+            expected, per_row = best_of(lambda: [index.match_with_fallback(q) for q in quizzes])
+            batched, batch = best_of(lambda: list(index.match_batch(frame)))
+            assert [tuple(r) for r in batched] == [tuple(r) for r in expected]
+            print(f"{name:>9} {size:>8} {per_row:>10.2f} {batch:>8.2f} {ROWS / batch:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Near-miss ranking cost: scoring every scheme in Python vs EligibilityIndex.near_misses.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_fallback
+"""
+import time
+
+from benchmarks.synthetic import make_profiles, make_schemes
+from matching import FALLBACK_LIMIT, EligibilityIndex
+from server import QuizSubmission
+
+SIZES = (1_000, 10_000, 50_000)
+PROFILES = 200
+
+
+def failed_criteria(quiz, scheme) -> list:
+    eligibility = scheme.get('eligibility', {})
+    failed = []
+    if not eligibility.get('age_min', quiz.age) <= quiz.age <= eligibility.get('age_max', quiz.age):
+        failed.append('age')
+    for field, accepted in eligibility.items():
+        if field not in ('age_min', 'age_max') and getattr(quiz, field) not in accepted:
+            failed.append(field)
+    return failed
+
+
+def scan(index, quiz, k=FALLBACK_LIMIT) -> list:
+    """Reference ranking: fewest failed criteria first, then catalog order."""
+    scored = []
+    for position, scheme in enumerate(index.schemes):
+        failed = failed_criteria(quiz, scheme)
+        if failed:
+            scored.append((len(failed), position, failed))
+    scored.sort()
+    return [(position, failed) for _, position, failed in scored[:k]]
+
+
+def per_call_us(fn, quizzes) -> float:
+    start = time.perf_counter()
+    for quiz in quizzes:
+        fn(quiz)
+    return (time.perf_counter() - start) / len(quizzes) * 1e6
+
+
+def main():
+    quizzes = [QuizSubmission(**p) for p in make_profiles(PROFILES)]
+    print(f"{'schemes':>8} {'scan us':>10} {'ranked us':>10} {'speedup':>8}")
+    for size in SIZES:
+        index = EligibilityIndex(make_schemes(size))
+
+        def ranked(quiz):
+            rows = index.rows(quiz)
+            return index.near_misses(rows, index.combine(rows), FALLBACK_LIMIT)
+
+        for quiz in quizzes[:20]:
+            expected = scan(index, quiz)
+            assert [(p, sorted(f)) for p, _, f in ranked(quiz)] == [(p, sorted(f)) for p, f in expected]
+
+        slow = per_call_us(lambda q: scan(index, q), quizzes[:20])
+        fast = per_call_us(ranked, quizzes)
+        print(f"{size:>8} {slow:>10.1f} {fast:>10.1f} {slow / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
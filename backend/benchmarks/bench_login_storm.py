@@ -0,0 +1,73 @@
+"""Login storm: bcrypt inline on the event loop vs PasswordHasher's pool.
+
+Fires LOGINS concurrent password verifications while a probe coroutine
+stands in for every other route: it wakes every PROBE_INTERVAL seconds and
+records how late it was scheduled. Before this change bcrypt ran inline, so
+the probe lag was as large as the whole storm.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_login_storm [rounds]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from passwords import PasswordHasher, _hash, _verify
+
+LOGINS = 64
+PROBE_INTERVAL = 0.005
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+async def storm(verify, hashed):
+    login_latency = []
+    probe_lag = []
+    done = asyncio.Event()
+
+    async def login():
+        start = time.perf_counter()
+        assert await verify("correct horse", hashed)
+        login_latency.append(time.perf_counter() - start)
+
+    async def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL)
+            probe_lag.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+    prober = asyncio.create_task(probe())
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(LOGINS)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await prober
+    return login_latency, probe_lag, elapsed
+
+
+async def main(rounds: int):
+    hashed = _hash("correct horse", rounds)
+
+    async def inline(password, hashed):
+        return _verify(password, hashed)
+
+    hasher = PasswordHasher(rounds=rounds, workers=4, queue_size=LOGINS)
+    modes = {"inline": inline, "pool": hasher.verify}
+    print(f"bcrypt rounds={rounds}, {LOGINS} concurrent logins")
+    print(f"{'mode':>7} {'logins/s':>9} {'login p50 ms':>13} {'login p99 ms':>13} {'probe p50 ms':>13} {'probe p99 ms':>13}")
+    for name, verify in modes.items():
+        logins, probes, elapsed = await storm(verify, hashed)
+        print(f"{name:>7} {LOGINS / elapsed:>9.1f} {statistics.median(logins) * 1e3:>13.1f} "
+              f"{percentile(logins, 0.99) * 1e3:>13.1f} {statistics.median(probes) * 1e3:>13.1f} "
+              f"{percentile(probes, 0.99) * 1e3:>13.1f}")
+    hasher.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 12))
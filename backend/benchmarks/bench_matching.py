@@ -0,0 +1,43 @@
+"""Per-quiz matching cost: linear check_eligibility scan vs EligibilityIndex.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_matching
+"""
+import time
+
+from benchmarks.synthetic import make_profiles, make_schemes
+from matching import EligibilityIndex
+from server import QuizSubmission, check_eligibility
+
+SIZES = (10, 1_000, 10_000, 50_000)
+PROFILES = 200
+
+
+def per_call_us(fn, quizzes) -> float:
+    start = time.perf_counter()
+    for quiz in quizzes:
+        fn(quiz)
+    return (time.perf_counter() - start) / len(quizzes) * 1e6
+
+
+def main():
+    quizzes = [QuizSubmission(**p) for p in make_profiles(PROFILES)]
+    print(f"{'schemes':>8} {'compile ms':>11} {'scan us':>10} {'index us':>10} {'speedup':>8}")
+    for size in SIZES:
+        schemes = make_schemes(size)
+        start = time.perf_counter()
+        index = EligibilityIndex(schemes)
+        compile_ms = (time.perf_counter() - start) * 1e3
+
+        for quiz in quizzes[:20]:
+            expected = [i for i, s in enumerate(schemes) if check_eligibility(quiz, s)]
+            assert index.match(quiz) == expected
+
+        scan = per_call_us(lambda q: [s for s in schemes if check_eligibility(q, s)], quizzes)
+        indexed = per_call_us(index.match, quizzes)
+        print(f"{size:>8} {compile_ms:>11.1f} {scan:>10.1f} {indexed:>10.1f} {scan / indexed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Signup / save write paths against a real mongod: two round trips vs one.
+
+Compares the old find_one + insert_one pattern with the single
+insert_one / upsert used now (backed by the unique indexes from
+indexes.py). Round trips are counted with a pymongo command listener.
+Uses a throwaway database that is dropped afterwards.
+
+Run from the backend directory with a local mongod:
+
+    MONGO_URL=mongodb://localhost:27017 python -m benchmarks.bench_mongo_writes
+"""
+import asyncio
+import os
+import statistics
+import time
+import uuid
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.errors import DuplicateKeyError
+
+from indexes import ensure_indexes
+
+OPERATIONS = 2000
+SEED_USERS = 50_000
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def timed(fn, items):
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        await fn(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name, latencies, commands):
+    ordered = sorted(latencies)
+    p99 = ordered[int(len(ordered) * 0.99)]
+    print(f"{name:>28} {commands / len(latencies):>10.2f} {statistics.median(latencies) * 1e3:>9.3f} {p99 * 1e3:>9.3f}")
+
+
+async def main():
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'), event_listeners=[counter])
+    db = client[f"bench_{uuid.uuid4().hex[:8]}"]
+    try:
+        await db.users.insert_many([{"id": str(i), "email": f"seed{i}@example.com"} for i in range(SEED_USERS)])
+        emails = [f"user{i}@example.com" for i in range(OPERATIONS)]
+
+        async def signup_two_trips(email):
+            if await db.users.find_one({"email": email}, {"_id": 0}):
+                return
+            await db.users.insert_one({"id": email, "email": email})
+
+        async def signup_one_trip(email):
+            try:
+                await db.users.insert_one({"id": email, "email": "v2" + email})
+            except DuplicateKeyError:
+                pass
+
+        async def save_two_trips(scheme_id):
+            query = {"user_id": "u1", "scheme_id": scheme_id}
+            if await db.saved_schemes.find_one(query, {"_id": 0}):
+                return
+            await db.saved_schemes.insert_one(dict(query))
+
+        async def save_one_trip(scheme_id):
+            try:
+                await db.saved_schemes.update_one(
+                    {"user_id": "u2", "scheme_id": scheme_id}, {"$setOnInsert": {"saved_at": "now"}}, upsert=True)
+            except DuplicateKeyError:
+                pass
+
+        scheme_ids = [f"scheme_{i % 200}" for i in range(OPERATIONS)]
+        print(f"{'path':>28} {'trips/op':>10} {'p50 ms':>9} {'p99 ms':>9}")
+        counter.count = 0
+        report("signup find+insert, no idx", await timed(signup_two_trips, emails), counter.count)
+        counter.count = 0
+        report("save find+insert, no idx", await timed(save_two_trips, scheme_ids), counter.count)
+
+        await ensure_indexes(db)
+        counter.count = 0
+        report("signup insert, unique idx", await timed(signup_one_trip, emails), counter.count)
+        counter.count = 0
+        report("save upsert, unique idx", await timed(save_one_trip, scheme_ids), counter.count)
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""Per-quiz response build time: copying scheme dicts and encoding them with
+FastAPI's default JSON path vs splicing CatalogSnapshot's pre-encoded bytes.
+
+Both sides start from the same eligible/fallback positions, so only response
+assembly and serialization are timed.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_payloads
+"""
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from benchmarks.synthetic import make_profiles, make_schemes
+from catalog import CatalogSnapshot
+from responses import FragmentJSONResponse, Fragments
+from server import QuizSubmission
+
+SIZES = (10, 1_000, 10_000)
+QUIZZES = 50
+
+
+def copy_and_encode(schemes, eligible, fallback):
+    eligible_schemes = []
+    for i in eligible:
+        scheme_copy = schemes[i].copy()
+        del scheme_copy['eligibility']
+        scheme_copy['eligibility_match'] = 'Eligible'
+        eligible_schemes.append(scheme_copy)
+    fallback_schemes = []
+    for i in fallback:
+        scheme_copy = schemes[i].copy()
+        del scheme_copy['eligibility']
+        scheme_copy['eligibility_match'] = 'May be eligible - Check details'
+        fallback_schemes.append(scheme_copy)
+    content = {"eligible_schemes": eligible_schemes, "fallback_schemes": fallback_schemes}
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def splice(catalog, eligible, fallback):
+    return FragmentJSONResponse({
+        "eligible_schemes": Fragments(catalog.eligible_json[i] for i in eligible),
+        "fallback_schemes": Fragments(catalog.fallback_json[i] for i in fallback),
+    }).body
+
+
+def per_quiz_ms(fn, cases):
+    start = time.perf_counter()
+    for case in cases:
+        fn(*case)
+    return (time.perf_counter() - start) / len(cases) * 1e3
+
+
+def main():
+    quizzes = [QuizSubmission(**p) for p in make_profiles(QUIZZES)]
+    print(f"{'schemes':>8} {'avg matches':>12} {'copy+encode ms':>15} {'splice ms':>10} {'speedup':>8}")
+    for size in SIZES:
+        catalog = CatalogSnapshot(make_schemes(size))
+        cases = [(catalog.index.match(q), [0, 1, 2]) for q in quizzes]
+        matches = sum(len(e) for e, _ in cases) / len(cases)
+        assert copy_and_encode(catalog.schemes, *cases[0]) == splice(catalog, *cases[0])
+        old = per_quiz_ms(lambda e, f: copy_and_encode(catalog.schemes, e, f), cases)
+        new = per_quiz_ms(lambda e, f: splice(catalog, e, f), cases)
+        print(f"{size:>8} {matches:>12.0f} {old:>15.3f} {new:>10.3f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Single-answer what-if cost: full match plus diff vs EligibilityIndex.reevaluate.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_reevaluate
+"""
+import random
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import VOCABULARY, make_profiles, make_schemes
+from matching import EligibilityIndex
+from server import QuizSubmission
+
+SIZES = (1_000, 10_000, 50_000)
+PROFILES = 200
+
+
+def tweak(quiz, rng):
+    """The quiz with one answer changed, as a user would on the quiz page."""
+    field = rng.choice(['age', *VOCABULARY])
+    if field == 'age':
+        return quiz.model_copy(update={'age': rng.randint(14, 80)})
+    return quiz.model_copy(update={field: rng.choice(VOCABULARY[field])})
+
+
+def full_diff(index, before, after, eligible):
+    """The what-if answered by matching from scratch and diffing."""
+    now = np.flatnonzero(index.mask(after))
+    return np.setdiff1d(now, eligible, assume_unique=True), np.setdiff1d(eligible, now, assume_unique=True)
+
+
+def per_call_us(fn, cases) -> float:
+    start = time.perf_counter()
+    for case in cases:
+        fn(*case)
+    return (time.perf_counter() - start) / len(cases) * 1e6
+
+
+def main():
+    rng = random.Random(3)
+    quizzes = [QuizSubmission(**p) for p in make_profiles(PROFILES)]
+    print(f"{'schemes':>8} {'match+diff us':>14} {'reevaluate us':>14} {'speedup':>8}")
+    for size in SIZES:
+        index = EligibilityIndex(make_schemes(size))
+        # Stored results are position arrays, as chained result tokens keep them.
+        cases = [(q, tweak(q, rng), np.flatnonzero(index.mask(q))) for q in quizzes]
+
+        for before, after, eligible in cases:
+            added, removed = index.reevaluate(before, after, eligible)
+            assert sorted(set(eligible.tolist()) - set(removed) | set(added)) == index.match(after)
+            assert [added, removed] == [a.tolist() for a in full_diff(index, before, after, eligible)]
+
+        full = per_call_us(lambda *case: full_diff(index, *case), cases)
+        incremental = per_call_us(index.reevaluate, cases)
+        print(f"{size:>8} {full:>14.1f} {incremental:>14.1f} {full / incremental:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Re-match throughput after a catalog change: stored profiles per hour.
+
+Fills an in-memory user_results with PROFILES results matched against one
+synthetic catalog, then times ResultRematcher bringing them up to date
+with a changed catalog, end to end and for the matching and diffing alone
+(ResultRematcher._changes), which is what bounds it once the database
+keeps up. A real mongod adds the cursor reads and bulk writes on top.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_rematch
+"""
+import asyncio
+import time
+
+from benchmarks.memory_db import MemoryDatabase
+from benchmarks.synthetic import make_profiles, make_schemes
+from catalog import CatalogSnapshot
+from results import ResultRematcher, result_doc
+from server import QUIZ_FIELDS, QuizSubmission
+
+PROFILES = 100_000
+SIZES = (100, 1_000, 10_000)
+CHUNK = 5000
+
+
+async def fill(db, catalog, profiles):
+    docs = []
+    for n, profile in enumerate(profiles):
+        eligible = catalog.index.match(QuizSubmission(**profile))
+        docs.append({'_id': f"user{n:08d}", **result_doc(profile, 't', catalog.version, [catalog.ids[i] for i in eligible])})
+    await db.user_results.insert_many(docs)
+
+
+async def run(size: int, profiles: list):
+    db = MemoryDatabase()
+    before = CatalogSnapshot(make_schemes(size, seed=1))
+    # Same catalog with one scheme in a hundred redrawn, like an edit.
+    after_schemes = make_schemes(size, seed=1)
+    for position, scheme in enumerate(make_schemes(size, seed=2, rules=0.5)):
+        if position % 100 == 0:
+            after_schemes[position]['eligibility'] = scheme['eligibility']
+    after = CatalogSnapshot(after_schemes)
+    await fill(db, before, profiles)
+
+    rematcher = ResultRematcher(db.user_results, db.result_rematch_jobs, QUIZ_FIELDS, chunk_size=CHUNK)
+    chunk = await db.user_results.find({}, rematcher.projection).limit(CHUNK).to_list(CHUNK)
+    start = time.perf_counter()
+    rematcher._changes(after, chunk)
+    match_rate = len(chunk) / (time.perf_counter() - start) * 3600
+
+    start = time.perf_counter()
+    await rematcher.start(after)
+    await rematcher._task
+    elapsed = time.perf_counter() - start
+    assert rematcher.status['state'] == 'done' and rematcher.status['processed'] == len(profiles)
+    return elapsed, rematcher.status['changed'], match_rate
+
+
+def main():
+    profiles = make_profiles(PROFILES)
+    print(f"{'schemes':>8} {'profiles':>9} {'job s':>7} {'changed':>8} {'job M/h':>8} {'match M/h':>10}")
+    for size in SIZES:
+        elapsed, changed, match_rate = asyncio.run(run(size, profiles))
+        print(f"{size:>8} {len(profiles):>9} {elapsed:>7.1f} {changed:>8} {len(profiles) / elapsed * 3600 / 1e6:>8.1f}"
+              f" {match_rate / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Eligibility rule cost per scheme: interpreted vs compiled.
+
+For catalogs where a fraction of schemes carry an all/any/not rule, compares
+evaluating rules with rules.evaluate (re-reading the rule dict on every
+call, as check_eligibility does) against the functions compile_rules
+generates once per catalog load, and the full check_eligibility scan
+against EligibilityIndex.match with its rule criterion.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_rules
+"""
+import time
+
+from benchmarks.synthetic import make_profiles, make_schemes
+from matching import EligibilityIndex
+from rules import compile_rules, evaluate, scheme_rule
+from server import QuizSubmission, check_eligibility
+
+SIZES = (1_000, 10_000, 50_000)
+RULE_FRACTIONS = (0.1, 0.5, 1.0)
+PROFILES = 50
+
+
+def per_scheme_ns(fn, quizzes, count: int) -> float:
+    start = time.perf_counter()
+    for quiz in quizzes:
+        fn(quiz)
+    return (time.perf_counter() - start) / (len(quizzes) * max(count, 1)) * 1e9
+
+
+def main():
+    quizzes = [QuizSubmission(**p) for p in make_profiles(PROFILES)]
+    print(f"{'schemes':>8} {'rules':>6} {'compile ms':>11} {'interp ns':>10} {'compiled ns':>12} {'speedup':>8}"
+          f" {'scan ns':>8} {'index ns':>9}")
+    for size in SIZES:
+        for fraction in RULE_FRACTIONS:
+            schemes = make_schemes(size, rules=fraction)
+            ruled = [s for s in schemes if 'rule' in s['eligibility']]
+            raw = [s['eligibility']['rule'] for s in ruled]
+            start = time.perf_counter()
+            # What a catalog load pays: parse, simplify against the flat
+            # criteria and generate the functions.
+            predicates = compile_rules([scheme_rule(s) for s in ruled])
+            compile_ms = (time.perf_counter() - start) * 1e3
+            index = EligibilityIndex(schemes)
+
+            # The simplified rule only has to agree with the original where
+            # the scheme's flat criteria hold.
+            flat = [{**s, 'eligibility': {k: v for k, v in s['eligibility'].items() if k != 'rule'}} for s in ruled]
+            for quiz in quizzes[:10]:
+                for scheme, rule, predicate in zip(flat, raw, predicates):
+                    if check_eligibility(quiz, scheme):
+                        assert predicate(quiz) == evaluate(rule, quiz)
+                expected = [i for i, s in enumerate(schemes) if check_eligibility(quiz, s)]
+                assert index.match(quiz) == expected
+
+            interpreted = per_scheme_ns(lambda q: [evaluate(r, q) for r in raw], quizzes, len(raw))
+            compiled = per_scheme_ns(lambda q: [p(q) for p in predicates], quizzes, len(predicates))
+            scan = per_scheme_ns(lambda q: [s for s in schemes if check_eligibility(q, s)], quizzes, size)
+            indexed = per_scheme_ns(index.match, quizzes, size)
+            print(f"{size:>8} {fraction:>6.0%} {compile_ms:>11.1f} {interpreted:>10.0f} {compiled:>12.0f}"
+                  f" {interpreted / compiled:>7.1f}x {scan:>8.0f} {indexed:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
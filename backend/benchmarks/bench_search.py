@@ -0,0 +1,82 @@
+"""Typeahead latency: substring scan vs SearchIndex, one query per keystroke.
+
+Every word of a few multi-word queries is typed a letter at a time and each
+prefix is searched, as the frontend search box would. Also times a full
+index build and, as a catalog swap does it, copying the serving index and
+updating the copy after 1% of the catalog changes.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_search
+"""
+import time
+
+from benchmarks.synthetic import WORDS, make_schemes
+from search import FIELD_WEIGHTS, SearchIndex, field_text
+
+SIZES = (1_000, 10_000, 50_000)
+QUERIES = ["farmer pension", "women health insurance", "student scholarship", "rural housing loan"]
+
+
+def keystrokes(query: str) -> list:
+    return [query[:i] for i in range(1, len(query) + 1) if not query[i - 1].isspace()]
+
+
+def scan(schemes, query: str, limit: int = 10) -> list:
+    """What the search box would do without an index: substring-match every
+    scheme and rank by how often the query words occur."""
+    needles = query.lower().split()
+    hits = []
+    for scheme in schemes:
+        text = ' '.join(field_text(scheme.get(f)) for f in FIELD_WEIGHTS).lower()
+        count = sum(text.count(n) for n in needles)
+        if count:
+            hits.append((-count, scheme['id']))
+    return [scheme_id for _, scheme_id in sorted(hits)[:limit]]
+
+
+def percentiles(samples) -> tuple:
+    samples = sorted(samples)
+    return samples[len(samples) // 2] * 1e3, samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e3
+
+
+def timed(fn, prefixes) -> list:
+    out = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        fn(prefix)
+        out.append(time.perf_counter() - start)
+    return out
+
+
+def main():
+    prefixes = [p for q in QUERIES for p in keystrokes(q)]
+    print(f"{'schemes':>8} {'build ms':>9} {'update ms':>10} {'scan p50':>9} {'scan p99':>9} "
+          f"{'index p50':>10} {'index p99':>10}  (per keystroke, ms)")
+    for size in SIZES:
+        schemes = make_schemes(size)
+        index = SearchIndex()
+        start = time.perf_counter()
+        index.update(schemes)
+        build_ms = (time.perf_counter() - start) * 1e3
+
+        changed = [dict(s) for s in schemes]
+        for i in range(0, size, 100):
+            changed[i]['description'] += f" and {WORDS[i % len(WORDS)]}"
+        before = index.search(QUERIES[0])
+        start = time.perf_counter()
+        updated = index.copy()
+        assert updated.update(changed)["changed"] == len(range(0, size, 100))
+        update_ms = (time.perf_counter() - start) * 1e3
+        # The serving index is untouched by its copy's update.
+        assert index.search(QUERIES[0]) == before
+        index = updated
+
+        scan_p50, scan_p99 = percentiles(timed(lambda p: scan(changed, p), prefixes))
+        index_p50, index_p99 = percentiles(timed(lambda p: index.search(p), prefixes))
+        print(f"{size:>8} {build_ms:>9.0f} {update_ms:>10.1f} {scan_p50:>9.2f} {scan_p99:>9.2f} "
+              f"{index_p50:>10.3f} {index_p99:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""Concurrent load test for server:app.
+
+Each virtual user signs up, logs in, submits quizzes, then saves, lists and
+unsaves schemes. Per-route p50/p95/p99 latency, throughput and error rate
+are printed and written as JSON so runs can be compared across commits.
+
+Run from the backend directory, e.g.:
+
+    # ASGI in-process against the in-memory Mongo stand-in
+    python -m benchmarks.loadtest --users 200 --concurrency 50 --bcrypt-rounds 4
+
+    # real HTTP through uvicorn, against a local mongod
+    python -m benchmarks.loadtest --mode uvicorn --mongo mongodb://localhost:27017
+
+    # an already running server (its own database), compared to a baseline
+    python -m benchmarks.loadtest --url http://localhost:8000 --baseline before.json
+
+--bcrypt-rounds lowers the hash cost for in-process runs when the point is
+the non-auth routes; leave it unset to measure signup/login as deployed.
+Every virtual user sends its own X-Forwarded-For address; --admission turns
+auth admission control on for in-process runs, trusting one proxy hop, so
+its per-IP buckets see one client per user rather than one in total.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.synthetic import make_profiles
+
+ROUTES = ("signup", "login", "quiz_submit", "save", "saved", "unsave")
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {route: [] for route in ROUTES}
+        self.errors = {route: 0 for route in ROUTES}
+
+    async def call(self, route, request):
+        start = time.perf_counter()
+        try:
+            response = await request
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.latencies[route].append(time.perf_counter() - start)
+        if not ok:
+            self.errors[route] += 1
+        return response if ok else None
+
+    def summary(self, elapsed: float) -> dict:
+        routes = {}
+        for route in ROUTES:
+            samples = sorted(self.latencies[route])
+            if not samples:
+                continue
+
+            def pct(p):
+                return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1e3, 3)
+
+            routes[route] = {
+                "count": len(samples),
+                "errors": self.errors[route],
+                "error_rate": round(self.errors[route] / len(samples), 4),
+                "rps": round(len(samples) / elapsed, 1),
+                "p50_ms": pct(0.50),
+                "p95_ms": pct(0.95),
+                "p99_ms": pct(0.99),
+                "max_ms": round(samples[-1] * 1e3, 3),
+            }
+        total = sum(r["count"] for r in routes.values())
+        errors = sum(r["errors"] for r in routes.values())
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "requests": total,
+            "rps": round(total / elapsed, 1),
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "routes": routes,
+        }
+
+
+async def session(client, recorder, profiles, quizzes, scheme_ids, rng):
+    email = f"load-{uuid.uuid4().hex}@example.com"
+    password = "load-test-password"
+    forwarded = {"X-Forwarded-For": f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"}
+    response = await recorder.call("signup", client.post(
+        "/api/auth/signup", json={"email": email, "password": password, "name": "Load Test"}, headers=forwarded))
+    if response is None:
+        return
+    response = await recorder.call("login", client.post(
+        "/api/auth/login", json={"email": email, "password": password}, headers=forwarded))
+    if response is None:
+        return
+    headers = {**forwarded, "Authorization": f"Bearer {response.json()['token']}"}
+
+    for _ in range(quizzes):
+        await recorder.call("quiz_submit", client.post(
+            "/api/quiz/submit", json=rng.choice(profiles), headers=headers))
+
+    saved = rng.sample(scheme_ids, min(3, len(scheme_ids)))
+    for scheme_id in saved:
+        await recorder.call("save", client.post(f"/api/schemes/save/{scheme_id}", headers=headers))
+    await recorder.call("saved", client.get("/api/schemes/saved", headers=headers))
+    for scheme_id in saved:
+        await recorder.call("unsave", client.delete(f"/api/schemes/unsave/{scheme_id}", headers=headers))
+
+
+async def wait_ready(client, timeout: float = 60.0):
+    # Signup and saves answer 503 until warm-up has built their indexes.
+    deadline = time.perf_counter() + timeout
+    while (await client.get("/ready")).status_code != 200:
+        if time.perf_counter() > deadline:
+            raise SystemExit("server did not become ready")
+        await asyncio.sleep(0.05)
+
+
+async def run(client, args) -> dict:
+    await wait_ready(client)
+    rng = random.Random(args.seed)
+    profiles = make_profiles(500, seed=args.seed)
+    catalog = (await client.get("/api/schemes")).json()
+    scheme_ids = [s["id"] for s in catalog["schemes"]]
+    recorder = Recorder()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded():
+        async with semaphore:
+            await session(client, recorder, profiles, args.quizzes, scheme_ids, rng)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded() for _ in range(args.users)))
+    return recorder.summary(time.perf_counter() - start)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.asynccontextmanager
+async def in_process_client(args):
+    # Imported here so --bcrypt-rounds and friends land in the environment first.
+    import server
+    from metrics import InstrumentedDatabase
+
+    dropped = None
+    if args.mongo == "memory":
+        from benchmarks.memory_db import MemoryDatabase
+        server.db = InstrumentedDatabase(MemoryDatabase(), server.MONGO_LATENCY)
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        server.client = AsyncIOMotorClient(args.mongo)
+        server.db = InstrumentedDatabase(server.client[f"loadtest_{uuid.uuid4().hex[:8]}"], server.MONGO_LATENCY)
+        dropped = server.db.name
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    try:
+        if args.mode == "asgi":
+            async with server.app.router.lifespan_context(server.app):
+                transport = httpx.ASGITransport(app=server.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+                    yield client
+        else:
+            import uvicorn
+            port = free_port()
+            config = uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning")
+            uvicorn_server = uvicorn.Server(config)
+            task = asyncio.create_task(uvicorn_server.serve())
+            while not uvicorn_server.started:
+                await asyncio.sleep(0.01)
+            try:
+                async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+                    yield client
+            finally:
+                uvicorn_server.should_exit = True
+                await task
+    finally:
+        if dropped:
+            from motor.motor_asyncio import AsyncIOMotorClient
+            cleanup = AsyncIOMotorClient(args.mongo)
+            await cleanup.drop_database(dropped)
+            cleanup.close()
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def print_summary(result: dict):
+    print(f"{'route':>12} {'count':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for route, r in result["routes"].items():
+        print(f"{route:>12} {r['count']:>7} {r['rps']:>8.1f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+              f"{r['p99_ms']:>9.2f} {r['error_rate']:>7.2%}")
+    print(f"{'total':>12} {result['requests']:>7} {result['rps']:>8.1f} {'':>29} {result['error_rate']:>7.2%}")
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> bool:
+    """Print p95 deltas against a previous run; True if any route regressed."""
+    regressed = False
+    print(f"\np95 vs baseline {baseline['meta'].get('commit') or '?'} (threshold {threshold:.0%})")
+    for route, r in result["routes"].items():
+        before = baseline["routes"].get(route)
+        if not before or not before["p95_ms"]:
+            continue
+        change = r["p95_ms"] / before["p95_ms"] - 1
+        flag = "REGRESSION" if change > threshold else ""
+        regressed |= bool(flag)
+        print(f"{route:>12} {before['p95_ms']:>9.2f} -> {r['p95_ms']:>9.2f} {change:>+8.1%} {flag}")
+    return regressed
+
+
+async def main(args) -> int:
+    if args.url:
+        client_context = httpx.AsyncClient(base_url=args.url, limits=httpx.Limits(max_connections=args.concurrency),
+                                           timeout=60)
+    else:
+        client_context = in_process_client(args)
+    async with client_context as client:
+        result = await run(client, args)
+
+    result["meta"] = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "target": args.url or f"{args.mode} + {'memory' if args.mongo == 'memory' else 'mongod'}",
+        "users": args.users,
+        "concurrency": args.concurrency,
+        "quizzes_per_user": args.quizzes,
+        "bcrypt_rounds": os.environ.get("BCRYPT_ROUNDS"),
+        "admission": os.environ.get("AUTH_ADMISSION"),
+    }
+    print_summary(result)
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nwrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            if compare(result, json.load(f), args.threshold):
+                return 1
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mode", choices=("asgi", "uvicorn"), default="asgi",
+                        help="how to boot server:app in-process (ignored with --url)")
+    parser.add_argument("--mongo", default="memory", help="'memory' or a mongodb:// URL for in-process runs")
+    parser.add_argument("--url", help="load an already running server instead of booting one")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--quizzes", type=int, default=5, help="quiz submissions per user")
+    parser.add_argument("--bcrypt-rounds", type=int, help="override BCRYPT_ROUNDS for in-process runs")
+    parser.add_argument("--admission", action="store_true",
+                        help="enable auth admission control for in-process runs (off by default)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="loadtest-results.json")
+    parser.add_argument("--baseline", help="previous results JSON to compare p95 latency against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p95 slowdown treated as a regression")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.bcrypt_rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    os.environ["AUTH_ADMISSION"] = "true" if args.admission else "false"
+    if args.admission:
+        os.environ.setdefault("AUTH_TRUSTED_PROXIES", "1")
+    sys.exit(asyncio.run(main(args)))
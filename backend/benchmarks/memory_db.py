@@ -0,0 +1,357 @@
+"""In-memory stand-in for the subset of Motor the server uses.
+
+Good enough to drive server:app end to end without a mongod: equality and
+range filters, $or/$and, projections, sort/skip/limit cursors, the update
+operators the server issues, bulk_write, and unique indexes (raising
+DuplicateKeyError or BulkWriteError like the real thing). Everything is async to match Motor's call shapes, but
+nothing ever yields to the loop, so it measures the server, not the DB.
+"""
+import copy
+from types import SimpleNamespace
+
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult
+
+_RANGE_OPS = {
+    '$gt': lambda value, arg: value > arg,
+    '$gte': lambda value, arg: value >= arg,
+    '$lt': lambda value, arg: value < arg,
+    '$lte': lambda value, arg: value <= arg,
+}
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == '$or':
+            if not any(matches(doc, q) for q in condition):
+                return False
+            continue
+        if key == '$and':
+            if not all(matches(doc, q) for q in condition):
+                return False
+            continue
+        value = doc.get(key)
+        if isinstance(condition, dict) and condition and next(iter(condition)).startswith('$'):
+            for op, arg in condition.items():
+                if op in _RANGE_OPS:
+                    if value is None or not _RANGE_OPS[op](value, arg):
+                        return False
+                elif op == '$in':
+                    if value not in arg:
+                        return False
+                elif op == '$nin':
+                    if value in arg:
+                        return False
+                elif op == '$ne':
+                    if value == arg:
+                        return False
+                elif op == '$exists':
+                    if (key in doc) != bool(arg):
+                        return False
+                else:
+                    raise OperationFailure(f"Unsupported query operator {op}")
+        elif value != condition:
+            return False
+    return True
+
+
+def project(doc: dict, projection: dict) -> dict:
+    if not projection:
+        return copy.deepcopy(doc)
+    included = [k for k, v in projection.items() if v and k != '_id']
+    if included:
+        out = {k: copy.deepcopy(doc[k]) for k in included if k in doc}
+        if projection.get('_id', 1) and '_id' in doc:
+            out['_id'] = doc['_id']
+        return out
+    return {k: copy.deepcopy(v) for k, v in doc.items() if projection.get(k, 1)}
+
+
+def apply_update(doc: dict, update: dict, inserting: bool):
+    for op, fields in update.items():
+        for key, value in fields.items():
+            if op == '$set' or (op == '$setOnInsert' and inserting):
+                doc[key] = copy.deepcopy(value)
+            elif op == '$inc':
+                doc[key] = doc.get(key, 0) + value
+            elif op == '$unset':
+                doc.pop(key, None)
+            elif op == '$max':
+                doc[key] = value if key not in doc else max(doc[key], value)
+            elif op != '$setOnInsert':
+                raise OperationFailure(f"Unsupported update operator {op}")
+
+
+class MemoryCursor:
+    def __init__(self, collection, query, projection):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort = []
+        self._skip = 0
+        self._limit = 0
+        self._iter = None
+
+    def sort(self, key, direction=1):
+        self._sort = list(key) if isinstance(key, (list, tuple)) else [(key, direction)]
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def hint(self, index):
+        return self
+
+    def _results(self):
+        docs = [d for d in self._collection._docs.values() if matches(d, self._query)]
+        for key, direction in reversed(self._sort):
+            # None sorts first, like MongoDB's ordering of missing fields.
+            docs.sort(key=lambda d: (d.get(key) is not None, d.get(key)), reverse=direction < 0)
+        docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        return [project(d, self._projection) for d in docs]
+
+    async def to_list(self, length=None):
+        results = self._results()
+        return results if length is None else results[:length]
+
+    async def close(self):
+        self._iter = iter(())
+
+    def __aiter__(self):
+        self._iter = iter(self._results())
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class MemoryCollection:
+    def __init__(self, name: str):
+        self.name = name
+        self._docs = {}
+        # unique index name -> (fields, {key tuple: _id})
+        self._unique = {}
+
+    def _key(self, fields, doc):
+        return tuple(doc.get(f) for f in fields)
+
+    def _check_unique(self, doc, ignore_id=None):
+        for name, (fields, entries) in self._unique.items():
+            owner = entries.get(self._key(fields, doc))
+            if owner is not None and owner != ignore_id:
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {name}")
+
+    def _reindex(self, doc, old=None):
+        for fields, entries in self._unique.values():
+            if old is not None:
+                entries.pop(self._key(fields, old), None)
+            entries[self._key(fields, doc)] = doc['_id']
+
+    def _find_by_unique(self, query):
+        fields = tuple(sorted(query))
+        for index_fields, entries in self._unique.values():
+            if tuple(sorted(index_fields)) == fields and not any(isinstance(v, dict) for v in query.values()):
+                _id = entries.get(self._key(index_fields, query))
+                return [self._docs[_id]] if _id is not None else []
+        return None
+
+    def _scan(self, query):
+        hit = self._find_by_unique(query) if query else None
+        if hit is not None:
+            return hit
+        _id = query.get('_id') if query else None
+        if _id is not None and not isinstance(_id, dict):
+            # The _id index: a point lookup, then the rest of the filter.
+            doc = self._docs.get(_id)
+            return [doc] if doc is not None and matches(doc, query) else []
+        return [d for d in self._docs.values() if matches(d, query)]
+
+    async def create_indexes(self, models):
+        names = []
+        for model in models:
+            spec = model.document
+            fields = tuple(spec['key'])
+            if spec.get('unique') and spec['name'] not in self._unique:
+                entries = {}
+                for doc in self._docs.values():
+                    key = self._key(fields, doc)
+                    if key in entries:
+                        raise OperationFailure(f"E11000 duplicate key building index {spec['name']}")
+                    entries[key] = doc['_id']
+                self._unique[spec['name']] = (fields, entries)
+            names.append(spec['name'])
+        return names
+
+    async def find_one(self, query=None, projection=None, **kwargs):
+        for doc in self._scan(query or {}):
+            return project(doc, projection)
+        return None
+
+    def find(self, query=None, projection=None, **kwargs):
+        return MemoryCursor(self, query, projection)
+
+    async def count_documents(self, query):
+        return len(self._scan(query))
+
+    def _insert(self, doc):
+        doc.setdefault('_id', ObjectId())
+        if doc['_id'] in self._docs:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_")
+        self._check_unique(doc)
+        stored = copy.deepcopy(doc)
+        self._docs[doc['_id']] = stored
+        self._reindex(stored)
+
+    async def insert_one(self, doc):
+        self._insert(doc)
+        return SimpleNamespace(inserted_id=doc['_id'], acknowledged=True)
+
+    async def insert_many(self, docs, ordered=True):
+        errors = []
+        for doc in docs:
+            try:
+                self._insert(doc)
+            except DuplicateKeyError as e:
+                if ordered:
+                    raise
+                errors.append(e)
+        if errors:
+            raise errors[0]
+        return SimpleNamespace(inserted_ids=[d['_id'] for d in docs], acknowledged=True)
+
+    def _update(self, query, update, upsert):
+        for doc in self._scan(query):
+            old = dict(doc)
+            apply_update(doc, update, inserting=False)
+            try:
+                self._check_unique(doc, ignore_id=doc['_id'])
+            except DuplicateKeyError:
+                doc.clear()
+                doc.update(old)
+                raise
+            self._reindex(doc, old)
+            return SimpleNamespace(matched_count=1, modified_count=int(doc != old), upserted_id=None)
+        if not upsert:
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+        doc = {k: copy.deepcopy(v) for k, v in query.items() if not k.startswith('$') and not isinstance(v, dict)}
+        apply_update(doc, update, inserting=True)
+        self._insert(doc)
+        return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=doc['_id'])
+
+    async def update_one(self, query, update, upsert=False):
+        return self._update(query, update, upsert)
+
+    async def update_many(self, query, update, upsert=False):
+        docs = self._scan(query)
+        if not docs:
+            return self._update(query, update, upsert)
+        modified = 0
+        for doc in list(docs):
+            modified += self._update({'_id': doc['_id']}, update, False).modified_count
+        return SimpleNamespace(matched_count=len(docs), modified_count=modified, upserted_id=None)
+
+    async def replace_one(self, query, replacement, upsert=False):
+        for doc in self._scan(query):
+            new = copy.deepcopy(replacement)
+            new['_id'] = doc['_id']
+            self._check_unique(new, ignore_id=doc['_id'])
+            self._docs[doc['_id']] = new
+            self._reindex(new, doc)
+            return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None)
+        if not upsert:
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+        new = copy.deepcopy(replacement)
+        if '_id' in query and not isinstance(query['_id'], dict):
+            new.setdefault('_id', query['_id'])
+        self._insert(new)
+        return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=new['_id'])
+
+    def _remove(self, doc):
+        del self._docs[doc['_id']]
+        for fields, entries in self._unique.values():
+            entries.pop(self._key(fields, doc), None)
+
+    async def delete_one(self, query):
+        for doc in self._scan(query):
+            self._remove(doc)
+            return SimpleNamespace(deleted_count=1)
+        return SimpleNamespace(deleted_count=0)
+
+    async def delete_many(self, query):
+        docs = self._scan(query)
+        for doc in docs:
+            self._remove(doc)
+        return SimpleNamespace(deleted_count=len(docs))
+
+    async def bulk_write(self, requests, ordered=True):
+        counts = {'nInserted': 0, 'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0}
+        upserted, errors = [], []
+        for i, request in enumerate(requests):
+            try:
+                if isinstance(request, InsertOne):
+                    self._insert(request._doc)
+                    counts['nInserted'] += 1
+                    continue
+                if isinstance(request, (DeleteOne, DeleteMany)):
+                    deleter = self.delete_one if isinstance(request, DeleteOne) else self.delete_many
+                    counts['nRemoved'] += (await deleter(request._filter)).deleted_count
+                    continue
+                if isinstance(request, ReplaceOne):
+                    result = await self.replace_one(request._filter, request._doc, upsert=request._upsert)
+                elif isinstance(request, UpdateMany):
+                    result = await self.update_many(request._filter, request._doc, upsert=request._upsert)
+                elif isinstance(request, UpdateOne):
+                    result = self._update(request._filter, request._doc, request._upsert)
+                else:
+                    raise OperationFailure(f"Unsupported bulk operation {type(request).__name__}")
+            except DuplicateKeyError as e:
+                errors.append({'index': i, 'code': 11000, 'errmsg': str(e)})
+                if ordered:
+                    break
+                continue
+            counts['nMatched'] += result.matched_count
+            counts['nModified'] += result.modified_count
+            if result.upserted_id is not None:
+                counts['nUpserted'] += 1
+                upserted.append({'index': i, '_id': result.upserted_id})
+        details = {**counts, 'upserted': upserted, 'writeErrors': errors, 'writeConcernErrors': []}
+        if errors:
+            raise BulkWriteError(details)
+        return BulkWriteResult(details, True)
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets")
+
+
+class MemoryDatabase:
+    def __init__(self, name: str = 'memory'):
+        self.name = name
+        self._collections = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(name)
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    async def command(self, command, *args, **kwargs):
+        return {"ok": 1.0}
@@ -0,0 +1,95 @@
+"""Synthetic scheme catalogs and quiz profiles for the benchmarks.
+
+Answer vocabularies mirror the options offered on the frontend quiz page.
+"""
+import random
+
+GENDERS = ["Male", "Female", "Other"]
+STATES = ["Karnataka", "Maharashtra", "Tamil Nadu", "Uttar Pradesh", "Bihar", "West Bengal", "Rajasthan", "Kerala"]
+AREAS = ["Urban", "Rural"]
+INCOMES = ["Below ₹1,00,000", "₹1,00,000 – ₹3,00,000", "₹3,00,000 – ₹8,00,000", "Above ₹8,00,000"]
+OCCUPATIONS = ["Student", "Farmer", "Self-employed", "Salaried", "Unemployed", "Senior Citizen"]
+EDUCATIONS = ["School", "Diploma", "Undergraduate", "Postgraduate", "Not Applicable"]
+CATEGORIES = ["SC", "ST", "OBC", "General", "Prefer not to say"]
+YES_NO = ["Yes", "No"]
+
+VOCABULARY = {
+    "gender": GENDERS,
+    "occupation": OCCUPATIONS,
+    "category": CATEGORIES,
+    "income": INCOMES,
+    "area": AREAS,
+    "has_land": YES_NO,
+    "is_disabled": YES_NO,
+}
+
+WORDS = ["scholarship", "pension", "housing", "loan", "insurance", "farmer", "women", "student",
+         "health", "subsidy", "yojana", "skill", "employment", "maternity", "disability", "rural"]
+
+
+INCOME_LIMITS = [100_000, 250_000, 300_000, 500_000, 800_000]
+RULE_VOCABULARY = {**VOCABULARY, "state": STATES, "education": EDUCATIONS}
+
+
+def make_rule(rng: random.Random, depth: int = 3) -> dict:
+    """A random all/any/not rule over the quiz answers, at most `depth` deep."""
+    roll = rng.random()
+    if depth > 1 and roll < 0.45:
+        return {rng.choice(["all", "any"]): [make_rule(rng, depth - 1) for _ in range(rng.randint(2, 3))]}
+    if depth > 1 and roll < 0.55:
+        return {"not": make_rule(rng, depth - 1)}
+    roll = rng.random()
+    if roll < 0.15:
+        low = rng.choice([None, 18, 21, 30, 45, 60])
+        high = rng.choice([None, 25, 35, 59, 70]) if low is not None else rng.choice([25, 35, 59, 70])
+        return {"field": "age", **({"min": low} if low is not None else {}), **({"max": high} if high is not None else {})}
+    if roll < 0.3:
+        return {"field": "income", "max": rng.choice(INCOME_LIMITS)}
+    field = rng.choice(list(RULE_VOCABULARY))
+    values = RULE_VOCABULARY[field]
+    return {"field": field, "in": rng.sample(values, rng.randint(1, max(1, len(values) // 2)))}
+
+
+def make_schemes(count: int, seed: int = 7, rules: float = 0.0) -> list:
+    """A synthetic catalog; a `rules` fraction of schemes also get a random rule."""
+    rng = random.Random(seed)
+    schemes = []
+    for i in range(count):
+        eligibility = {}
+        for field, values in VOCABULARY.items():
+            if rng.random() < 0.35:
+                eligibility[field] = rng.sample(values, rng.randint(1, len(values) - 1))
+        if rng.random() < 0.5:
+            eligibility['age_min'] = rng.choice([14, 16, 17, 18, 21, 25, 40, 60])
+        if rng.random() < 0.4:
+            eligibility['age_max'] = eligibility.get('age_min', 18) + rng.choice([5, 10, 20, 40])
+        if rules and rng.random() < rules:
+            eligibility['rule'] = make_rule(rng)
+        words = rng.sample(WORDS, 3)
+        schemes.append({
+            "id": f"synthetic_{i}",
+            "name": f"{words[0].title()} {words[1].title()} Scheme {i}",
+            "category": rng.choice(["Education", "Agriculture", "Health", "Pension", "Women", "Housing"]),
+            "description": f"Support for {words[0]} and {words[1]} under {words[2]}",
+            "benefits": [f"Benefit {j} for {rng.choice(WORDS)}" for j in range(3)],
+            "documents": ["Aadhaar", "Income Certificate"],
+            "apply_link": "https://example.gov.in",
+            "eligibility": eligibility,
+        })
+    return schemes
+
+
+def make_profiles(count: int, seed: int = 11) -> list:
+    rng = random.Random(seed)
+    return [{
+        "age": rng.randint(10, 80),
+        "gender": rng.choice(GENDERS),
+        "state": rng.choice(STATES),
+        "area": rng.choice(AREAS),
+        "income": rng.choice(INCOMES),
+        "occupation": rng.choice(OCCUPATIONS),
+        "education": rng.choice(EDUCATIONS),
+        "category": rng.choice(CATEGORIES),
+        "has_land": rng.choice(YES_NO),
+        "is_disabled": rng.choice(YES_NO),
+    } for _ in range(count)]
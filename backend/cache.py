@@ -0,0 +1,204 @@
+import abc
+import hashlib
+import heapq
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        return self._entries.pop(key, default)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class QuizResultCache:
+    """Quiz results keyed on EligibilityIndex.profile_key.
+
+    Entries are tagged with the catalog version they were computed against;
+    the first lookup against an index with a different version drops them all.
+    """
+
+    def __init__(self, maxsize: int):
+        self._entries = LRUCache(maxsize)
+        self.version = None
+        self.invalidations = 0
+
+    def _sync(self, index):
+        if index.version != self.version:
+            if self.version is not None:
+                self.invalidations += 1
+            self._entries.clear()
+            self.version = index.version
+
+    def get(self, index, quiz):
+        self._sync(index)
+        return self._entries.get(index.profile_key(quiz))
+
+    def put(self, index, quiz, result):
+        self._sync(index)
+        self._entries.put(index.profile_key(quiz), result)
+
+    def stats(self) -> dict:
+        return {**self._entries.stats(), "version": self.version, "invalidations": self.invalidations}
+
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+
+class RevocationStore(abc.ABC):
+    """Digests of revoked tokens, each remembered until the token's exp.
+
+    Every process serving the API has to see the same revocations, or a
+    token logged out on one worker keeps working on the others, so
+    multi-worker deployments use a shared backend.
+    """
+
+    @abc.abstractmethod
+    async def revoke(self, digest: bytes, exp: float):
+        ...
+
+    @abc.abstractmethod
+    async def is_revoked(self, digest: bytes) -> bool:
+        ...
+
+
+class MemoryRevocationStore(RevocationStore):
+    """Per-process revocations, for a single worker. Digests leave in exp
+    order from a heap as they expire; past max_entries the ones expiring
+    soonest are dropped first."""
+
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._revoked = {}
+        self._expiry = []
+
+    def __len__(self):
+        return len(self._revoked)
+
+    async def revoke(self, digest: bytes, exp: float):
+        self._revoked[digest] = exp
+        heapq.heappush(self._expiry, (exp, digest))
+        now = time.time()
+        while self._expiry and (self._expiry[0][0] <= now or len(self._revoked) > self.max_entries):
+            exp, digest = heapq.heappop(self._expiry)
+            if self._revoked.get(digest) == exp:
+                del self._revoked[digest]
+
+    async def is_revoked(self, digest: bytes) -> bool:
+        return digest in self._revoked
+
+
+class MongoRevocationStore(RevocationStore):
+    """Revocations in a collection every worker reads, one document per
+    digest; a TTL index on expires_at deletes them once the token expires."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def revoke(self, digest: bytes, exp: float):
+        expires_at = datetime.fromtimestamp(exp, timezone.utc)
+        await self.collection.update_one({'_id': digest}, {'$set': {'expires_at': expires_at}}, upsert=True)
+
+    async def is_revoked(self, digest: bytes) -> bool:
+        return await self.collection.find_one({'_id': digest}, {'_id': 1}) is not None
+
+
+class TokenCache:
+    """Verified JWT payloads keyed by token digest, each living until its exp.
+
+    Only tokens that already passed full verification are stored, and only
+    their SHA-256 digests are kept as keys. Revoked digests go to a
+    RevocationStore, which callers check before the cache, so a revoked
+    token is refused even where another process still caches it.
+    """
+
+    def __init__(self, maxsize: int, revoked: RevocationStore):
+        self._entries = LRUCache(maxsize)
+        self.revoked = revoked
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.revocations = 0
+
+    def get(self, digest: bytes, now: float = None):
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        payload, exp = entry
+        if exp <= (now or time.time()):
+            self._entries.pop(digest)
+            self.expired += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return payload
+
+    def put(self, digest: bytes, payload: dict):
+        exp = payload.get('exp')
+        if exp is None:
+            return
+        self._entries.put(digest, (payload, exp))
+
+    async def revoke(self, digest: bytes, exp: float):
+        await self.revoked.revoke(digest, exp)
+        self._entries.pop(digest)
+        self.revocations += 1
+
+    async def is_revoked(self, digest: bytes) -> bool:
+        return await self.revoked.is_revoked(digest)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": self._entries.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self._entries.evictions,
+            "revocations": self.revocations,
+        }
@@ -0,0 +1,375 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+from functools import cached_property
+from pathlib import Path
+from types import MappingProxyType
+from typing import List, Optional
+
+import orjson
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator
+
+from matching import EligibilityIndex, catalog_version
+from responses import Fragments, render
+from rules import parse_rule
+from search import SearchIndex
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+ELIGIBLE = 'Eligible'
+MAY_BE_ELIGIBLE = 'May be eligible - Check details'
+
+
+class CatalogError(Exception):
+    pass
+
+
+class Eligibility(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    age_min: Optional[int] = None
+    age_max: Optional[int] = None
+    gender: Optional[List[str]] = None
+    occupation: Optional[List[str]] = None
+    category: Optional[List[str]] = None
+    income: Optional[List[str]] = None
+    area: Optional[List[str]] = None
+    has_land: Optional[List[str]] = None
+    is_disabled: Optional[List[str]] = None
+    # An all/any/not rule over quiz answers; see rules.py.
+    rule: Optional[dict] = None
+
+    @field_validator('rule')
+    @classmethod
+    def check_rule(cls, rule):
+        if rule is not None:
+            parse_rule(rule)
+        return rule
+
+
+class Scheme(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    id: str
+    name: str
+    category: str
+    description: str
+    benefits: List[str]
+    documents: List[str]
+    apply_link: str
+    eligibility: Eligibility = Eligibility()
+
+
+def validate_schemes(raw) -> list:
+    """Validate raw catalog data into plain scheme dicts, in catalog order."""
+    if not isinstance(raw, list):
+        raise CatalogError("Scheme catalog must be a list of schemes")
+    try:
+        schemes = [Scheme.model_validate(item).model_dump(exclude_none=True) for item in raw]
+    except ValidationError as e:
+        raise CatalogError(str(e)) from e
+    seen = set()
+    for scheme in schemes:
+        if scheme['id'] in seen:
+            raise CatalogError(f"Duplicate scheme id: {scheme['id']}")
+        seen.add(scheme['id'])
+    return schemes
+
+
+class EncodedBody:
+    """A response body kept in every content-coding we serve, each with its
+    own strong ETag (RFC 9110 requires different tags per coding)."""
+
+    def __init__(self, body: bytes, tag: str, compress: bool = True):
+        self.bodies = {'identity': body}
+        if compress:
+            self.bodies['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.bodies['br'] = brotli.compress(body, quality=11)
+        self._tag(tag)
+
+    def _tag(self, tag: str):
+        self.etags = {
+            coding: f'"{tag}"' if coding == 'identity' else f'"{tag}-{coding}"'
+            for coding in self.bodies
+        }
+
+    @classmethod
+    def from_bodies(cls, bodies: dict, tag: str) -> 'EncodedBody':
+        """Wrap bodies that were already encoded, such as those stored in a
+        compiled snapshot file."""
+        encoded = cls.__new__(cls)
+        encoded.bodies = bodies
+        encoded._tag(tag)
+        return encoded
+
+
+def public_view(scheme: dict) -> dict:
+    return {k: v for k, v in scheme.items() if k != 'eligibility'}
+
+
+class CatalogSnapshot:
+    """Everything derived from one version of the scheme list.
+
+    Built once per catalog load and never mutated afterwards: the
+    eligibility index, the full-text search index, read-only public views
+    (no eligibility rules) and pre-encoded JSON for each scheme as it
+    appears in responses, so request handlers only pick positions and join
+    bytes.
+    """
+
+    def __init__(self, schemes: list, version: str = None, previous: 'CatalogSnapshot' = None):
+        self.schemes = tuple(schemes)
+        self.version = version or catalog_version(schemes)
+        self.index = EligibilityIndex(schemes, self.version)
+        # Re-indexes only the schemes whose text changed since `previous`;
+        # an index loaded from a snapshot file is read-only, so not that one.
+        if previous is not None and isinstance(previous.search, SearchIndex):
+            self.search = previous.search.copy()
+        else:
+            self.search = SearchIndex()
+        self.search.update(schemes)
+
+        views = [public_view(s) for s in schemes]
+        self.public_json = tuple(orjson.dumps(v) for v in views)
+        self.eligible_json = tuple(orjson.dumps({**v, 'eligibility_match': ELIGIBLE}) for v in views)
+        self.fallback_json = tuple(orjson.dumps({**v, 'eligibility_match': MAY_BE_ELIGIBLE}) for v in views)
+
+        self.catalog_body = EncodedBody(
+            render({"version": self.version, "schemes": Fragments(self.public_json)}), self.version)
+        self.public = tuple(MappingProxyType(v) for v in views)
+        self._link()
+
+    def _link(self):
+        self.ids = self.index.ids
+        self.positions = {scheme_id: i for i, scheme_id in enumerate(self.ids)}
+
+    @classmethod
+    def from_parts(cls, schemes, version: str, index: EligibilityIndex, search,
+                   public_json, eligible_json, fallback_json, catalog_body: EncodedBody) -> 'CatalogSnapshot':
+        """A snapshot around parts compiled elsewhere. The JSON sequences may
+        hold any bytes-like objects, such as views into a mapped file, and
+        `schemes` may be the scheme list's JSON, parsed only if something
+        reads it; request handlers serve from the other parts."""
+        snapshot = cls.__new__(cls)
+        if isinstance(schemes, (list, tuple)):
+            snapshot.schemes = tuple(schemes)
+        else:
+            snapshot._schemes_json = schemes
+        snapshot.version = version
+        snapshot.index = index
+        if search is None:
+            search = SearchIndex()
+            search.update(snapshot.schemes)
+        snapshot.search = search
+        snapshot.public_json = public_json
+        snapshot.eligible_json = eligible_json
+        snapshot.fallback_json = fallback_json
+        snapshot.catalog_body = catalog_body
+        snapshot._link()
+        return snapshot
+
+    @cached_property
+    def schemes(self) -> tuple:
+        return tuple(orjson.loads(self._schemes_json))
+
+    @cached_property
+    def public(self) -> tuple:
+        return tuple(MappingProxyType(public_view(s)) for s in self.schemes)
+
+    def scheme_body(self, position: int) -> EncodedBody:
+        # Single schemes are a few hundred bytes; compressing them is not worth it.
+        return EncodedBody(self.public_json[position], f"{self.version}-{self.ids[position]}", compress=False)
+
+    def near_miss_json(self, position: int, score: float, failed: list) -> bytes:
+        """fallback_json for a scheme plus how close the quiz came to it."""
+        detail = orjson.dumps({"match_score": round(score / self.index.total_weight, 3), "failed_criteria": failed})
+        return b''.join((self.fallback_json[position][:-1], b',', detail[1:]))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, scheme_id: str):
+        return scheme_id in self.positions
+
+
+class CatalogStore:
+    """Holds the current CatalogSnapshot.
+
+    Request handlers read .snapshot once and use that object for the whole
+    request; swap() replaces it with a single attribute assignment, so
+    readers never lock and never see a half-built catalog. Listeners run
+    after each swap to rebuild their own derived state.
+    """
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        self.snapshot = snapshot
+        self._listeners = []
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def swap(self, snapshot: CatalogSnapshot):
+        previous, self.snapshot = self.snapshot, snapshot
+        logger.info("Scheme catalog %s -> %s (%d schemes)", previous.version, snapshot.version, len(snapshot))
+        for listener in self._listeners:
+            # One failing listener must not keep the others from running.
+            try:
+                listener(snapshot, previous)
+            except Exception:
+                logger.exception("Catalog listener %r failed for %s", listener, snapshot.version)
+
+
+def read_catalog_file(path: Path) -> list:
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    if path.suffix in ('.yaml', '.yml'):
+        import yaml
+        try:
+            raw = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise CatalogError(f"{path}: {e}") from e
+    else:
+        try:
+            raw = json.loads(text)
+        except ValueError as e:
+            raise CatalogError(f"{path}: {e}") from e
+    return validate_schemes(raw)
+
+
+class FileCatalogSource:
+    """JSON or YAML scheme file, polled for changes by mtime and size.
+
+    Publish updates by writing a temporary file and renaming it over the
+    old one; a reload that catches a half-written file is rejected and the
+    next change retried.
+    """
+
+    def __init__(self, path, poll_interval: float = 5.0):
+        self.path = Path(path)
+        self.poll_interval = poll_interval
+
+    def fingerprint(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    async def load(self) -> list:
+        return await asyncio.to_thread(read_catalog_file, self.path)
+
+    async def changes(self):
+        try:
+            last = self.fingerprint()
+        except OSError:
+            # Reloaded once the file shows up.
+            logger.warning("Scheme file %s is not readable", self.path)
+            last = None
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                current = self.fingerprint()
+            except OSError:
+                logger.warning("Scheme file %s is not readable", self.path)
+                continue
+            if current != last:
+                last = current
+                yield
+
+
+class MongoCatalogSource:
+    """Schemes stored one per document, in _id order.
+
+    Changes arrive through a change stream when the deployment supports one
+    (replica sets), otherwise the collection is re-read every poll_interval
+    seconds and the swap is skipped when the version is unchanged.
+    """
+
+    def __init__(self, collection, poll_interval: float = 30.0):
+        self.collection = collection
+        self.poll_interval = poll_interval
+
+    async def load(self) -> list:
+        raw = await self.collection.find({}, {"_id": 0}).sort("_id", 1).to_list(None)
+        if not raw:
+            raise CatalogError(f"Scheme collection {self.collection.name} is empty")
+        return validate_schemes(raw)
+
+    async def changes(self):
+        from pymongo.errors import OperationFailure, PyMongoError
+        while True:
+            try:
+                async with self.collection.watch() as stream:
+                    async for _ in stream:
+                        yield
+            except OperationFailure:
+                logger.info("Change streams unavailable for %s, polling instead", self.collection.name)
+                break
+            except PyMongoError as e:
+                logger.warning("Change stream on %s failed, reopening: %s", self.collection.name, e)
+            # Reload in case a change was missed while the stream was down.
+            await asyncio.sleep(self.poll_interval)
+            yield
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            yield
+
+
+class CatalogWatcher:
+    """Reloads a source on change and swaps the result into a CatalogStore.
+
+    The new snapshot (index, payloads, compressed bodies) is built in a
+    worker thread, so the event loop keeps serving the old one until the
+    swap. Invalid catalogs are logged and ignored.
+    """
+
+    def __init__(self, store: CatalogStore, source):
+        self.store = store
+        self.source = source
+        self._task = None
+
+    async def reload(self) -> bool:
+        schemes = await self.source.load()
+        version = catalog_version(schemes)
+        if version == self.store.snapshot.version:
+            return False
+        snapshot = await asyncio.to_thread(CatalogSnapshot, schemes, version, self.store.snapshot)
+        self.store.swap(snapshot)
+        return True
+
+    async def prime(self) -> bool:
+        """Reload once before start(). A source that is invalid or cannot
+        be reached leaves the current catalog in service; the watcher
+        retries on the source's next change or poll."""
+        try:
+            return await self.reload()
+        except CatalogError:
+            logger.exception("Scheme catalog source is invalid, serving catalog %s", self.store.snapshot.version)
+        except Exception as e:
+            logger.warning("Could not load the scheme catalog source, serving catalog %s until it answers: %s",
+                           self.store.snapshot.version, e)
+        return False
+
+    async def _run(self):
+        async for _ in self.source.changes():
+            try:
+                await self.reload()
+            except (CatalogError, OSError) as e:
+                logger.error("Ignoring invalid scheme catalog update: %s", e)
+            except Exception:
+                logger.exception("Scheme catalog reload failed")
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
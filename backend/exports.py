@@ -0,0 +1,77 @@
+import csv
+import io
+import json
+from datetime import date, timedelta
+
+from bson import ObjectId
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def parse_id(value: str):
+    return ObjectId(value) if ObjectId.is_valid(value) else value
+
+
+def export_query(date_field: str, start: date = None, end: date = None, filters: dict = None) -> dict:
+    """Equality filters plus an inclusive [start, end] day range over an ISO
+    timestamp field."""
+    query = {k: v for k, v in (filters or {}).items() if v is not None}
+    bounds = {}
+    if start:
+        bounds["$gte"] = start.isoformat()
+    if end:
+        bounds["$lt"] = (end + timedelta(days=1)).isoformat()
+    if bounds:
+        query[date_field] = bounds
+    return query
+
+
+def resume_query(query: dict, date_field: str, checkpoint: dict) -> dict:
+    """Narrow an export query to rows after the checkpoint document in
+    (date_field, _id) order.
+
+    The lower bound moves up to the checkpoint's timestamp so the index scan
+    starts there; the $or only has to skip rows sharing that timestamp.
+    """
+    value = checkpoint.get(date_field)
+    bounds = dict(query.get(date_field, {}))
+    if value is not None and value > bounds.get("$gte", ""):
+        bounds["$gte"] = value
+    return {
+        **query,
+        date_field: bounds,
+        "$or": [{date_field: {"$gt": value}}, {date_field: value, "_id": {"$gt": checkpoint["_id"]}}],
+    }
+
+
+def _row(doc: dict, columns) -> dict:
+    row = {c: doc.get(c) for c in columns}
+    row["_id"] = str(row["_id"])
+    return row
+
+
+async def stream_export(cursor, columns, fmt: str, rows_per_chunk: int = 1000):
+    """Encode cursor documents as NDJSON or CSV, one chunk per rows_per_chunk
+    rows, so only a single chunk is ever held in memory."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore") if fmt == "csv" else None
+    if writer:
+        writer.writeheader()
+    rows = 0
+    try:
+        async for doc in cursor:
+            if writer:
+                writer.writerow(_row(doc, columns))
+            else:
+                buffer.write(json.dumps(_row(doc, columns), default=str))
+                buffer.write("\n")
+            rows += 1
+            if rows >= rows_per_chunk:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                rows = 0
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        await cursor.close()
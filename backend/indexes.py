@@ -0,0 +1,66 @@
+import logging
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Every index the application relies on, per collection. ensure_indexes is
+# safe to run on every startup: creating an index that already exists with
+# the same spec is a no-op on the server.
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+    ],
+    "saved_schemes": [
+        IndexModel([("user_id", ASCENDING), ("scheme_id", ASCENDING)], unique=True, name="user_scheme_unique"),
+        IndexModel([("saved_at", ASCENDING), ("_id", ASCENDING)], name="saved_at_id"),
+    ],
+    "quiz_submissions": [
+        IndexModel([("user_id", ASCENDING), ("submitted_at", ASCENDING)], name="user_submitted_at"),
+        IndexModel([("submitted_at", ASCENDING), ("_id", ASCENDING)], name="submitted_at_id"),
+        IndexModel([("state", ASCENDING), ("submitted_at", ASCENDING), ("_id", ASCENDING)], name="state_submitted_at_id"),
+    ],
+    "quiz_rollups": [
+        IndexModel([("dimension", ASCENDING), ("day", ASCENDING)], name="dimension_day"),
+    ],
+    "revoked_tokens": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl"),
+    ],
+}
+
+# Unique indexes that writes depend on for correctness (signup and save
+# rely on DuplicateKeyError instead of checking first). The server answers
+# those routes with 503 until these exist.
+REQUIRED_INDEXES = {
+    "users": {"email_unique"},
+    "saved_schemes": {"user_scheme_unique"},
+}
+
+
+class MissingIndexError(Exception):
+    def __init__(self, missing: dict):
+        self.missing = missing
+        super().__init__("Required indexes could not be built: " + ", ".join(
+            f"{collection}.{name}" for collection, names in missing.items() for name in sorted(names)))
+
+
+async def ensure_indexes(db) -> dict:
+    """Create any missing indexes; returns the index names per collection.
+
+    A collection whose indexes cannot be built (for example a unique index
+    over data that already has duplicates) is logged and skipped, unless it
+    holds one of REQUIRED_INDEXES, in which case MissingIndexError is raised
+    once every other collection has been tried.
+    """
+    created, missing = {}, {}
+    for collection, models in INDEXES.items():
+        try:
+            created[collection] = await db[collection].create_indexes(models)
+        except OperationFailure:
+            logger.exception("Could not ensure indexes on %s", collection)
+            if collection in REQUIRED_INDEXES:
+                missing[collection] = REQUIRED_INDEXES[collection]
+    if missing:
+        raise MissingIndexError(missing)
+    return created
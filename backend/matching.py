@@ -0,0 +1,431 @@
+import bisect
+import hashlib
+import json
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from rules import ALWAYS, compile_rules, references, scheme_rule
+
+# Eligibility keys that hold a list of accepted quiz answers.
+LIST_FIELDS = ("gender", "occupation", "category", "income", "area", "has_land", "is_disabled")
+
+# Schemes offered as "may be eligible" when a quiz matches fewer than this.
+FALLBACK_LIMIT = 3
+
+# Relative importance of each criterion when ranking near misses, as
+# positive integers; criteria not listed weigh 1.
+CRITERION_WEIGHTS = {}
+
+# Upper bound on profiles x schemes cells evaluated at once by match_batch.
+BATCH_CELLS = 1 << 22
+
+AGE_FLOOR = np.iinfo(np.int64).min
+AGE_CEIL = np.iinfo(np.int64).max
+
+
+def catalog_version(schemes: list) -> str:
+    """Content hash of a scheme list; changes whenever any scheme does."""
+    encoded = json.dumps(schemes, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+class EligibilityIndex:
+    """Scheme eligibility compiled into per-field posting bitmaps.
+
+    For every (field, answer) pair we keep a boolean row over the catalog that
+    is True where the scheme accepts that answer (or does not constrain the
+    field at all). Ages are split on the catalog's age_min/age_max boundaries
+    into buckets, each with its own row. Matching a quiz is then one bisect
+    plus an AND of at most one row per field.
+
+    Schemes with an eligibility `rule` also get a rule criterion: their
+    compiled rule functions run for every quiz, and schemes without a rule
+    (or whose rule reduces to always true) simply pass it.
+    """
+
+    def __init__(self, schemes: list, version: str = None, weights: dict = None):
+        self.schemes = schemes
+        self.version = version or catalog_version(schemes)
+        self.ids = [s['id'] for s in schemes]
+        self.size = len(schemes)
+
+        self.postings = {}
+        self.unconstrained = {}
+        for field in LIST_FIELDS:
+            constrained = np.zeros(self.size, dtype=bool)
+            members = {}
+            for i, scheme in enumerate(schemes):
+                accepted = scheme.get('eligibility', {}).get(field)
+                if accepted is None:
+                    continue
+                constrained[i] = True
+                for value in accepted:
+                    members.setdefault(value, []).append(i)
+            if not constrained.any():
+                continue
+            base = ~constrained
+            rows = {}
+            for value, positions in members.items():
+                row = base.copy()
+                row[positions] = True
+                rows[value] = row
+            self.postings[field] = rows
+            self.unconstrained[field] = base
+
+        # Only fields some scheme actually constrains take part in matching.
+        self.fields = tuple(self.postings)
+
+        rules = [scheme_rule(scheme) for scheme in schemes]
+        self.rule_positions = np.array([i for i, rule in enumerate(rules) if rule != ALWAYS], dtype=np.intp)
+        self.rule_eligibility = [schemes[i].get('eligibility', {}) for i in self.rule_positions]
+        referenced, rule_ages = {}, set()
+        for i in self.rule_positions:
+            references(rules[i], referenced, rule_ages)
+        referenced.pop('age', None)
+        self.rule_fields = tuple(sorted(referenced))
+        self.rule_vocabulary = {field: sorted(referenced[field]) for field in self.rule_fields}
+
+        self.age_min = np.array(
+            [s.get('eligibility', {}).get('age_min', AGE_FLOOR) for s in schemes], dtype=np.int64)
+        self.age_max = np.array(
+            [s.get('eligibility', {}).get('age_max', AGE_CEIL) for s in schemes], dtype=np.int64)
+        breakpoints = set(int(a) for a in self.age_min if a != AGE_FLOOR)
+        breakpoints.update(int(a) + 1 for a in self.age_max if a != AGE_CEIL)
+        # Rule age bounds split buckets too, so one bucket never straddles
+        # a rule's decision.
+        breakpoints.update(rule_ages)
+        self.age_breakpoints = sorted(breakpoints)
+        # Bucket j covers ages in [breakpoints[j-1], breakpoints[j]).
+        self.age_masks = [(self.age_min <= age) & (self.age_max >= age) for age in self._age_representatives()]
+
+        # Stacked views for batch evaluation; the last row of every field
+        # matrix is the unconstrained row, so an unknown answer coded -1
+        # lands on it.
+        self.vocabulary = {field: list(self.postings[field]) for field in self.fields}
+        self.posting_matrices = {
+            field: np.stack([*self.postings[field].values(), self.unconstrained[field]])
+            for field in self.fields
+        }
+        self.age_matrix = np.stack(self.age_masks)
+
+        # Positions of the schemes each criterion can rule out; a changed
+        # answer only needs these rechecked.
+        self.dependents = {'age': np.flatnonzero((self.age_min != AGE_FLOOR) | (self.age_max != AGE_CEIL))}
+        self.dependent_matrices = {'age': self.age_matrix[:, self.dependents['age']]}
+        for field in self.fields:
+            self.dependents[field] = np.flatnonzero(~self.unconstrained[field])
+            self.dependent_matrices[field] = self.posting_matrices[field][:, self.dependents[field]]
+
+        # Near-miss ranking: a scheme scores the weight of every criterion
+        # it accepts (an unconstrained field counts as accepted).
+        weights = CRITERION_WEIGHTS if weights is None else weights
+        self._link([int(weights.get(c, 1)) for c in self._criteria()], [rules[i] for i in self.rule_positions])
+
+    def _criteria(self) -> tuple:
+        return ('age', *self.fields, *(('rule',) if len(self.rule_positions) else ()))
+
+    def _age_representatives(self) -> list:
+        """One age inside each age bucket, in bucket order."""
+        return [self.age_breakpoints[0] - 1 if self.age_breakpoints else 0, *self.age_breakpoints]
+
+    def _link(self, weights: list, rules: list = None):
+        """Derive the per-answer lookups from the stacked matrices.
+
+        Posting rows become views into the matrices, so every row is stored
+        once however it is reached. Rule functions are compiled here since
+        they cannot be stored; `rules` saves re-parsing when the caller
+        already has them.
+        """
+        self.postings = {
+            field: dict(zip(self.vocabulary[field], self.posting_matrices[field][:-1])) for field in self.fields
+        }
+        self.unconstrained = {field: self.posting_matrices[field][-1] for field in self.fields}
+        self.age_masks = list(self.age_matrix)
+        self.codes = {field: {value: code for code, value in enumerate(self.vocabulary[field])} for field in self.fields}
+
+        self.age_representatives = self._age_representatives()
+        self.rule_values = {field: frozenset(values) for field, values in self.rule_vocabulary.items()}
+        if rules is None:
+            rules = [scheme_rule({'eligibility': eligibility}) for eligibility in self.rule_eligibility]
+        self.predicates = compile_rules(rules)
+
+        self.criteria = self._criteria()
+        self.weights = weights
+        if min(self.weights) < 1:
+            raise ValueError("Criterion weights must be positive integers")
+        self.total_weight = sum(self.weights)
+        self.score_dtype = np.uint8 if self.total_weight <= np.iinfo(np.uint8).max else np.int32
+
+    def arrays(self) -> dict:
+        """Every array the index needs, by name, for from_arrays()."""
+        arrays = {'age_min': self.age_min, 'age_max': self.age_max, 'age_matrix': self.age_matrix,
+                  'rule_positions': self.rule_positions}
+        for field in self.fields:
+            arrays[f'posting/{field}'] = self.posting_matrices[field]
+        for criterion in ('age', *self.fields):
+            arrays[f'dependents/{criterion}'] = self.dependents[criterion]
+            arrays[f'dependent/{criterion}'] = self.dependent_matrices[criterion]
+        return arrays
+
+    def meta(self) -> dict:
+        """The JSON-serialisable rest of the index, for from_arrays()."""
+        return {
+            'version': self.version,
+            'ids': self.ids,
+            'fields': list(self.fields),
+            'vocabulary': self.vocabulary,
+            'age_breakpoints': self.age_breakpoints,
+            'rule_fields': list(self.rule_fields),
+            'rule_vocabulary': self.rule_vocabulary,
+            'rule_eligibility': self.rule_eligibility,
+            'weights': self.weights,
+        }
+
+    @classmethod
+    def from_arrays(cls, schemes: list, meta: dict, arrays: dict) -> 'EligibilityIndex':
+        """Rebuild an index from meta() and arrays() output without
+        recompiling; the arrays are used as given, so they may be read-only
+        views of a shared mapping. `schemes` is only read for meta written
+        before it carried rule_eligibility, and may be None otherwise."""
+        index = cls.__new__(cls)
+        index.schemes = schemes
+        index.version = meta['version']
+        index.ids = meta['ids']
+        index.size = len(index.ids)
+        index.fields = tuple(meta['fields'])
+        index.vocabulary = meta['vocabulary']
+        index.age_breakpoints = meta['age_breakpoints']
+        index.age_min = arrays['age_min']
+        index.age_max = arrays['age_max']
+        index.age_matrix = arrays['age_matrix']
+        index.posting_matrices = {field: arrays[f'posting/{field}'] for field in index.fields}
+        # Snapshots written before rules existed have none.
+        index.rule_positions = arrays.get('rule_positions', np.zeros(0, dtype=np.intp))
+        index.rule_fields = tuple(meta.get('rule_fields', ()))
+        index.rule_vocabulary = meta.get('rule_vocabulary', {})
+        index.rule_eligibility = meta.get('rule_eligibility')
+        if index.rule_eligibility is None:
+            index.rule_eligibility = [schemes[i].get('eligibility', {}) for i in index.rule_positions]
+        criteria = ('age', *index.fields)
+        index.dependents = {c: arrays[f'dependents/{c}'] for c in criteria}
+        index.dependent_matrices = {c: arrays[f'dependent/{c}'] for c in criteria}
+        index._link(meta['weights'])
+        return index
+
+    def age_bucket(self, age: int) -> int:
+        return bisect.bisect_right(self.age_breakpoints, age)
+
+    def profile_key(self, quiz) -> tuple:
+        """Canonical form of a quiz: two quizzes with equal keys match the same schemes."""
+        # Answers no rule mentions all behave alike, so they share None.
+        rule_answers = (getattr(quiz, field) for field in self.rule_fields)
+        return (self.age_bucket(quiz.age), *(getattr(quiz, field) for field in self.fields),
+                *(answer if answer in self.rule_values[field] else None
+                  for field, answer in zip(self.rule_fields, rule_answers)))
+
+    def rule_results(self, quiz) -> np.ndarray:
+        """Whether each scheme in rule_positions accepts the quiz."""
+        return np.fromiter((predicate(quiz) for predicate in self.predicates), dtype=bool, count=len(self.predicates))
+
+    def rule_row(self, quiz) -> np.ndarray:
+        row = np.ones(self.size, dtype=bool)
+        row[self.rule_positions] = self.rule_results(quiz)
+        return row
+
+    def rows(self, quiz) -> list:
+        """One boolean row per criterion: which schemes accept this quiz's answer."""
+        rows = [self.age_masks[self.age_bucket(quiz.age)]]
+        for field in self.fields:
+            rows.append(self.postings[field].get(getattr(quiz, field), self.unconstrained[field]))
+        if len(self.rule_positions):
+            rows.append(self.rule_row(quiz))
+        return rows
+
+    def key_profile(self, key: np.ndarray) -> SimpleNamespace:
+        """A stand-in quiz with the age and rule answers a coded profile
+        stands for; enough to run the rule functions on."""
+        offset = 1 + len(self.fields)
+        answers = {
+            field: self.rule_vocabulary[field][key[column]] if key[column] >= 0 else None
+            for column, field in enumerate(self.rule_fields, start=offset)
+        }
+        return SimpleNamespace(age=self.age_representatives[key[0]], **answers)
+
+    def key_rows(self, key: np.ndarray) -> list:
+        """rows() for one profile coded by encode()."""
+        rows = [self.age_matrix[key[0]]]
+        for column, field in enumerate(self.fields, start=1):
+            rows.append(self.posting_matrices[field][key[column]])
+        if len(self.rule_positions):
+            rows.append(self.rule_row(self.key_profile(key)))
+        return rows
+
+    @staticmethod
+    def combine(rows: list) -> np.ndarray:
+        out = rows[0].copy()
+        for row in rows[1:]:
+            np.logical_and(out, row, out=out)
+        return out
+
+    def mask(self, quiz) -> np.ndarray:
+        return self.combine(self.rows(quiz))
+
+    def match(self, quiz) -> list:
+        """Indices of eligible schemes, in catalog order."""
+        return np.flatnonzero(self.mask(quiz)).tolist()
+
+    def near_misses(self, rows: list, eligible: np.ndarray, k: int) -> list:
+        """Top-k non-eligible schemes by weighted criteria satisfied.
+
+        Returns (position, score, failed_criteria) tuples, best first, with
+        ties going to the scheme earlier in the catalog. Scoring is one
+        vector add per criterion and selection one partition, so the cost
+        stays linear in the catalog size.
+        """
+        k = min(k, self.size - int(np.count_nonzero(eligible)))
+        if k <= 0:
+            return []
+        # Bool rows viewed as uint8 add without a cast; eligible schemes meet
+        # every criterion and are zeroed so they never rank.
+        score = np.zeros(self.size, dtype=self.score_dtype)
+        for weight, row in zip(self.weights, rows):
+            hits = row.view(np.uint8)
+            np.add(score, hits if weight == 1 else hits * self.score_dtype(weight), out=score)
+        score[eligible] = 0
+        threshold = np.partition(score, self.size - k)[self.size - k]
+        above = np.flatnonzero(score > threshold)
+        at_threshold = score == threshold
+        if threshold == 0:
+            at_threshold &= ~eligible
+        ties = np.flatnonzero(at_threshold)[:k - len(above)]
+        ranked = np.concatenate([above, ties])
+        ranked = ranked[np.lexsort((ranked, -score[ranked].astype(np.int64)))]
+        return [
+            (position, int(score[position]), [c for c, row in zip(self.criteria, rows) if not row[position]])
+            for position in ranked.tolist()
+        ]
+
+    def match_with_fallback(self, quiz, fallback: int = FALLBACK_LIMIT):
+        """Eligible positions, plus near misses when fewer than `fallback` match."""
+        rows = self.rows(quiz)
+        mask = self.combine(rows)
+        eligible = np.flatnonzero(mask).tolist()
+        near = self.near_misses(rows, mask, fallback) if len(eligible) < fallback else []
+        return eligible, near
+
+    def changed_criteria(self, before, after) -> list:
+        """Criteria whose posting row differs between two quizzes."""
+        changed = []
+        if self.age_bucket(before.age) != self.age_bucket(after.age):
+            changed.append('age')
+        for field in self.fields:
+            old, new = getattr(before, field), getattr(after, field)
+            if old != new and self.postings[field].get(old) is not self.postings[field].get(new):
+                changed.append(field)
+        if len(self.rule_positions) and any(getattr(before, f) != getattr(after, f) for f in ('age', *self.rule_fields)):
+            if not np.array_equal(self.rule_results(before), self.rule_results(after)):
+                changed.append('rule')
+        return changed
+
+    def _row_code(self, criterion: str, quiz) -> int:
+        """Row of posting_matrices (or age_matrix) a quiz selects for a criterion."""
+        if criterion == 'age':
+            return self.age_bucket(quiz.age)
+        return self.codes[criterion].get(getattr(quiz, criterion), -1)
+
+    def reevaluate(self, before, after, eligible: list):
+        """(added, removed) positions going from `before`, which matched
+        `eligible`, to `after`.
+
+        Only a previously eligible scheme can be removed, so just those are
+        rechecked against the changed rows. Only a scheme that constrains a
+        changed criterion and accepts the new answer but not the old one can
+        be added; those come from posting rows restricted to the criterion's
+        dependents and are then checked against every criterion.
+        """
+        changed = self.changed_criteria(before, after)
+        if not changed:
+            return [], []
+        rows = self.rows(after)
+        eligible = np.asarray(eligible, dtype=np.intp)
+        kept = np.ones(len(eligible), dtype=bool)
+        gained = []
+        for criterion in changed:
+            kept &= rows[self.criteria.index(criterion)][eligible]
+            if criterion == 'rule':
+                flipped = np.greater(self.rule_results(after), self.rule_results(before))
+                gained.append(self.rule_positions[flipped])
+                continue
+            matrix = self.dependent_matrices[criterion]
+            # Accepts the new answer and not the old one (True > False).
+            flipped = np.greater(matrix[self._row_code(criterion, after)], matrix[self._row_code(criterion, before)])
+            gained.append(self.dependents[criterion][flipped])
+        candidates = gained[0] if len(gained) == 1 else np.unique(np.concatenate(gained))
+        ok = rows[0][candidates]
+        for row in rows[1:]:
+            ok &= row[candidates]
+        return candidates[ok].tolist(), eligible[~kept].tolist()
+
+    def encode(self, frame: pd.DataFrame) -> np.ndarray:
+        """Code a frame of quiz answers as an (rows, 1 + len(fields) +
+        len(rule_fields)) matrix.
+
+        Column 0 is the age bucket, the next ones index into
+        posting_matrices in the order of self.fields and the last ones into
+        rule_vocabulary in the order of self.rule_fields.
+        """
+        keys = np.empty((len(frame), 1 + len(self.fields) + len(self.rule_fields)), dtype=np.intp)
+        keys[:, 0] = np.searchsorted(self.age_breakpoints, frame['age'].to_numpy(np.int64), side='right')
+        for column, field in enumerate(self.fields, start=1):
+            keys[:, column] = pd.Categorical(frame[field], categories=self.vocabulary[field]).codes
+        for column, field in enumerate(self.rule_fields, start=1 + len(self.fields)):
+            keys[:, column] = pd.Categorical(frame[field], categories=self.rule_vocabulary[field]).codes
+        return keys
+
+    def mask_batch(self, keys: np.ndarray) -> np.ndarray:
+        """Eligibility matrix of shape (profiles, schemes) for coded profiles."""
+        out = self.age_matrix[keys[:, 0]]
+        for column, field in enumerate(self.fields, start=1):
+            np.logical_and(out, self.posting_matrices[field][keys[:, column]], out=out)
+        if len(self.rule_positions):
+            for row, key in zip(out, keys):
+                row[self.rule_positions] &= self.rule_results(self.key_profile(key))
+        return out
+
+    def match_batch(self, frame: pd.DataFrame, fallback: int = FALLBACK_LIMIT):
+        """Yield (eligible, near_misses) for every row of frame, as
+        match_with_fallback would.
+
+        Rows are processed in chunks of at most BATCH_CELLS cells so memory
+        stays bounded however large the upload is. Identical profiles within
+        a chunk are evaluated once, and results of recent profiles, holding
+        up to BATCH_CELLS eligible positions between them, are reused by
+        later chunks.
+        """
+        keys = self.encode(frame)
+        chunk = max(1, BATCH_CELLS // max(self.size, 1))
+        recent, held = OrderedDict(), 0
+        for start in range(0, len(keys), chunk):
+            unique, inverse = np.unique(keys[start:start + chunk], axis=0, return_inverse=True)
+            tags = [key.tobytes() for key in unique]
+            missing = [i for i, tag in enumerate(tags) if tag not in recent]
+            if missing:
+                for i, row in zip(missing, self.mask_batch(unique[missing])):
+                    eligible = np.flatnonzero(row)
+                    near = []
+                    if len(eligible) < fallback:
+                        near = self.near_misses(self.key_rows(unique[i]), row, fallback)
+                    recent[tags[i]] = (eligible.tolist(), near)
+                    held += len(eligible)
+            results = []
+            for tag in tags:
+                recent.move_to_end(tag)
+                results.append(recent[tag])
+            while held > BATCH_CELLS:
+                _, (eligible, _) = recent.popitem(last=False)
+                held -= len(eligible)
+            for position in inverse.ravel():
+                yield results[position]
@@ -0,0 +1,308 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from pymongo.monitoring import ConnectionPoolListener
+
+# Seconds; spans a cached quiz hit (~100us) up to a slow bcrypt or Mongo call.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        self.values[labels] = value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., overflow count, sum]
+        self.values = {}
+
+    def observe(self, seconds: float, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, seconds)] += 1
+        series[-1] += seconds
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self):
+        for labels, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            cumulative += series[len(self.buckets)]
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-1]}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    """Metric families plus collectors that report other components' stats.
+
+    A collector is a callable returning (name, kind, help, {labels: value})
+    tuples; it runs only when /metrics is scraped, so components that
+    already keep their own counters (caches, queues) add no hot-path cost.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for collector in self.collectors:
+            for name, kind, help, values in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in values.items():
+                    label_text = _labels([k for k, _ in labels], [v for _, v in labels])
+                    lines.append(f"{name}{label_text} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency per route template.
+
+    The route label is the matched path template (e.g.
+    /api/schemes/save/{scheme_id}) so label cardinality stays bounded;
+    requests that match no route share one label.
+    """
+
+    def __init__(self, app, latency: Histogram, in_flight: Gauge):
+        self.app = app
+        self.latency = latency
+        self.in_flight = in_flight
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        status = [500]
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        self.in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.in_flight.dec()
+            route = scope.get('route')
+            path = route.path if route is not None else '<unmatched>'
+            self.latency.observe(time.perf_counter() - start, scope['method'], path, f"{status[0] // 100}xx")
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor, histogram: Histogram, collection: str):
+        self._cursor = cursor
+        self._histogram = histogram
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if name in ('sort', 'skip', 'limit', 'batch_size', 'hint'):
+            def chained(*args, **kwargs):
+                attr(*args, **kwargs)
+                return self
+            return chained
+        return attr
+
+    async def to_list(self, *args, **kwargs):
+        with self._histogram.time(self._collection, 'to_list'):
+            return await self._cursor.to_list(*args, **kwargs)
+
+    def __aiter__(self):
+        self._iter = self._cursor.__aiter__()
+        return self
+
+    async def __anext__(self):
+        with self._histogram.time(self._collection, 'next'):
+            return await self._iter.__anext__()
+
+
+class InstrumentedCollection:
+    TIMED = ('find_one', 'insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one',
+             'delete_one', 'delete_many', 'count_documents', 'bulk_write')
+
+    def __init__(self, collection, histogram: Histogram):
+        self._collection = collection
+        self._histogram = histogram
+        self.name = collection.name
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in self.TIMED:
+            return attr
+
+        async def timed(*args, **kwargs):
+            with self._histogram.time(self.name, name):
+                return await attr(*args, **kwargs)
+        # Cache on the instance so later lookups skip __getattr__.
+        setattr(self, name, timed)
+        return timed
+
+    def find(self, *args, **kwargs):
+        return InstrumentedCursor(self._collection.find(*args, **kwargs), self._histogram, self.name)
+
+
+class InstrumentedDatabase:
+    """Wraps a Motor database so every collection call is timed by
+    (collection, operation)."""
+
+    def __init__(self, db, histogram: Histogram):
+        self._db = db
+        self._histogram = histogram
+        self._collections = {}
+        self.name = db.name
+
+    def __getitem__(self, name: str) -> InstrumentedCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = InstrumentedCollection(self._db[name], self._histogram)
+        return collection
+
+    DATABASE_METHODS = ('command', 'client', 'list_collection_names', 'drop_collection', 'create_collection')
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in self.DATABASE_METHODS:
+            return getattr(self._db, name)
+        return self[name]
+
+
+class PoolMonitor(ConnectionPoolListener):
+    """CMAP listener keeping connection counts per server pool.
+
+    pymongo calls these from its own threads, so counts are updated under a
+    lock; stats() returns a consistent copy.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def _update(self, address, **deltas):
+        server = f"{address[0]}:{address[1]}"
+        with self._lock:
+            pool = self._pools.get(server)
+            if pool is None:
+                pool = self._pools[server] = dict.fromkeys(
+                    ('open', 'in_use', 'created', 'closed', 'checkout_failures', 'cleared'), 0)
+            for key, delta in deltas.items():
+                pool[key] += delta
+
+    def pool_created(self, event):
+        self._update(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._update(event.address, cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._update(event.address, open=1, created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event.address, open=-1, closed=1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._update(event.address, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._update(event.address, in_use=1)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, in_use=-1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {server: {**pool, 'idle': pool['open'] - pool['in_use']} for server, pool in self._pools.items()}
+
+    def open_connections(self) -> int:
+        with self._lock:
+            return sum(pool['open'] for pool in self._pools.values())
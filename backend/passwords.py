@@ -0,0 +1,62 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import bcrypt
+
+
+class HashQueueFull(Exception):
+    pass
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _verify(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def hash_rounds(hashed: str) -> int:
+    # Modular crypt format: $2b$<cost>$<salt+digest>
+    return int(hashed.split('$')[2])
+
+
+class PasswordHasher:
+    """Runs bcrypt in a worker pool so it never blocks the event loop.
+
+    At most workers + queue_size operations are accepted at once; anything
+    beyond that fails fast with HashQueueFull instead of piling up. bcrypt
+    releases the GIL, so the default thread pool scales across cores; the
+    process pool is there for interpreters where that does not hold.
+    """
+
+    def __init__(self, rounds: int = 12, workers: int = 4, queue_size: int = 64, executor: str = 'thread'):
+        self.rounds = rounds
+        self.workers = workers
+        self.limit = workers + queue_size
+        self.pending = 0
+        if executor == 'process':
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+
+    async def _submit(self, fn, *args):
+        if self.pending >= self.limit:
+            raise HashQueueFull()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(_hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._submit(_verify, password, hashed)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        return hash_rounds(hashed) != self.rounds
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+
+from pymongo import ReplaceOne
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """Buffers documents in memory and writes them with insert_many.
+
+    put() waits when the queue is full, which pushes back on the request
+    path instead of growing memory without bound. A background task flushes
+    once batch_size documents are queued or flush_interval seconds after the
+    first one arrived, whichever comes first. A failed insert_many is logged
+    and its documents counted as dropped; they are not retried.
+    """
+
+    def __init__(self, collection, max_queue: int = 10000, batch_size: int = 500, flush_interval: float = 0.5):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+        self.flushes = 0
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def put(self, doc: dict):
+        await self._queue.put(doc)
+        self.enqueued += 1
+
+    async def drain(self):
+        """Wait until every document put so far has been written or dropped."""
+        target = self.enqueued
+        while self.written + self.dropped < target:
+            await asyncio.sleep(self.flush_interval / 4)
+
+    async def stop(self):
+        """Flush everything queued so far and stop the background task."""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _write(self, batch: list):
+        await self.collection.insert_many(batch, ordered=False)
+
+    async def _flush(self, batch: list):
+        start = time.perf_counter()
+        try:
+            await self._write(batch)
+            self.written += len(batch)
+        except Exception:
+            self.dropped += len(batch)
+            logger.exception("Write-behind flush of %d documents to %s failed", len(batch), self.collection.name)
+        elapsed = time.perf_counter() - start
+        self.flushes += 1
+        self.last_flush_seconds = elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        self.total_flush_seconds += elapsed
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "flushes": self.flushes,
+            "written": self.written,
+            "dropped": self.dropped,
+            "last_flush_seconds": self.last_flush_seconds,
+            "max_flush_seconds": self.max_flush_seconds,
+            "avg_flush_seconds": self.total_flush_seconds / self.flushes if self.flushes else 0.0,
+        }
+
+
+class UpsertBehindQueue(WriteBehindQueue):
+    """A WriteBehindQueue for documents keyed by _id, each replacing the
+    stored one (upsert) in one unordered bulk_write per flush.
+
+    Documents for the same _id within a batch collapse to the latest. Until
+    its flush completes, the latest document per _id is readable from
+    pending, so a reader in this process sees its own writes.
+    """
+
+    def __init__(self, collection, **kwargs):
+        super().__init__(collection, **kwargs)
+        self.pending = {}
+
+    async def put(self, doc: dict):
+        self.pending[doc['_id']] = doc
+        await super().put(doc)
+
+    async def _write(self, batch: list):
+        latest = {doc['_id']: doc for doc in batch}
+        try:
+            await self.collection.bulk_write(
+                [ReplaceOne({"_id": _id}, doc, upsert=True) for _id, doc in latest.items()], ordered=False)
+        finally:
+            for _id, doc in latest.items():
+                if self.pending.get(_id) is doc:
+                    del self.pending[_id]
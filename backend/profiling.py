@@ -0,0 +1,176 @@
+import asyncio
+import heapq
+import logging
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def collapse(frame) -> str:
+    """Render a stack root-first in the collapsed format flamegraph.pl and
+    speedscope read: one frame per segment, separated by semicolons."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class RequestProfile:
+    __slots__ = ('task', 'stacks')
+
+    def __init__(self, task):
+        self.task = task
+        self.stacks = Counter()
+
+
+class SamplingProfiler:
+    """Samples the event loop thread's stack from a background thread.
+
+    A sample is credited to a profiled request only while that request's
+    task is the one running on the loop, so profiles show on-loop CPU time
+    and never time spent awaiting I/O or other requests' work. The sampler
+    thread starts with the first profiled request and idles, blocked on an
+    event, whenever nothing is being profiled. The sampler needs the GIL to
+    take a sample, so intervals below sys.getswitchinterval() (5ms by
+    default) add no resolution and requests shorter than that rarely show.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._active = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._loop = None
+        self._loop_thread_id = None
+
+    def begin(self) -> RequestProfile:
+        if self._thread is None:
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread_id = threading.get_ident()
+            self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+            self._thread.start()
+        profile = RequestProfile(asyncio.current_task())
+        with self._lock:
+            self._active.add(profile)
+        self._wake.set()
+        return profile
+
+    def end(self, profile: RequestProfile):
+        with self._lock:
+            self._active.discard(profile)
+
+    def _run(self):
+        while True:
+            if not self._active:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            time.sleep(self.interval)
+            frame = sys._current_frames().get(self._loop_thread_id)
+            task = asyncio.current_task(self._loop)
+            if frame is None or task is None:
+                continue
+            with self._lock:
+                profiles = [p for p in self._active if p.task is task]
+            if profiles:
+                stack = collapse(frame)
+                for profile in profiles:
+                    profile.stacks[stack] += 1
+
+
+class ProfileStore:
+    """Keeps the slowest `keep` profiles per route as .folded files."""
+
+    def __init__(self, directory: Path, keep: int = 5):
+        self.directory = Path(directory)
+        self.keep = keep
+        self._slowest = {}
+        self._lock = threading.Lock()
+
+    def qualifies(self, route: str, duration: float) -> bool:
+        kept = self._slowest.get(route, [])
+        return len(kept) < self.keep or duration > kept[0][0]
+
+    def save(self, route: str, duration: float, stacks: Counter):
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+        path = self.directory / slug / f"{duration * 1e3:010.1f}ms-{int(time.time())}-{uuid.uuid4().hex[:6]}.folded"
+        with self._lock:
+            if not self.qualifies(route, duration):
+                return
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(''.join(f"{stack} {count}\n" for stack, count in stacks.items()))
+            kept = self._slowest.setdefault(route, [])
+            heapq.heappush(kept, (duration, str(path)))
+            if len(kept) > self.keep:
+                _, evicted = heapq.heappop(kept)
+                try:
+                    os.remove(evicted)
+                except OSError:
+                    pass
+
+    def listing(self) -> dict:
+        with self._lock:
+            return {
+                route: [{"duration_ms": round(d * 1e3, 1), "file": p} for d, p in sorted(kept, reverse=True)]
+                for route, kept in self._slowest.items()
+            }
+
+
+class ProfilingMiddleware:
+    """Profiles requests under `prefix` that ask for it or are sampled.
+
+    A request is profiled when it sends X-Profile: 1 together with a valid
+    X-Admin-Token, or with probability sample_rate. Only install this when
+    profiling is enabled: when it is absent there is nothing on the request
+    path at all.
+    """
+
+    def __init__(self, app, profiler: SamplingProfiler, store: ProfileStore,
+                 sample_rate: float = 0.0, admin_token: str = None, prefix: str = '/api'):
+        self.app = app
+        self.profiler = profiler
+        self.store = store
+        self.sample_rate = sample_rate
+        self.admin_token = admin_token
+        self.prefix = prefix
+
+    def _wanted(self, scope) -> bool:
+        headers = dict(scope['headers'])
+        if headers.get(b'x-profile') == b'1' and self.admin_token:
+            token = headers.get(b'x-admin-token', b'').decode('latin-1')
+            if secrets.compare_digest(token, self.admin_token):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not scope['path'].startswith(self.prefix) or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+        profile = self.profiler.begin()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.end(profile)
+        duration = time.perf_counter() - start
+        route = scope.get('route')
+        if route is None or not profile.stacks:
+            return
+        key = f"{scope['method']} {route.path}"
+        if self.store.qualifies(key, duration):
+            try:
+                await asyncio.to_thread(self.store.save, key, duration, profile.stacks)
+            except OSError:
+                logger.exception("Could not write profile for %s", key)
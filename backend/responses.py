@@ -0,0 +1,82 @@
+from typing import Any
+
+import orjson
+from starlette.requests import Request
+from starlette.responses import Response
+
+
+class Fragments(list):
+    """A JSON array whose items are already-encoded JSON bytes."""
+
+
+def render(content: Any) -> bytes:
+    if isinstance(content, Fragments):
+        return b'[' + b','.join(content) + b']'
+    if isinstance(content, dict):
+        return b'{' + b','.join(orjson.dumps(str(k)) + b':' + render(v) for k, v in content.items()) + b'}'
+    return orjson.dumps(content)
+
+
+class FragmentJSONResponse(Response):
+    """JSON response encoded with orjson that splices in Fragments as-is.
+
+    Only dicts are walked looking for Fragments; anything else is handed to
+    orjson directly.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return render(content)
+
+
+class BufferResponse(Response):
+    """Response whose body may be a memoryview, such as a slice of a mapped
+    catalog snapshot, passed to the server without copying."""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, memoryview):
+            return content
+        return super().render(content)
+
+
+def negotiate_coding(accept_encoding: str, available) -> str:
+    """Pick br, then gzip, from what the client accepts; else identity."""
+    accepted = set()
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q=') and float(q[2:] or 0) == 0:
+            continue
+        accepted.add(coding.strip().lower())
+    for coding in ('br', 'gzip'):
+        if coding in available and (coding in accepted or '*' in accepted):
+            return coding
+    return 'identity'
+
+
+def etag_matches(if_none_match: str, etags) -> bool:
+    if if_none_match.strip() == '*':
+        return True
+    # If-None-Match uses weak comparison, so a W/ prefix does not matter.
+    candidates = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return not candidates.isdisjoint(etags)
+
+
+def conditional_response(request: Request, encoded, cache_control: str) -> Response:
+    """Serve a catalog.EncodedBody honouring Accept-Encoding and If-None-Match."""
+    try:
+        coding = negotiate_coding(request.headers.get('accept-encoding', ''), encoded.bodies)
+    except ValueError:
+        coding = 'identity'
+    headers = {
+        'ETag': encoded.etags[coding],
+        'Cache-Control': cache_control,
+        'Vary': 'Accept-Encoding',
+    }
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and etag_matches(if_none_match, encoded.etags.values()):
+        return Response(status_code=304, headers=headers)
+    if coding != 'identity':
+        headers['Content-Encoding'] = coding
+    return BufferResponse(encoded.bodies[coding], media_type="application/json", headers=headers)
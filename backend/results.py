@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+def result_doc(quiz: dict, submitted_at: str, catalog_version: str, eligible_ids: list) -> dict:
+    """A user's latest quiz and the scheme ids it matched, as stored in
+    user_results under the user's id."""
+    return {
+        "quiz": quiz,
+        "submitted_at": submitted_at,
+        "catalog_version": catalog_version,
+        "eligible_scheme_ids": eligible_ids,
+        "added_scheme_ids": [],
+    }
+
+
+class ResultRematcher:
+    """Re-matches every stored user result against a new catalog version.
+
+    Results are read in _id order, chunk_size at a time, and matched with
+    one match_batch call per chunk. Only users whose eligible set changed
+    are written, in one unordered bulk_write per chunk, with the schemes
+    they gained recorded in added_scheme_ids. Each write is conditional on
+    the stored submitted_at, so a quiz submitted meanwhile is never
+    overwritten with a result computed from the previous one.
+
+    Progress lives in a jobs collection, one document per catalog version
+    holding the last _id done. A process runs a version's job only after
+    claiming that document: every worker may try, one wins, and a job whose
+    owner stops heartbeating for `lease` seconds is taken over and resumed
+    from its checkpoint.
+    """
+
+    def __init__(self, results, jobs, quiz_fields, chunk_size: int = 5000, lease: float = 60.0):
+        self.results = results
+        self.jobs = jobs
+        self.quiz_fields = list(quiz_fields)
+        self.projection = {"quiz": 1, "submitted_at": 1, "eligible_scheme_ids": 1}
+        self.chunk_size = chunk_size
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._task = None
+        self.status = {"state": "idle"}
+        self.processed = 0
+        self.changed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self, catalog) -> bool:
+        """Re-match for `catalog` unless it is already done or owned by
+        another process; a job for an older catalog is abandoned first."""
+        if self.running:
+            if self.status.get("catalog_version") == catalog.version:
+                return False
+            await self.stop()
+        self._task = asyncio.create_task(self._run(catalog))
+        return True
+
+    async def _claim(self, version: str):
+        now = datetime.now(timezone.utc)
+        try:
+            # Matches a job nobody is heartbeating; for a new version the
+            # upsert creates it, for a live or finished one it collides.
+            await self.jobs.update_one(
+                {"_id": version, "state": {"$ne": "done"},
+                 "heartbeat_at": {"$lt": (now - timedelta(seconds=self.lease)).isoformat()}},
+                {"$set": {"owner": self.owner, "state": "running", "heartbeat_at": now.isoformat()},
+                 "$setOnInsert": {"last_id": None, "processed": 0, "changed": 0, "started_at": now.isoformat()}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return None
+        return await self.jobs.find_one({"_id": version})
+
+    async def _checkpoint(self, version: str, last_id, processed: int, changed: int) -> bool:
+        result = await self.jobs.update_one(
+            {"_id": version, "owner": self.owner},
+            {"$set": {"last_id": last_id, "heartbeat_at": datetime.now(timezone.utc).isoformat()},
+             "$inc": {"processed": processed, "changed": changed}},
+        )
+        return result.matched_count == 1
+
+    def _changes(self, catalog, chunk: list) -> list:
+        ids = catalog.ids
+        now = datetime.now(timezone.utc).isoformat()
+        frame = pd.DataFrame([doc['quiz'] for doc in chunk], columns=self.quiz_fields)
+        requests = []
+        # fallback=0: near misses are not stored, so skip ranking them.
+        for doc, (eligible, _) in zip(chunk, catalog.index.match_batch(frame, fallback=0)):
+            before = set(doc.get('eligible_scheme_ids', ()))
+            after = [ids[i] for i in eligible]
+            if before == set(after):
+                continue
+            requests.append(UpdateOne(
+                {"_id": doc['_id'], "submitted_at": doc['submitted_at']},
+                {"$set": {"eligible_scheme_ids": after, "catalog_version": catalog.version, "rematched_at": now,
+                          "added_scheme_ids": [i for i in after if i not in before]}},
+            ))
+        return requests
+
+    async def _run(self, catalog):
+        version = catalog.version
+        self.status = {"state": "claiming", "catalog_version": version}
+        try:
+            while (job := await self._claim(version)) is None:
+                current = await self.jobs.find_one({"_id": version}, {"state": 1, "owner": 1})
+                if current is None or current['state'] == 'done':
+                    self.status.update(state="skipped")
+                    return
+                # Another process is on it; take over if it stops heartbeating.
+                self.status.update(state="waiting", owner=current['owner'])
+                await asyncio.sleep(self.lease)
+            self.status.update(state="running", processed=job['processed'], changed=job['changed'],
+                               resumed_from=job['last_id'])
+            query = {"catalog_version": {"$ne": version}}
+            if job['last_id'] is not None:
+                query["_id"] = {"$gt": job['last_id']}
+            while True:
+                chunk = await self.results.find(query, self.projection).sort("_id", 1).limit(
+                    self.chunk_size).to_list(self.chunk_size)
+                if not chunk:
+                    break
+                requests = await asyncio.to_thread(self._changes, catalog, chunk)
+                if requests:
+                    try:
+                        await self.results.bulk_write(requests, ordered=False)
+                    except BulkWriteError as e:
+                        logger.error("Result re-match write errors: %s", e.details.get('writeErrors'))
+                last_id = chunk[-1]['_id']
+                query["_id"] = {"$gt": last_id}
+                if not await self._checkpoint(version, last_id, len(chunk), len(requests)):
+                    self.status.update(state="lost_lease")
+                    return
+                self.processed += len(chunk)
+                self.changed += len(requests)
+                self.status["processed"] += len(chunk)
+                self.status["changed"] += len(requests)
+                self.status["last_id"] = last_id
+            await self.jobs.update_one(
+                {"_id": version, "owner": self.owner},
+                {"$set": {"state": "done", "finished_at": datetime.now(timezone.utc).isoformat()}},
+            )
+            self.status.update(state="done")
+            logger.info("Re-matched %d stored results for catalog %s, %d changed",
+                        self.status["processed"], version, self.status["changed"])
+        except asyncio.CancelledError:
+            self.status.update(state="cancelled")
+            # Hand the lease back so the job resumes without waiting it out.
+            await self.jobs.update_one({"_id": version, "owner": self.owner}, {"$set": {"heartbeat_at": ""}})
+            raise
+        except Exception as e:
+            logger.exception("Result re-match failed")
+            self.status.update(state="failed", error=str(e))
+
+    async def stop(self):
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
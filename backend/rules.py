@@ -0,0 +1,272 @@
+"""Eligibility rules: boolean combinations of tests on quiz answers.
+
+A scheme's eligibility may carry a `rule` on top of its flat criteria:
+
+    {"all": [rule, ...]}                            every rule holds
+    {"any": [rule, ...]}                            at least one holds
+    {"not": rule}
+    {"field": "state", "in": ["Kerala", "Tamil Nadu"]}
+    {"field": "age", "min": 18, "max": 40}          bounds are inclusive
+    {"field": "income", "max": 300000}              rupees a year
+
+An income range accepts a quiz answer when the answer's whole bracket lies
+inside it, so {"max": 300000} accepts "Below ₹1,00,000" and
+"₹1,00,000 – ₹3,00,000". Rules are parsed, simplified and compiled to
+plain Python functions once per catalog load; evaluate() interprets the
+raw rule instead and is kept as the reference implementation.
+"""
+import operator
+
+MEMBER_FIELDS = ("gender", "state", "area", "income", "occupation", "education", "category", "has_land", "is_disabled")
+RANGE_FIELDS = ("age", "income")
+
+# Annual income bracket of every income answer the quiz offers, as
+# [low, high) in rupees; None means unbounded.
+INCOME_BRACKETS = {
+    "Below ₹1,00,000": (0, 100_000),
+    "₹1,00,000 – ₹3,00,000": (100_000, 300_000),
+    "₹3,00,000 – ₹8,00,000": (300_000, 800_000),
+    "Above ₹8,00,000": (800_000, None),
+}
+
+# Parsed rules are tuples: ('const', bool), ('all', children),
+# ('any', children), ('not', child), ('in', field, frozenset of answers)
+# and ('age', min or None, max or None).
+ALWAYS = ('const', True)
+NEVER = ('const', False)
+
+
+def _bound(leaf: dict, key: str):
+    value = leaf.get(key)
+    if value is not None and (isinstance(value, bool) or not isinstance(value, int)):
+        raise ValueError(f"Rule bound {key!r} must be an integer")
+    return value
+
+
+def income_answers(low, high) -> frozenset:
+    """Income answers whose whole bracket lies within [low, high]."""
+    return frozenset(
+        answer for answer, (start, end) in INCOME_BRACKETS.items()
+        if (low is None or start >= low) and (high is None or (end is not None and end <= high))
+    )
+
+
+def parse_rule(rule) -> tuple:
+    """Validate a rule as stored in the catalog and convert it to tuples.
+
+    Raises ValueError on anything malformed, so the Eligibility model can
+    reject a bad catalog before it is served.
+    """
+    if not isinstance(rule, dict) or len(rule) == 0:
+        raise ValueError("Rule must be a non-empty object")
+    if 'field' not in rule:
+        if len(rule) != 1:
+            raise ValueError(f"Rule must have exactly one of all/any/not, got {sorted(rule)}")
+        (op, operand), = rule.items()
+        if op == 'not':
+            return ('not', parse_rule(operand))
+        if op in ('all', 'any'):
+            if not isinstance(operand, list):
+                raise ValueError(f"{op!r} takes a list of rules")
+            return (op, tuple(parse_rule(child) for child in operand))
+        raise ValueError(f"Unknown rule operator: {op!r}")
+
+    field = rule['field']
+    keys = set(rule) - {'field'}
+    if keys == {'in'}:
+        if field not in MEMBER_FIELDS:
+            raise ValueError(f"Field {field!r} cannot be tested with 'in'")
+        values = rule['in']
+        if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+            raise ValueError("'in' takes a list of strings")
+        return ('in', field, frozenset(values))
+    if keys and keys <= {'min', 'max'}:
+        if field not in RANGE_FIELDS:
+            raise ValueError(f"Field {field!r} cannot be tested with min/max")
+        low, high = _bound(rule, 'min'), _bound(rule, 'max')
+        if field == 'income':
+            return ('in', 'income', income_answers(low, high))
+        return ('age', low, high)
+    raise ValueError(f"Rule on {field!r} must have 'in', or 'min' and/or 'max'")
+
+
+def _domain(eligibility: dict) -> dict:
+    """What a scheme's flat criteria already guarantee whenever its rule
+    decides anything."""
+    domain = {field: frozenset(eligibility[field]) for field in MEMBER_FIELDS if field in eligibility}
+    domain['age'] = (eligibility.get('age_min'), eligibility.get('age_max'))
+    return domain
+
+
+def _simplify_age(low, high, domain) -> tuple:
+    floor, ceiling = domain.get('age', (None, None))
+    if low is not None and floor is not None and low <= floor:
+        low = None
+    if high is not None and ceiling is not None and high >= ceiling:
+        high = None
+    if low is None and high is None:
+        return ALWAYS
+    if ((low is not None and ceiling is not None and low > ceiling)
+            or (high is not None and floor is not None and high < floor)
+            or (low is not None and high is not None and low > high)):
+        return NEVER
+    return ('age', low, high)
+
+
+def _simplify_in(field, values, domain) -> tuple:
+    allowed = domain.get(field)
+    if allowed is not None:
+        if allowed <= values:
+            return ALWAYS
+        values = values & allowed
+    return ('in', field, values) if values else NEVER
+
+
+def _simplify_junction(op, children, domain) -> tuple:
+    # all: True is the identity and False absorbs; any: the reverse.
+    identity, absorbing = (ALWAYS, NEVER) if op == 'all' else (NEVER, ALWAYS)
+    merge = operator.and_ if op == 'all' else operator.or_
+    leaves, ages, rest = {}, [], []
+    for child in children:
+        child = simplify(child, domain)
+        for part in (child[1] if child[0] == op else (child,)):
+            if part == absorbing:
+                return absorbing
+            if part == identity:
+                continue
+            if part[0] == 'in':
+                leaves[part[1]] = merge(leaves[part[1]], part[2]) if part[1] in leaves else part[2]
+            elif part[0] == 'age' and op == 'all':
+                ages.append(part)
+            else:
+                rest.append(part)
+
+    parts = []
+    for field, values in leaves.items():
+        part = _simplify_in(field, values, domain)
+        if part == absorbing:
+            return absorbing
+        if part != identity:
+            parts.append(part)
+    if ages:
+        lows = [low for _, low, _ in ages if low is not None]
+        highs = [high for _, _, high in ages if high is not None]
+        part = _simplify_age(max(lows, default=None), min(highs, default=None), domain)
+        if part == absorbing:
+            return absorbing
+        if part != identity:
+            parts.append(part)
+    # Leaves first: they are the cheapest tests to short-circuit on.
+    parts.extend(rest)
+    if not parts:
+        return identity
+    return parts[0] if len(parts) == 1 else (op, tuple(parts))
+
+
+def simplify(rule: tuple, domain: dict) -> tuple:
+    """Fold a parsed rule down to an equivalent smaller one.
+
+    Constants are propagated, nested all/any flattened, tests on the same
+    field merged, and branches that `domain` (from _domain) already decides
+    dropped. The result is ALWAYS or NEVER when the rule no longer depends
+    on the quiz.
+    """
+    kind = rule[0]
+    if kind == 'const':
+        return rule
+    if kind == 'in':
+        return _simplify_in(rule[1], rule[2], domain)
+    if kind == 'age':
+        return _simplify_age(rule[1], rule[2], domain)
+    if kind == 'not':
+        child = simplify(rule[1], domain)
+        if child[0] == 'const':
+            return ('const', not child[1])
+        return child[1] if child[0] == 'not' else ('not', child)
+    return _simplify_junction(kind, rule[1], domain)
+
+
+def scheme_rule(scheme: dict) -> tuple:
+    """A scheme's rule, parsed and simplified against its flat criteria;
+    ALWAYS when it has none."""
+    eligibility = scheme.get('eligibility', {})
+    if 'rule' not in eligibility:
+        return ALWAYS
+    return simplify(parse_rule(eligibility['rule']), _domain(eligibility))
+
+
+def references(rule: tuple, fields: dict, ages: set):
+    """Collect the answers a simplified rule tests, per field, into
+    `fields` and its age bounds, as bucket edges, into `ages`."""
+    kind = rule[0]
+    if kind == 'in':
+        fields.setdefault(rule[1], set()).update(rule[2])
+    elif kind == 'age':
+        fields.setdefault('age', set())
+        if rule[1] is not None:
+            ages.add(rule[1])
+        if rule[2] is not None:
+            ages.add(rule[2] + 1)
+    elif kind == 'not':
+        references(rule[1], fields, ages)
+    elif kind in ('all', 'any'):
+        for child in rule[1]:
+            references(child, fields, ages)
+
+
+def _source(rule: tuple) -> str:
+    kind = rule[0]
+    if kind == 'const':
+        return repr(rule[1])
+    if kind == 'in':
+        _, field, values = rule
+        if len(values) == 1:
+            return f"q.{field} == {next(iter(values))!r}"
+        # A set display after `in` compiles to a frozenset constant.
+        return f"q.{field} in {{{', '.join(repr(v) for v in sorted(values))}}}"
+    if kind == 'age':
+        _, low, high = rule
+        if low is not None and high is not None:
+            return f"{low} <= q.age <= {high}"
+        return f"q.age >= {low}" if low is not None else f"q.age <= {high}"
+    if kind == 'not':
+        return f"not ({_source(rule[1])})"
+    return f" {'and' if kind == 'all' else 'or'} ".join(f"({_source(child)})" for child in rule[1])
+
+
+def compile_rules(rules: list) -> list:
+    """Compile simplified rules into functions of a quiz, in order.
+
+    All rules of a catalog become one generated module, compiled once, in
+    which each test reads the quiz attribute and compares it with an
+    inlined constant; identical rules share a function. The source is
+    built only from whitelisted field names, integers and repr()'d
+    strings.
+    """
+    sources = [_source(rule) for rule in rules]
+    unique = list(dict.fromkeys(sources))
+    code = '\n'.join(f"def rule_{n}(q):\n    return {source}" for n, source in enumerate(unique))
+    namespace = {}
+    exec(compile(code, '<eligibility rules>', 'exec'), namespace)
+    functions = {source: namespace[f'rule_{n}'] for n, source in enumerate(unique)}
+    return [functions[source] for source in sources]
+
+
+def evaluate(rule: dict, quiz) -> bool:
+    """Interpret a raw rule against a quiz, re-reading it on every call."""
+    if 'all' in rule:
+        return all(evaluate(child, quiz) for child in rule['all'])
+    if 'any' in rule:
+        return any(evaluate(child, quiz) for child in rule['any'])
+    if 'not' in rule:
+        return not evaluate(rule['not'], quiz)
+    answer = getattr(quiz, rule['field'])
+    if 'in' in rule:
+        return answer in rule['in']
+    low, high = rule.get('min'), rule.get('max')
+    if rule['field'] == 'income':
+        if answer not in INCOME_BRACKETS:
+            return False
+        start, end = INCOME_BRACKETS[answer]
+        return (low is None or start >= low) and (high is None or (end is not None and end <= high))
+    return (low is None or answer >= low) and (high is None or answer <= high)
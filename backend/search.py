@@ -0,0 +1,561 @@
+import bisect
+import heapq
+import math
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+
+# Text fields indexed per scheme, with their weight in a document's term
+# frequencies (a simple BM25F: a hit in the name counts three times).
+FIELD_WEIGHTS = {"name": 3, "category": 2, "description": 1, "benefits": 1}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Completions of the last, still being typed, query word that are searched.
+PREFIX_EXPANSIONS = 8
+SUGGESTIONS = 10
+
+# Impacts are normalized against the average document length at the time
+# they were computed; renormalize everything once it drifts this far.
+AVGDL_DRIFT = 0.2
+
+_TOKEN = re.compile(r"[\w\u0900-\u097f]+")
+
+_VOWELS = {
+    'अ': 'a', 'आ': 'aa', 'इ': 'i', 'ई': 'ii', 'उ': 'u', 'ऊ': 'uu', 'ऋ': 'ri',
+    'ए': 'e', 'ऐ': 'ai', 'ओ': 'o', 'औ': 'au', 'ऑ': 'o', 'ऍ': 'e',
+}
+_VOWEL_SIGNS = {
+    'ा': 'aa', 'ि': 'i', 'ी': 'ii', 'ु': 'u', 'ू': 'uu', 'ृ': 'ri',
+    'े': 'e', 'ै': 'ai', 'ो': 'o', 'ौ': 'au', 'ॉ': 'o', 'ॅ': 'e',
+}
+_CONSONANTS = {
+    'क': 'k', 'ख': 'kh', 'ग': 'g', 'घ': 'gh', 'ङ': 'n',
+    'च': 'ch', 'छ': 'chh', 'ज': 'j', 'झ': 'jh', 'ञ': 'n',
+    'ट': 't', 'ठ': 'th', 'ड': 'd', 'ढ': 'dh', 'ण': 'n',
+    'त': 't', 'थ': 'th', 'द': 'd', 'ध': 'dh', 'न': 'n',
+    'प': 'p', 'फ': 'ph', 'ब': 'b', 'भ': 'bh', 'म': 'm',
+    'य': 'y', 'र': 'r', 'ल': 'l', 'व': 'v', 'श': 'sh', 'ष': 'sh', 'स': 's', 'ह': 'h',
+    'क़': 'q', 'ख़': 'kh', 'ग़': 'g', 'ज़': 'z', 'ड़': 'r', 'ढ़': 'rh', 'फ़': 'f', 'य़': 'y',
+}
+_MARKS = {'ं': 'n', 'ँ': 'n', 'ः': 'h'}
+_VIRAMA = '्'
+_NUKTA = '़'
+
+STOPWORDS = {"a", "an", "and", "for", "in", "of", "on", "or", "the", "to", "with", "ka", "ki", "ke", "aur", "se"}
+
+
+def transliterate(word: str) -> str:
+    """Romanize Devanagari roughly as it is commonly typed in Latin script."""
+    out = []
+    chars = unicodedata.normalize('NFC', word)
+    i = 0
+    while i < len(chars):
+        char = chars[i]
+        if i + 1 < len(chars) and chars[i + 1] == _NUKTA:
+            char, i = char + _NUKTA, i + 1
+            char = unicodedata.normalize('NFC', char)
+        i += 1
+        if char in _CONSONANTS:
+            out.append(_CONSONANTS[char])
+            following = chars[i] if i < len(chars) else ''
+            if following == _VIRAMA:
+                i += 1
+            elif following not in _VOWEL_SIGNS:
+                out.append('a')
+        elif char in _VOWEL_SIGNS:
+            out.append(_VOWEL_SIGNS[char])
+        elif char in _VOWELS:
+            out.append(_VOWELS[char])
+        elif char in _MARKS:
+            out.append(_MARKS[char])
+        elif char != _NUKTA:
+            out.append(char)
+    return ''.join(out)
+
+
+@lru_cache(maxsize=1 << 16)
+def fold(word: str) -> str:
+    """Index key for a word: Hindi and its various romanizations fold together.
+
+    After romanizing and stripping accents, long vowels are shortened, runs
+    of a letter collapsed and every 'a' after the first letter dropped, so
+    योजना, yojana and yojna all become "yojn". Folding works a character at
+    a time, so the key of a prefix is a prefix of the key of the word. Plain
+    English plurals lose their s.
+    """
+    word = word.lower()
+    if len(word) > 4 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')) and word.isascii():
+        word = word[:-1]
+    word = transliterate(word)
+    word = ''.join(c for c in unicodedata.normalize('NFKD', word) if not unicodedata.combining(c))
+    word = word.replace('w', 'v').replace('ee', 'i').replace('oo', 'u')
+    word = re.sub(r'(.)\1+', r'\1', word)
+    return word[:1] + word[1:].replace('a', '')
+
+
+def field_text(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return '\n'.join(str(v) for v in value)
+    return str(value or '')
+
+
+def words(text: str) -> list:
+    return _TOKEN.findall(text.lower())
+
+
+def tokenize(text: str) -> list:
+    return [fold(w) for w in words(text) if w not in STOPWORDS]
+
+
+# Hindi words and the English ones schemes are described with. Folding only
+# merges spellings of one word (पेंशन and penshan), not translations or
+# borrowings spelt differently (पेंशन and pension), so queries expand each
+# term through this table, in both directions.
+SYNONYMS = [
+    ("पेंशन", "pension"), ("छात्रवृत्ति", "scholarship"), ("स्कॉलरशिप", "scholarship"),
+    ("किसान", "farmer"), ("कृषि", "agriculture"), ("खेती", "farming"), ("आवास", "housing"),
+    ("घर", "house"), ("स्वास्थ्य", "health"), ("हेल्थ", "health"), ("बीमा", "insurance"),
+    ("इंश्योरेंस", "insurance"), ("ऋण", "loan"), ("लोन", "loan"), ("महिला", "women"),
+    ("महिलाओं", "women"), ("छात्र", "student"), ("विद्यार्थी", "student"), ("शिक्षा", "education"),
+    ("रोजगार", "employment"), ("रोज़गार", "employment"), ("नौकरी", "job"), ("कौशल", "skill"),
+    ("विकलांग", "disability"), ("दिव्यांग", "disability"), ("मातृत्व", "maternity"),
+    ("ग्रामीण", "rural"), ("गांव", "village"), ("सब्सिडी", "subsidy"), ("अनुदान", "grant"),
+    ("बुजुर्ग", "senior"), ("वृद्धावस्था", "old"), ("विधवा", "widow"), ("बच्चे", "children"),
+]
+
+
+def _synonym_table(pairs) -> dict:
+    # Every word given for one English word matches all the others.
+    groups = {}
+    for hindi, english in pairs:
+        groups.setdefault(fold(english), {fold(english)}).add(fold(hindi))
+    return {term: sorted(group - {term}) for group in groups.values() for term in group}
+
+
+_SYNONYMS = _synonym_table(SYNONYMS)
+
+
+def synonyms(term: str) -> list:
+    """Folded terms a query term also matches, across Hindi and English."""
+    return _SYNONYMS.get(term, [])
+
+
+class _Node:
+    __slots__ = ('children', 'term', 'weight', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.term = None
+        self.weight = 0
+        self.top = []
+
+    def clone(self) -> '_Node':
+        node = _Node()
+        node.children = dict(self.children)
+        node.term, node.weight, node.top = self.term, self.weight, self.top
+        return node
+
+
+class PrefixTrie:
+    """Terms with weights; complete(prefix) returns the heaviest terms under it.
+
+    Every node caches its best `limit` (-weight, term) pairs, which depend
+    only on its own term and its children's caches, so a lookup is a walk
+    down the prefix and an update refreshes just the nodes on one path.
+    Updates replace the nodes on that path instead of changing them, so a
+    copy() shares every other node and neither sees the other's updates.
+    """
+
+    def __init__(self, limit: int = SUGGESTIONS):
+        self.limit = limit
+        self.root = _Node()
+
+    def copy(self) -> 'PrefixTrie':
+        trie = PrefixTrie(self.limit)
+        trie.root = self.root
+        return trie
+
+    def _refresh(self, node: _Node):
+        candidates = [(-node.weight, node.term)] if node.weight else []
+        for child in node.children.values():
+            candidates.extend(child.top)
+        node.top = heapq.nsmallest(self.limit, candidates)
+
+    def set(self, term: str, weight: int):
+        """Insert or reweight a term; a weight of 0 removes it."""
+        path = [self.root.clone()]
+        for char in term:
+            node = path[-1].children.get(char)
+            if node is None:
+                if not weight:
+                    return
+                node = _Node()
+            else:
+                node = node.clone()
+            path[-1].children[char] = node
+            path.append(node)
+        self.root = path[0]
+        leaf = path[-1]
+        leaf.term, leaf.weight = (term, weight) if weight else (None, 0)
+        for depth in range(len(path) - 1, -1, -1):
+            node = path[depth]
+            if depth and not node.weight and not node.children:
+                del path[depth - 1].children[term[depth - 1]]
+                continue
+            before = node.top
+            self._refresh(node)
+            if node.top == before and depth < len(path) - 1:
+                # Ancestors only see this node through its cache.
+                break
+
+    def build(self, weights: dict):
+        """Replace the contents with {term: weight}, refreshing each node once."""
+        self.root = _Node()
+        for term, weight in weights.items():
+            if not weight:
+                continue
+            node = self.root
+            for char in term:
+                node = node.children.setdefault(char, _Node())
+            node.term, node.weight = term, weight
+        stack, order = [self.root], []
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(node.children.values())
+        for node in reversed(order):
+            self._refresh(node)
+
+    def complete(self, prefix: str) -> list:
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return [term for _, term in node.top]
+
+
+class _Ranking:
+    """BM25 scoring and prefix expansion shared by SearchIndex and
+    CompiledSearchIndex, over their term lookups."""
+
+    def _idf(self, term: str) -> float:
+        df = self._df(term)
+        return math.log(1 + (len(self) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, limit: int = 10, prefix: bool = True):
+        """Ranked (scheme_id, score) pairs and completions for the last word.
+
+        With prefix set and no trailing space in the query, the last word is
+        treated as unfinished and expanded to its most common completions;
+        a document scores its best completion, not their sum.
+        """
+        terms = tokenize(query)
+        if not terms or not len(self):
+            return [], []
+        # A document scores its best match within each group.
+        groups = [[t, *synonyms(t)] for t in terms]
+        suggestions = []
+        if prefix and not query[-1].isspace():
+            completions = self.complete(terms[-1])
+            suggestions = [self.display(t) for t in completions]
+            expansions = completions[:PREFIX_EXPANSIONS]
+            for term in groups[-1]:
+                if self._has(term) and term not in expansions:
+                    expansions.append(term)
+            groups[-1] = expansions
+        scores = np.zeros(self._slots(), dtype=np.float32)
+        for group in groups:
+            group = [t for t in group if self._has(t)]
+            if len(group) == 1:
+                docs, impacts = self._term_arrays(group[0])
+                scores[docs] += self._idf(group[0]) * impacts
+            elif group:
+                best = np.zeros_like(scores)
+                for term in group:
+                    docs, impacts = self._term_arrays(term)
+                    best[docs] = np.maximum(best[docs], self._idf(term) * impacts)
+                scores += best
+        hits = np.flatnonzero(scores)
+        if len(hits) > limit:
+            hits = hits[np.argpartition(-scores[hits], limit - 1)[:limit]]
+        hits = hits[np.lexsort((hits, -scores[hits]))]
+        return [(self._scheme_id(d), round(float(scores[d]), 4)) for d in hits.tolist()], suggestions
+
+
+class SearchIndex(_Ranking):
+    """BM25 full-text index over the scheme catalog with prefix completion.
+
+    update() takes the whole catalog and re-indexes only schemes whose text
+    changed, so it can run on every catalog swap. Postings hold each term's
+    BM25 term-frequency component per document; idf is applied at query
+    time, so adding or removing documents never rewrites other postings.
+    A catalog swap updates a copy() of the serving index, which keeps
+    answering searches meanwhile.
+    """
+
+    def __init__(self):
+        self.schemes = {}       # scheme id -> doc number
+        self.doc_ids = []       # doc number -> scheme id, None once removed
+        self.doc_terms = {}     # doc number -> {term: weighted tf}
+        self.doc_fields = {}    # doc number -> indexed field values, to spot changes
+        self.doc_len = {}
+        self.total_len = 0
+        self.postings = {}      # term -> {doc number: impact}
+        self.surface = {}       # term -> Counter of words it was folded from
+        self.trie = PrefixTrie()
+        self.norm_avgdl = 0.0
+        self._arrays = {}
+        self._owned = set()     # terms whose postings and surface dicts no copy shares
+
+    def copy(self) -> 'SearchIndex':
+        """An index that update() can change without touching this one.
+
+        Only the top-level tables are copied up front; a term's postings
+        and surface counts are copied the first time update() changes them,
+        and trie nodes as their paths are rewritten.
+        """
+        index = SearchIndex.__new__(SearchIndex)
+        index.__dict__.update(self.__dict__)
+        for name in ('schemes', 'doc_terms', 'doc_fields', 'doc_len', 'postings', 'surface', '_arrays'):
+            setattr(index, name, dict(getattr(self, name)))
+        index.doc_ids = list(self.doc_ids)
+        index.trie = self.trie.copy()
+        index._owned = set()
+        # Both now share every per-term dict.
+        self._owned = set()
+        return index
+
+    def _own(self, term: str):
+        if term not in self._owned:
+            self._owned.add(term)
+            if term in self.postings:
+                self.postings[term] = dict(self.postings[term])
+            if term in self.surface:
+                self.surface[term] = Counter(self.surface[term])
+
+    def __len__(self):
+        return len(self.schemes)
+
+    @property
+    def avgdl(self) -> float:
+        return self.total_len / len(self.schemes) if self.schemes else 0.0
+
+    def _impact(self, tf: float, length: float) -> float:
+        return tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / self.norm_avgdl))
+
+    def _add(self, scheme_id: str, fields: tuple, touched: set):
+        doc = len(self.doc_ids)
+        self.doc_ids.append(scheme_id)
+        self.schemes[scheme_id] = doc
+        self.doc_fields[doc] = fields
+        terms = Counter()
+        for field, value in zip(FIELD_WEIGHTS, fields):
+            for word in words(field_text(value)):
+                if word in STOPWORDS:
+                    continue
+                term = fold(word)
+                terms[term] += FIELD_WEIGHTS[field]
+                self._own(term)
+                self.surface.setdefault(term, Counter())[word] += 1
+        self.doc_terms[doc] = terms
+        self.doc_len[doc] = sum(terms.values())
+        self.total_len += self.doc_len[doc]
+        touched.update(terms)
+
+    def _remove(self, scheme_id: str, touched: set):
+        doc = self.schemes.pop(scheme_id)
+        self.doc_ids[doc] = None
+        for value in self.doc_fields.pop(doc):
+            for word in words(field_text(value)):
+                if word in STOPWORDS:
+                    continue
+                term = fold(word)
+                self._own(term)
+                surface = self.surface[term]
+                surface[word] -= 1
+                if surface[word] <= 0:
+                    del surface[word]
+        for term in self.doc_terms.pop(doc):
+            self._own(term)
+            self.postings[term].pop(doc, None)
+            touched.add(term)
+        self.total_len -= self.doc_len.pop(doc)
+
+    def _post(self, docs):
+        for doc in docs:
+            length = self.doc_len[doc]
+            for term, tf in self.doc_terms[doc].items():
+                self._own(term)
+                self.postings.setdefault(term, {})[doc] = self._impact(tf, length)
+
+    def update(self, schemes) -> dict:
+        """Bring the index in line with a catalog; returns what changed."""
+        wanted = {}
+        for scheme in schemes:
+            wanted[scheme['id']] = tuple(scheme.get(field) for field in FIELD_WEIGHTS)
+        touched = set()
+        removed = [i for i, doc in self.schemes.items() if self.doc_fields[doc] != wanted.get(i)]
+        for scheme_id in removed:
+            self._remove(scheme_id, touched)
+        added = [i for i in wanted if i not in self.schemes]
+        start = len(self.doc_ids)
+        for scheme_id in added:
+            self._add(scheme_id, wanted[scheme_id], touched)
+
+        if not self.norm_avgdl or abs(self.avgdl - self.norm_avgdl) > AVGDL_DRIFT * self.norm_avgdl:
+            self.norm_avgdl = self.avgdl or 1.0
+            self._post(self.doc_terms)
+            touched = set(self.postings)
+        else:
+            self._post(range(start, len(self.doc_ids)))
+
+        # Renumber once dead documents outnumber live ones so query-time
+        # score arrays stay proportional to the catalog.
+        if len(self.doc_ids) > 2 * len(self.schemes) + 64:
+            self._compact()
+            touched = set(self.postings)
+
+        for term in touched:
+            self._arrays.pop(term, None)
+            if term in self.postings and not self.postings[term]:
+                del self.postings[term]
+                del self.surface[term]
+            elif term in self.postings:
+                self._term_arrays(term)
+        if len(touched) > len(self.postings) // 4:
+            self.trie.build({term: len(postings) for term, postings in self.postings.items()})
+        else:
+            for term in touched:
+                self.trie.set(term, len(self.postings.get(term, ())))
+        return {"added": len(added) - len(set(added) & set(removed)),
+                "removed": len(set(removed) - set(wanted)),
+                "changed": len(set(added) & set(removed))}
+
+    def _compact(self):
+        live = sorted(self.schemes.values())
+        renumber = {old: new for new, old in enumerate(live)}
+        self.doc_ids = [self.doc_ids[old] for old in live]
+        self.schemes = {scheme_id: new for new, scheme_id in enumerate(self.doc_ids)}
+        self.doc_terms = {renumber[d]: v for d, v in self.doc_terms.items()}
+        self.doc_fields = {renumber[d]: v for d, v in self.doc_fields.items()}
+        self.doc_len = {renumber[d]: v for d, v in self.doc_len.items()}
+        self.postings = {t: {renumber[d]: v for d, v in p.items()} for t, p in self.postings.items()}
+
+    def _term_arrays(self, term: str):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self.postings[term]
+            arrays = self._arrays[term] = (
+                np.fromiter(postings.keys(), dtype=np.intp, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float32, count=len(postings)),
+            )
+        return arrays
+
+    def _has(self, term: str) -> bool:
+        return term in self.postings
+
+    def _df(self, term: str) -> int:
+        return len(self.postings[term])
+
+    def _slots(self) -> int:
+        return len(self.doc_ids)
+
+    def _scheme_id(self, doc: int) -> str:
+        return self.doc_ids[doc]
+
+    def complete(self, prefix: str) -> list:
+        return self.trie.complete(prefix)
+
+    def display(self, term: str) -> str:
+        return self.surface[term].most_common(1)[0][0]
+
+    def compile(self, ids: list) -> tuple:
+        """(meta, arrays) for CompiledSearchIndex, with documents numbered
+        by their position in `ids`, the catalog order."""
+        positions = {scheme_id: i for i, scheme_id in enumerate(ids)}
+        # Removed schemes keep their number until compaction but no postings.
+        doc_position = np.array([positions.get(scheme_id, -1) for scheme_id in self.doc_ids], dtype=np.int32)
+        terms = sorted(self.postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        docs, impacts = [], []
+        for n, term in enumerate(terms):
+            term_docs, term_impacts = self._term_arrays(term)
+            term_docs = doc_position[term_docs]
+            order = np.argsort(term_docs)
+            docs.append(term_docs[order])
+            impacts.append(term_impacts[order])
+            offsets[n + 1] = offsets[n] + len(order)
+        meta = {'size': len(self.schemes), 'terms': terms, 'display': [self.display(t) for t in terms]}
+        arrays = {
+            'offsets': offsets,
+            'docs': np.concatenate(docs) if docs else np.zeros(0, dtype=np.int32),
+            'impacts': np.concatenate(impacts) if impacts else np.zeros(0, dtype=np.float32),
+        }
+        return meta, arrays
+
+
+class CompiledSearchIndex(_Ranking):
+    """A read-only SearchIndex flattened into arrays, as stored in catalog
+    snapshot files.
+
+    Each term's postings are a slice of one docs/impacts pair of arrays,
+    with documents numbered by catalog position, so the arrays can be views
+    of a shared mapping. Completions come from a binary search over the
+    sorted terms instead of a trie. Scores match the index it was compiled
+    from; equal scores are ordered by catalog position.
+    """
+
+    def __init__(self, ids: list, meta: dict, arrays: dict):
+        self.ids = ids
+        self.meta = meta
+        self.arrays = arrays
+        self.size = meta['size']
+        self.terms = meta['terms']
+        self.displays = meta['display']
+        self.rows = {term: row for row, term in enumerate(self.terms)}
+        self.offsets = arrays['offsets']
+        self.docs = arrays['docs']
+        self.impacts = arrays['impacts']
+        self.df = np.diff(self.offsets)
+
+    def __len__(self):
+        return self.size
+
+    def compile(self, ids: list) -> tuple:
+        return self.meta, self.arrays
+
+    def _has(self, term: str) -> bool:
+        return term in self.rows
+
+    def _df(self, term: str) -> int:
+        return int(self.df[self.rows[term]])
+
+    def _slots(self) -> int:
+        return len(self.ids)
+
+    def _scheme_id(self, doc: int) -> str:
+        return self.ids[doc]
+
+    def _term_arrays(self, term: str):
+        row = self.rows[term]
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return self.docs[start:end], self.impacts[start:end]
+
+    def complete(self, prefix: str) -> list:
+        # Terms starting with prefix are contiguous in sorted order.
+        low = bisect.bisect_left(self.terms, prefix)
+        high = bisect.bisect_left(self.terms, prefix + '\U0010ffff', low)
+        if low == high:
+            return []
+        # Heaviest first, ties in term order, as PrefixTrie ranks them.
+        order = np.lexsort((np.arange(high - low), -self.df[low:high]))[:SUGGESTIONS]
+        return [self.terms[low + i] for i in order.tolist()]
+
+    def display(self, term: str) -> str:
+        return self.displays[self.rows[term]]
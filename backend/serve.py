@@ -0,0 +1,78 @@
+"""Serve the API from several worker processes sharing one compiled catalog.
+
+Run from the backend directory:
+
+    WEB_CONCURRENCY=4 python serve.py
+
+This process compiles the scheme catalog into CATALOG_SNAPSHOT_DIR, keeps
+watching the scheme source on a background thread and republishes the
+snapshot on every change. Workers map the file the CURRENT pointer names
+and follow it, so they start without compiling anything and share the
+catalog through the page cache. Each new snapshot is published with an
+activation time CATALOG_SWAP_DELAY seconds ahead, by which every worker has
+loaded it, so they switch versions together. The snapshot carries the
+search index as well, and workers parse the raw scheme list only if
+something asks for it. Caches are still kept by each worker; revoked
+tokens go to Mongo unless TOKEN_REVOCATION_STORE says otherwise, so a
+logout reaches every worker.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import uvicorn
+from dotenv import load_dotenv
+
+from catalog import CatalogSnapshot, CatalogStore, CatalogWatcher, FileCatalogSource, MongoCatalogSource, read_catalog_file
+from snapshot_file import publish_snapshot
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+# The catalog settings server.py reads. It is not imported here: that would
+# build a Mongo client, a password hashing pool and a second catalog this
+# process never uses.
+SCHEMES_SOURCE = os.environ.get('SCHEMES_SOURCE', 'file')
+SCHEMES_FILE = Path(os.environ.get('SCHEMES_FILE', ROOT_DIR / 'schemes.json'))
+CATALOG_POLL_INTERVAL = float(os.environ.get('CATALOG_POLL_INTERVAL', 5))
+CATALOG_SNAPSHOT_DIR = Path(os.environ.get('CATALOG_SNAPSHOT_DIR', ROOT_DIR / 'snapshots'))
+# Must exceed the workers' poll interval, or a slow one swaps late.
+CATALOG_SWAP_DELAY = float(os.environ.get('CATALOG_SWAP_DELAY', 2 * CATALOG_POLL_INTERVAL))
+
+
+async def publish(store: CatalogStore):
+    if SCHEMES_SOURCE == 'mongo':
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        collection = client[os.environ['DB_NAME']][os.environ.get('SCHEMES_COLLECTION', 'schemes')]
+        watcher = CatalogWatcher(store, MongoCatalogSource(collection, CATALOG_POLL_INTERVAL))
+        await watcher.prime()
+    else:
+        watcher = CatalogWatcher(store, FileCatalogSource(SCHEMES_FILE, CATALOG_POLL_INTERVAL))
+    watcher.start()
+    await asyncio.Event().wait()
+
+
+def main():
+    port = int(os.environ.get("PORT", 8000))
+    workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+    directory = CATALOG_SNAPSHOT_DIR
+
+    store = CatalogStore(CatalogSnapshot(read_catalog_file(SCHEMES_FILE)))
+    publish_snapshot(store.snapshot, directory)
+    store.add_listener(lambda snapshot, previous: publish_snapshot(
+        snapshot, directory, activate_at=time.time() + CATALOG_SWAP_DELAY))
+
+    threading.Thread(target=asyncio.run, args=(publish(store),), name='catalog-publisher', daemon=True).start()
+    # Workers are spawned after this, so they inherit these and map the snapshot.
+    os.environ['SERVE_FROM_SNAPSHOT'] = '1'
+    os.environ.setdefault('TOKEN_REVOCATION_STORE', 'mongo')
+    uvicorn.run("server:app", host="0.0.0.0", port=port, workers=workers)
+
+
+if __name__ == "__main__":
+    main()
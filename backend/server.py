@@ -1,29 +1,165 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Header, Query, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 import os
+import asyncio
+import io
+import base64
+import contextlib
+import binascii
+import json
 import logging
+import secrets
+import time
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, ValidationError
+from typing import List, Literal, Optional
 import uuid
-from datetime import datetime, timezone, timedelta
-import bcrypt
+from datetime import date, datetime, timezone, timedelta
 import jwt
+import numpy as np
+import orjson
+import pandas as pd
+
+from admission import AdmissionController, AdmissionRejected, MemoryBucketStore
+from analytics import DIMENSIONS, TOTAL, RollupAggregator, RollupBackfill, read_rollups, today
+from cache import LRUCache, MemoryRevocationStore, MongoRevocationStore, QuizResultCache, TokenCache, token_digest
+from catalog import (
+    CatalogError, CatalogSnapshot, CatalogStore, CatalogWatcher,
+    FileCatalogSource, MongoCatalogSource, read_catalog_file,
+)
+from exports import FORMATS, export_query, parse_id, resume_query, stream_export
+from indexes import MissingIndexError, ensure_indexes
+from matching import FALLBACK_LIMIT
+from metrics import InstrumentedDatabase, MetricsMiddleware, PoolMonitor, Registry
+from passwords import PasswordHasher, HashQueueFull
+from persistence import UpsertBehindQueue, WriteBehindQueue
+from profiling import ProfileStore, ProfilingMiddleware, SamplingProfiler
+from responses import FragmentJSONResponse, Fragments, conditional_response
+from results import ResultRematcher, result_doc
+from rules import evaluate as evaluate_rule
+from snapshot_file import SnapshotFollower, current_snapshot, load_snapshot
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+metrics = Registry()
+REQUEST_LATENCY = metrics.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route template', ('method', 'route', 'status'))
+REQUESTS_IN_FLIGHT = metrics.gauge('http_requests_in_flight', 'HTTP requests currently being served')
+MONGO_LATENCY = metrics.histogram(
+    'mongo_operation_duration_seconds', 'Motor call latency', ('collection', 'operation'))
+SECTION_LATENCY = metrics.histogram(
+    'section_duration_seconds', 'CPU-heavy sections: password hashing and eligibility matching', ('section',))
+ADMISSION_REJECTIONS = metrics.counter(
+    'auth_admission_rejections_total', 'Auth requests shed before any hashing, by reason', ('reason',))
+
+# Connection pool settings. The client connects lazily; the lifespan warms
+# MONGO_MIN_POOL_SIZE connections before /ready reports ready.
+MONGO_POOL_OPTIONS = {
+    'maxPoolSize': int(os.environ.get('MONGO_MAX_POOL_SIZE', 100)),
+    'minPoolSize': int(os.environ.get('MONGO_MIN_POOL_SIZE', 10)),
+    'maxIdleTimeMS': int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 300000)),
+    'connectTimeoutMS': int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 10000)),
+    'serverSelectionTimeoutMS': int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000)),
+    'waitQueueTimeoutMS': int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 10000)),
+}
+pool_monitor = PoolMonitor()
+# How often warm-up retries a required unique index that failed to build.
+INDEX_RETRY_SECONDS = float(os.environ.get('INDEX_RETRY_SECONDS', 30))
+
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+client = AsyncIOMotorClient(mongo_url, event_listeners=[pool_monitor], **MONGO_POOL_OPTIONS)
+db = InstrumentedDatabase(client[os.environ['DB_NAME']], MONGO_LATENCY)
 
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
 JWT_ALGORITHM = 'HS256'
 
-app = FastAPI()
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+QUIZ_CACHE_SIZE = int(os.environ.get('QUIZ_CACHE_SIZE', 4096))
+RESULT_TOKEN_CACHE_SIZE = int(os.environ.get('RESULT_TOKEN_CACHE_SIZE', 10000))
+# Logouts must reach every worker: with several (serve.py), revocations go
+# to Mongo ('mongo'); a single process can keep them in memory ('memory').
+TOKEN_REVOCATION_STORE = os.environ.get('TOKEN_REVOCATION_STORE', 'memory')
+token_cache = TokenCache(
+    int(os.environ.get('TOKEN_CACHE_SIZE', 10000)),
+    MemoryRevocationStore(int(os.environ.get('TOKEN_REVOCATION_MAX', 100000))),
+)
+SCHEMES_SOURCE = os.environ.get('SCHEMES_SOURCE', 'file')
+SCHEMES_FILE = Path(os.environ.get('SCHEMES_FILE', ROOT_DIR / 'schemes.json'))
+CATALOG_POLL_INTERVAL = float(os.environ.get('CATALOG_POLL_INTERVAL', 5))
+# Multi-process serving (serve.py) compiles the catalog into
+# CATALOG_SNAPSHOT_DIR; its workers run with SERVE_FROM_SNAPSHOT=1 and map
+# the compiled snapshot instead of building their own.
+CATALOG_SNAPSHOT_DIR = Path(os.environ.get('CATALOG_SNAPSHOT_DIR', ROOT_DIR / 'snapshots'))
+SERVE_FROM_SNAPSHOT = os.environ.get('SERVE_FROM_SNAPSHOT') == '1'
+CATALOG_CACHE_CONTROL = f"public, max-age={int(os.environ.get('CATALOG_MAX_AGE', 300))}"
+
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+profile_store = None
+
+QUIZ_WRITE_BEHIND = os.environ.get('QUIZ_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes')
+quiz_writer = None
+result_writer = None
+
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+
+ANALYTICS_FLUSH_INTERVAL = float(os.environ.get('ANALYTICS_FLUSH_INTERVAL', 5))
+rollups = None
+rollup_backfill = None
+result_rematcher = None
+
+password_hasher = PasswordHasher(
+    rounds=int(os.environ.get('BCRYPT_ROUNDS', 12)),
+    workers=int(os.environ.get('PASSWORD_HASH_WORKERS', 4)),
+    queue_size=int(os.environ.get('PASSWORD_HASH_QUEUE', 64)),
+    executor=os.environ.get('PASSWORD_HASH_EXECUTOR', 'thread'),
+)
+
+# Admission control for signup and login, which are unauthenticated and
+# spend a bcrypt hash each: per-IP and per-email token buckets plus a cap on
+# auth requests in flight. Opt-in: behind a proxy every request comes from
+# the proxy's address, so per-IP buckets only make sense once
+# AUTH_TRUSTED_PROXIES says how many proxies append to X-Forwarded-For
+# (1 behind a single ingress).
+AUTH_ADMISSION = os.environ.get('AUTH_ADMISSION', '').lower() in ('1', 'true', 'yes')
+AUTH_TRUSTED_PROXIES = int(os.environ.get('AUTH_TRUSTED_PROXIES', 0))
+admission = AdmissionController(
+    MemoryBucketStore(int(os.environ.get('AUTH_BUCKET_KEYS', 100000))),
+    ip_rate=float(os.environ.get('AUTH_IP_RATE', 0.5)),
+    ip_burst=float(os.environ.get('AUTH_IP_BURST', 20)),
+    email_rate=float(os.environ.get('AUTH_EMAIL_RATE', 0.1)),
+    email_burst=float(os.environ.get('AUTH_EMAIL_BURST', 5)),
+    max_concurrent=int(os.environ.get('AUTH_MAX_CONCURRENT', password_hasher.limit)),
+) if AUTH_ADMISSION else None
+
+# Flipped by warm_up() once Mongo indexes exist and the pool is warm.
+readiness = {"ready": False, "indexes": False, "missing_indexes": None, "pool_warm": False, "warm_up_seconds": None}
+warm_up_task = None
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_services()
+    try:
+        yield
+    finally:
+        await stop_services()
+
+app = FastAPI(lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
 
@@ -43,8 +179,10 @@ class User(BaseModel):
     name: str
     created_at: str
 
+AGE_MIN, AGE_MAX = 0, 150
+
 class QuizSubmission(BaseModel):
-    age: int
+    age: int = Field(..., ge=AGE_MIN, le=AGE_MAX)
     gender: str
     state: str
     area: str
@@ -55,6 +193,19 @@ class QuizSubmission(BaseModel):
     has_land: str
     is_disabled: str
 
+class QuizReevaluation(BaseModel):
+    result_token: str
+    changes: dict
+
+SAVED_BATCH_LIMIT = 200
+
+class SavedSchemeOperation(BaseModel):
+    op: Literal["add", "remove"]
+    scheme_id: str
+
+class SavedSchemeBatch(BaseModel):
+    operations: List[SavedSchemeOperation] = Field(..., min_length=1, max_length=SAVED_BATCH_LIMIT)
+
 class SavedScheme(BaseModel):
     model_config = ConfigDict(extra="ignore")
     user_id: str
@@ -71,11 +222,39 @@ class SchemeResponse(BaseModel):
     apply_link: str
     eligibility_match: Optional[str] = None
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def hash_password(password: str) -> str:
+    try:
+        with SECTION_LATENCY.time('password_hash'):
+            return await password_hasher.hash(password)
+    except HashQueueFull:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+
+async def verify_password(password: str, hashed: str) -> bool:
+    try:
+        with SECTION_LATENCY.time('password_verify'):
+            return await password_hasher.verify(password, hashed)
+    except HashQueueFull:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+
+def client_ip(request: Request) -> str:
+    if AUTH_TRUSTED_PROXIES:
+        # Each trusted proxy appends the address it received from, so the
+        # entry AUTH_TRUSTED_PROXIES from the right is the real client;
+        # anything left of it was sent by the client and can be forged.
+        hops = [h.strip() for h in request.headers.get('x-forwarded-for', '').split(',') if h.strip()]
+        if len(hops) >= AUTH_TRUSTED_PROXIES:
+            return hops[-AUTH_TRUSTED_PROXIES]
+    return request.client.host if request.client else 'unknown'
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+async def admit_auth(request: Request, email: str):
+    if admission is None:
+        return contextlib.nullcontext()
+    try:
+        return await admission.admit(client_ip(request), email)
+    except AdmissionRejected as e:
+        ADMISSION_REJECTIONS.inc(e.reason)
+        detail = "Too many attempts, please retry later" if e.status_code == 429 else "Server busy, please retry"
+        raise HTTPException(status_code=e.status_code, detail=detail, headers={"Retry-After": str(e.retry_after)})
 
 def create_token(user_id: str, email: str) -> str:
     payload = {
@@ -86,115 +265,77 @@ def create_token(user_id: str, email: str) -> str:
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
-    except:
+    token = credentials.credentials
+    digest = token_digest(token)
+    if await token_cache.is_revoked(digest):
         raise HTTPException(status_code=401, detail="Invalid token")
+    payload = token_cache.get(digest)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        except jwt.InvalidTokenError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        token_cache.put(digest, payload)
+    return payload
 
-HARDCODED_SCHEMES = [
-    {
-        "id": "scheme_1",
-        "name": "PM Scholarship Scheme",
-        "category": "Education",
-        "description": "Scholarship for students from defense background",
-        "benefits": ["₹2,500/month for boys", "₹3,000/month for girls", "Valid for professional courses"],
-        "documents": ["Aadhaar Card", "Income Certificate", "Previous Marksheet", "Bank Passbook"],
-        "apply_link": "https://scholarships.gov.in",
-        "eligibility": {"age_min": 18, "age_max": 25, "occupation": ["Student"], "income": ["Below ₹1,00,000", "₹1,00,000 – ₹3,00,000"]}
-    },
-    {
-        "id": "scheme_2",
-        "name": "Post Matric Scholarship (SC/ST/OBC)",
-        "category": "Education",
-        "description": "Post-matric scholarship for SC/ST/OBC students",
-        "benefits": ["Full tuition fee reimbursement", "Monthly maintenance allowance", "Book allowance"],
-        "documents": ["Caste Certificate", "Income Certificate", "Aadhaar", "Fee Receipt"],
-        "apply_link": "https://scholarships.gov.in",
-        "eligibility": {"age_min": 16, "age_max": 30, "occupation": ["Student"], "category": ["SC", "ST", "OBC"], "income": ["Below ₹1,00,000", "₹1,00,000 – ₹3,00,000", "₹3,00,000 – ₹8,00,000"]}
-    },
-    {
-        "id": "scheme_3",
-        "name": "PM-KISAN",
-        "category": "Agriculture",
-        "description": "Income support to all farmer families",
-        "benefits": ["₹6,000 per year in three installments", "Direct benefit transfer to bank"],
-        "documents": ["Aadhaar", "Land Records", "Bank Account Details"],
-        "apply_link": "https://pmkisan.gov.in",
-        "eligibility": {"occupation": ["Farmer"], "has_land": ["Yes"]}
-    },
-    {
-        "id": "scheme_4",
-        "name": "Ayushman Bharat (PM-JAY)",
-        "category": "Health",
-        "description": "Health insurance coverage up to ₹5 lakh per family per year",
-        "benefits": ["Cashless treatment", "Coverage for secondary and tertiary care", "Free medicines"],
-        "documents": ["Aadhaar", "Ration Card", "Income Proof"],
-        "apply_link": "https://pmjay.gov.in",
-        "eligibility": {"income": ["Below ₹1,00,000", "₹1,00,000 – ₹3,00,000"]}
-    },
-    {
-        "id": "scheme_5",
-        "name": "Indira Gandhi National Old Age Pension",
-        "category": "Pension",
-        "description": "Monthly pension for senior citizens",
-        "benefits": ["₹200-500 per month based on age", "Direct bank transfer"],
-        "documents": ["Age Proof", "Aadhaar", "Income Certificate"],
-        "apply_link": "https://nsap.nic.in",
-        "eligibility": {"age_min": 60, "income": ["Below ₹1,00,000"]}
-    },
-    {
-        "id": "scheme_6",
-        "name": "PM Matru Vandana Yojana",
-        "category": "Women",
-        "description": "Maternity benefit for pregnant and lactating mothers",
-        "benefits": ["₹5,000 cash benefit", "Nutritional support", "Health check-ups"],
-        "documents": ["Aadhaar", "Pregnancy Certificate", "Bank Details"],
-        "apply_link": "https://pmmvy.wcd.gov.in",
-        "eligibility": {"gender": ["Female"], "age_min": 18, "age_max": 45}
-    },
-    {
-        "id": "scheme_7",
-        "name": "MUDRA Loan Scheme",
-        "category": "Employment",
-        "description": "Loans up to ₹10 lakh for small businesses",
-        "benefits": ["No collateral required", "Low interest rates", "Easy repayment terms"],
-        "documents": ["Aadhaar", "Business Plan", "Bank Statement"],
-        "apply_link": "https://mudra.org.in",
-        "eligibility": {"occupation": ["Self-employed", "Unemployed"]}
-    },
-    {
-        "id": "scheme_8",
-        "name": "PM Awas Yojana (Urban)",
-        "category": "Housing",
-        "description": "Affordable housing for urban poor",
-        "benefits": ["Interest subsidy on home loans", "Direct assistance for construction"],
-        "documents": ["Aadhaar", "Income Certificate", "Property Documents"],
-        "apply_link": "https://pmaymis.gov.in",
-        "eligibility": {"area": ["Urban"], "income": ["Below ₹1,00,000", "₹1,00,000 – ₹3,00,000", "₹3,00,000 – ₹8,00,000"]}
-    },
-    {
-        "id": "scheme_9",
-        "name": "AICTE Pragati Scholarship (Girls)",
-        "category": "Education",
-        "description": "Scholarship for girl students in technical education",
-        "benefits": ["₹50,000 per year", "For diploma/degree courses"],
-        "documents": ["Aadhaar", "Admission Proof", "Income Certificate", "Bank Details"],
-        "apply_link": "https://scholarships.gov.in",
-        "eligibility": {"gender": ["Female"], "occupation": ["Student"], "age_min": 17, "age_max": 25, "income": ["Below ₹1,00,000", "₹1,00,000 – ₹3,00,000", "₹3,00,000 – ₹8,00,000"]}
-    },
-    {
-        "id": "scheme_10",
-        "name": "AICTE Saksham Scholarship (Divyang)",
-        "category": "Education",
-        "description": "Scholarship for differently-abled students",
-        "benefits": ["₹50,000 per year", "For technical courses", "Special support"],
-        "documents": ["Disability Certificate", "Aadhaar", "Income Certificate", "College Admission Proof"],
-        "apply_link": "https://scholarships.gov.in",
-        "eligibility": {"is_disabled": ["Yes"], "occupation": ["Student"], "age_min": 17, "age_max": 30}
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN or not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+async def require_indexes():
+    # Signup and saves rely on unique indexes that warm-up builds after the
+    # server starts accepting connections.
+    if not readiness['indexes']:
+        raise HTTPException(status_code=503, detail="Starting up, please retry", headers={"Retry-After": "1"})
+
+if SERVE_FROM_SNAPSHOT:
+    catalog_store = CatalogStore(load_snapshot(current_snapshot(CATALOG_SNAPSHOT_DIR)))
+else:
+    catalog_store = CatalogStore(CatalogSnapshot(read_catalog_file(SCHEMES_FILE)))
+catalog_watcher = None
+quiz_result_cache = QuizResultCache(QUIZ_CACHE_SIZE)
+# result token -> (user_id, catalog version, quiz, eligible positions, exp)
+result_tokens = LRUCache(RESULT_TOKEN_CACHE_SIZE)
+
+RESULT_TOKEN_AUDIENCE = 'quiz-result'
+
+def issue_result_token(user_id: str, catalog: CatalogSnapshot, quiz: QuizSubmission, eligible: list) -> str:
+    # Signed and self-describing, so a worker that never saw the submission
+    # (or evicted it) can still rebuild the entry from the token.
+    exp = datetime.now(timezone.utc) + timedelta(days=1)
+    payload = {
+        'user_id': user_id,
+        'catalog_version': catalog.version,
+        'quiz': quiz.model_dump(),
+        'aud': RESULT_TOKEN_AUDIENCE,
+        'exp': exp,
     }
-]
+    token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    result_tokens.put(token, (user_id, catalog.version, quiz, eligible, exp.timestamp()))
+    return token
+
+def result_token_entry(token: str, catalog: CatalogSnapshot):
+    """(user_id, catalog version, quiz, eligible positions, exp) for a
+    result token, rematching the quiz when the token is not cached here.
+    None once the token has expired, cached or not."""
+    entry = result_tokens.get(token)
+    if entry is not None:
+        if entry[4] <= time.time():
+            result_tokens.pop(token)
+            return None
+        return entry
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM], audience=RESULT_TOKEN_AUDIENCE)
+        quiz = QuizSubmission(**payload['quiz'])
+        exp = payload['exp']
+    except (jwt.InvalidTokenError, KeyError, TypeError, ValidationError):
+        return None
+    eligible = None
+    if payload.get('catalog_version') == catalog.version:
+        eligible = np.flatnonzero(catalog.index.mask(quiz))
+    entry = (payload.get('user_id'), payload.get('catalog_version'), quiz, eligible, exp)
+    result_tokens.put(token, entry)
+    return entry
 
 def check_eligibility(quiz: QuizSubmission, scheme: dict) -> bool:
     eligibility = scheme.get('eligibility', {})
@@ -217,99 +358,384 @@ def check_eligibility(quiz: QuizSubmission, scheme: dict) -> bool:
         return False
     if 'is_disabled' in eligibility and quiz.is_disabled not in eligibility['is_disabled']:
         return False
+    if 'rule' in eligibility and not evaluate_rule(eligibility['rule'], quiz):
+        return False
     
     return True
 
-@api_router.post("/auth/signup")
-async def signup(user_data: UserCreate):
-    existing = await db.users.find_one({"email": user_data.email}, {"_id": 0})
-    if existing:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
+def check_eligibility_batch(frame: pd.DataFrame):
+    """Vectorized check_eligibility: yields (eligible_ids, fallback_ids,
+    {fallback_id: failed_criteria}) per row of frame."""
+    catalog = catalog_store.snapshot
+    ids = catalog.ids
+    for eligible, fallback in catalog.index.match_batch(frame):
+        yield [ids[i] for i in eligible], [ids[i] for i, _, _ in fallback], {ids[i]: failed for i, _, failed in fallback}
+
+QUIZ_FIELDS = list(QuizSubmission.model_fields)
+BATCH_LINES_PER_CHUNK = 1000
+
+# Exportable collections: rows come out in (date_field, _id) order, walking
+# the named index, so filtered exports never need an in-memory sort.
+EXPORTS = {
+    "quiz_submissions": {
+        "date_field": "submitted_at",
+        "columns": ["_id", "user_id", "submitted_at", *QUIZ_FIELDS, "eligible_count"],
+        "index": "submitted_at_id",
+        "state_index": "state_submitted_at_id",
+    },
+    "saved_schemes": {
+        "date_field": "saved_at",
+        "columns": ["_id", "user_id", "scheme_id", "saved_at"],
+        "index": "saved_at_id",
+        "state_index": None,
+    },
+}
+
+def read_quiz_frame(payload: bytes, fmt: str) -> pd.DataFrame:
+    if fmt == 'csv':
+        # Read the header as a data row: a row with more fields than the
+        # first one is then a ParserError (a 400) instead of pandas turning
+        # the extra leading fields into an index, e.g. for an unquoted
+        # "Below ₹1,00,000".
+        try:
+            frame = pd.read_csv(io.BytesIO(payload), header=None, index_col=False, dtype=str, keep_default_na=False)
+        except pd.errors.ParserError as e:
+            raise ValueError(f"Malformed CSV: {e}") from e
+        if frame.empty:
+            raise ValueError("Empty CSV")
+        frame = frame.iloc[1:].set_axis(list(frame.iloc[0]), axis=1).reset_index(drop=True)
+    elif fmt == 'ndjson':
+        frame = pd.read_json(io.BytesIO(payload), lines=True, dtype=False)
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+    missing = [f for f in QUIZ_FIELDS if f not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    frame = frame[QUIZ_FIELDS].copy()
+    # Ages QuizSubmission would reject (fractional, out of range, not a
+    # number) become NaN and are reported per row as invalid.
+    age = pd.to_numeric(frame['age'], errors='coerce')
+    frame['age'] = age.where((age % 1 == 0) & age.between(AGE_MIN, AGE_MAX))
+    for field in QUIZ_FIELDS[1:]:
+        frame[field] = frame[field].astype(str)
+    return frame
+
+def stream_batch_results(frame: pd.DataFrame):
+    # One line per input row, in input order; rows with an invalid age get
+    # an error line where their result would be.
+    valid = frame['age'].notna().to_numpy()
+    results = check_eligibility_batch(frame[valid].astype({'age': 'int64'}))
+    lines = []
+    for row, ok in zip(frame.index, valid):
+        if ok:
+            eligible_ids, fallback_ids, failed = next(results)
+            lines.append(json.dumps({"row": int(row), "eligible_schemes": eligible_ids, "fallback_schemes": fallback_ids,
+                                     "fallback_failed_criteria": failed}))
+        else:
+            lines.append(json.dumps({"row": int(row), "error": "Invalid age"}))
+        if len(lines) >= BATCH_LINES_PER_CHUNK:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+@api_router.post("/auth/signup", dependencies=[Depends(require_indexes)])
+async def signup(user_data: UserCreate, request: Request):
     user_id = str(uuid.uuid4())
-    user_doc = {
-        "id": user_id,
-        "email": user_data.email,
-        "password": hash_password(user_data.password),
-        "name": user_data.name,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    
-    await db.users.insert_one(user_doc)
+    with await admit_auth(request, user_data.email):
+        user_doc = {
+            "id": user_id,
+            "email": user_data.email,
+            "password": await hash_password(user_data.password),
+            "name": user_data.name,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        
+        try:
+            await db.users.insert_one(user_doc)
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="Email already registered")
     token = create_token(user_id, user_data.email)
     
     return {"token": token, "user": {"id": user_id, "email": user_data.email, "name": user_data.name}}
 
 @api_router.post("/auth/login")
-async def login(credentials: UserLogin):
-    user = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user['password']):
-        raise HTTPException(status_code=401, detail="Invalid credentials")
+async def login(credentials: UserLogin, request: Request):
+    with await admit_auth(request, credentials.email):
+        user = await db.users.find_one({"email": credentials.email}, {"_id": 0})
+        if not user or not await verify_password(credentials.password, user['password']):
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        
+        if password_hasher.needs_rehash(user['password']):
+            # Best effort: a busy pool just means we upgrade on a later login.
+            try:
+                rehashed = await password_hasher.hash(credentials.password)
+                await db.users.update_one({"id": user['id']}, {"$set": {"password": rehashed}})
+            except HashQueueFull:
+                pass
     
     token = create_token(user['id'], user['email'])
     return {"token": token, "user": {"id": user['id'], "email": user['email'], "name": user['name']}}
 
+@api_router.post("/auth/logout")
+async def logout(credentials: HTTPAuthorizationCredentials = Depends(security), user: dict = Depends(get_current_user)):
+    await token_cache.revoke(token_digest(credentials.credentials), user['exp'])
+    return {"message": "Logged out"}
+
+def match_quiz(catalog: CatalogSnapshot, quiz: QuizSubmission):
+    """Eligible catalog positions, plus (position, score, failed_criteria)
+    near misses ranked by how many criteria the quiz meets."""
+    return catalog.index.match_with_fallback(quiz, FALLBACK_LIMIT)
+
+def cached_match(catalog: CatalogSnapshot, quiz: QuizSubmission):
+    result = quiz_result_cache.get(catalog.index, quiz)
+    if result is None:
+        with SECTION_LATENCY.time('eligibility_match'):
+            result = match_quiz(catalog, quiz)
+        quiz_result_cache.put(catalog.index, quiz, result)
+    return result
+
+def quiz_result_response(catalog: CatalogSnapshot, result_token: str, eligible: list, fallback: list,
+                         ids_only: bool, **extra):
+    if ids_only:
+        # Scheme bodies come from the cacheable GET /api/schemes.
+        return {
+            **extra,
+            "result_token": result_token,
+            "catalog_version": catalog.version,
+            "eligible_scheme_ids": [catalog.ids[i] for i in eligible],
+            "fallback_scheme_ids": [catalog.ids[i] for i, _, _ in fallback],
+            "fallback_failed_criteria": {catalog.ids[i]: failed for i, _, failed in fallback},
+        }
+    return FragmentJSONResponse({
+        **extra,
+        "result_token": result_token,
+        "eligible_schemes": Fragments(catalog.eligible_json[i] for i in eligible),
+        "fallback_schemes": Fragments(catalog.near_miss_json(*near) for near in fallback),
+    })
+
 @api_router.post("/quiz/submit")
-async def submit_quiz(quiz: QuizSubmission, user: dict = Depends(get_current_user)):
-    eligible_schemes = []
-    fallback_schemes = []
-    
-    for scheme in HARDCODED_SCHEMES:
-        if check_eligibility(quiz, scheme):
-            scheme_copy = scheme.copy()
-            del scheme_copy['eligibility']
-            scheme_copy['eligibility_match'] = 'Eligible'
-            eligible_schemes.append(scheme_copy)
-    
-    if len(eligible_schemes) < 3:
-        for scheme in HARDCODED_SCHEMES:
-            if scheme['id'] not in [s['id'] for s in eligible_schemes]:
-                scheme_copy = scheme.copy()
-                del scheme_copy['eligibility']
-                scheme_copy['eligibility_match'] = 'May be eligible - Check details'
-                fallback_schemes.append(scheme_copy)
-                if len(fallback_schemes) >= 3:
-                    break
+async def submit_quiz(quiz: QuizSubmission, ids_only: bool = False, user: dict = Depends(get_current_user)):
+    catalog = catalog_store.snapshot
+    eligible, fallback = cached_match(catalog, quiz)
+    result_token = issue_result_token(user['user_id'], catalog, quiz, eligible)
     
     quiz_doc = quiz.model_dump()
     quiz_doc['user_id'] = user['user_id']
     quiz_doc['submitted_at'] = datetime.now(timezone.utc).isoformat()
-    await db.quiz_submissions.insert_one(quiz_doc)
+    quiz_doc['eligible_count'] = len(eligible)
+    if quiz_writer:
+        await quiz_writer.put(quiz_doc)
+    else:
+        await db.quiz_submissions.insert_one(quiz_doc)
+    if rollups:
+        rollups.record(quiz_doc, len(eligible))
+    stored = result_doc(quiz.model_dump(), quiz_doc['submitted_at'], catalog.version, [catalog.ids[i] for i in eligible])
+    if result_writer:
+        # GET /quiz/latest reads result_writer.pending until the flush lands.
+        await result_writer.put({"_id": user['user_id'], **stored})
+    else:
+        await db.user_results.replace_one({"_id": user['user_id']}, stored, upsert=True)
     
-    return {"eligible_schemes": eligible_schemes, "fallback_schemes": fallback_schemes}
+    return quiz_result_response(catalog, result_token, eligible, fallback, ids_only)
+
+@api_router.get("/quiz/latest")
+async def latest_quiz_result(ids_only: bool = False, user: dict = Depends(get_current_user)):
+    """The user's latest quiz and its results against the current catalog,
+    without re-submitting.
+
+    new_scheme_ids lists the eligible schemes a catalog change added since
+    the quiz was answered.
+    """
+    doc = result_writer.pending.get(user['user_id']) if result_writer else None
+    if doc is None:
+        doc = await db.user_results.find_one({"_id": user['user_id']})
+    if doc is None:
+        raise HTTPException(status_code=404, detail="No quiz submitted yet")
+    catalog = catalog_store.snapshot
+    quiz = QuizSubmission(**doc['quiz'])
+    fallback = []
+    if doc['catalog_version'] == catalog.version:
+        eligible = [catalog.positions[i] for i in doc['eligible_scheme_ids']]
+    else:
+        # The re-match job has not reached this user yet, or found nothing
+        # changed and left the document alone; matching is cheap anyway.
+        eligible = None
+    if eligible is None or len(eligible) < FALLBACK_LIMIT:
+        eligible, fallback = cached_match(catalog, quiz)
+    eligible_ids = {catalog.ids[i] for i in eligible}
+    return quiz_result_response(
+        catalog, issue_result_token(user['user_id'], catalog, quiz, eligible), eligible, fallback, ids_only,
+        quiz=doc['quiz'], submitted_at=doc['submitted_at'],
+        new_scheme_ids=[i for i in doc.get('added_scheme_ids', []) if i in eligible_ids],
+    )
+
+@api_router.post("/quiz/reevaluate")
+async def reevaluate_quiz(reevaluation: QuizReevaluation, ids_only: bool = False, user: dict = Depends(get_current_user)):
+    """What-if re-check of a previous submission with some answers changed.
 
-@api_router.post("/schemes/save/{scheme_id}")
+    Returns the schemes gained and lost relative to that result plus a new
+    token, so edits can be chained. Nothing is persisted.
+    """
+    catalog = catalog_store.snapshot
+    entry = result_token_entry(reevaluation.result_token, catalog)
+    if entry is None or entry[0] != user['user_id']:
+        raise HTTPException(status_code=404, detail="Unknown or expired result token")
+    _, version, before, eligible, _ = entry
+    if version != catalog.version:
+        raise HTTPException(status_code=409, detail="Scheme catalog changed; submit the quiz again")
+    unknown = [f for f in reevaluation.changes if f not in QUIZ_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown quiz fields: {', '.join(unknown)}")
+    try:
+        after = QuizSubmission(**{**before.model_dump(), **reevaluation.changes})
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+    with SECTION_LATENCY.time('eligibility_reevaluate'):
+        added, removed = catalog.index.reevaluate(before, after, eligible)
+    if added or removed:
+        eligible = np.union1d(np.setdiff1d(eligible, removed, assume_unique=True), added)
+    result_token = issue_result_token(user['user_id'], catalog, after, eligible)
+
+    response = {
+        "result_token": result_token,
+        "catalog_version": catalog.version,
+        "eligible_count": len(eligible),
+        "removed_scheme_ids": [catalog.ids[i] for i in removed],
+    }
+    if ids_only:
+        return {**response, "added_scheme_ids": [catalog.ids[i] for i in added]}
+    return FragmentJSONResponse({**response, "added_schemes": Fragments(catalog.eligible_json[i] for i in added)})
+
+@api_router.post("/quiz/batch")
+async def submit_quiz_batch(file: UploadFile = File(...), format: Optional[str] = None, user: dict = Depends(get_current_user)):
+    fmt = format or ('ndjson' if (file.filename or '').endswith(('.ndjson', '.jsonl')) else 'csv')
+    payload = await file.read()
+    try:
+        frame = await run_in_threadpool(read_quiz_frame, payload, fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(stream_batch_results(frame), media_type="application/x-ndjson")
+
+@api_router.post("/schemes/save/{scheme_id}", dependencies=[Depends(require_indexes)])
 async def save_scheme(scheme_id: str, user: dict = Depends(get_current_user)):
-    existing = await db.saved_schemes.find_one({
-        "user_id": user['user_id'],
-        "scheme_id": scheme_id
-    }, {"_id": 0})
-    
-    if existing:
+    if scheme_id not in catalog_store.snapshot.positions:
+        raise HTTPException(status_code=404, detail="Scheme not found")
+    try:
+        result = await db.saved_schemes.update_one(
+            {"user_id": user['user_id'], "scheme_id": scheme_id},
+            {"$setOnInsert": {"saved_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Lost a race with a concurrent save of the same scheme.
         return {"message": "Already saved"}
     
-    saved_doc = {
-        "user_id": user['user_id'],
-        "scheme_id": scheme_id,
-        "saved_at": datetime.now(timezone.utc).isoformat()
-    }
-    await db.saved_schemes.insert_one(saved_doc)
+    if result.upserted_id is None:
+        return {"message": "Already saved"}
     return {"message": "Scheme saved successfully"}
 
+@api_router.post("/schemes/saved:batch", dependencies=[Depends(require_indexes)])
+async def update_saved_schemes(batch: SavedSchemeBatch, user: dict = Depends(get_current_user)):
+    # One unordered bulk_write for the whole batch. When a scheme appears
+    # more than once, its last operation wins and earlier ones are reported
+    # as superseded, since an unordered batch has no defined write order.
+    positions = catalog_store.snapshot.positions
+    operations = batch.operations
+    statuses = [None] * len(operations)
+    last = {}
+    for i, operation in enumerate(operations):
+        if operation.scheme_id not in positions:
+            statuses[i] = "unknown_scheme"
+        else:
+            if operation.scheme_id in last:
+                statuses[last[operation.scheme_id]] = "superseded"
+            last[operation.scheme_id] = i
+
+    removals = [s for s, i in last.items() if operations[i].op == "remove"]
+    saved = set()
+    if removals:
+        found = await db.saved_schemes.find(
+            {"user_id": user['user_id'], "scheme_id": {"$in": removals}}, {"_id": 0, "scheme_id": 1}
+        ).to_list(len(removals))
+        saved = {s['scheme_id'] for s in found}
+
+    indexes = sorted(last.values())
+    saved_at = datetime.now(timezone.utc).isoformat()
+    requests = []
+    for i in indexes:
+        selector = {"user_id": user['user_id'], "scheme_id": operations[i].scheme_id}
+        if operations[i].op == "add":
+            requests.append(UpdateOne(selector, {"$setOnInsert": {"saved_at": saved_at}}, upsert=True))
+        else:
+            requests.append(DeleteOne(selector))
+
+    upserted, failed = set(), {}
+    if requests:
+        try:
+            result = await db.saved_schemes.bulk_write(requests, ordered=False)
+            upserted = set(result.upserted_ids)
+        except BulkWriteError as e:
+            upserted = {u['index'] for u in e.details.get('upserted', [])}
+            failed = {error['index']: error['code'] for error in e.details['writeErrors']}
+
+    for n, i in enumerate(indexes):
+        if operations[i].op == "add":
+            # A duplicate key is a concurrent save of the same scheme.
+            if n in upserted:
+                statuses[i] = "saved"
+            elif n not in failed or failed[n] == 11000:
+                statuses[i] = "already_saved"
+            else:
+                statuses[i] = "error"
+        elif n in failed:
+            statuses[i] = "error"
+        else:
+            statuses[i] = "removed" if operations[i].scheme_id in saved else "not_saved"
+
+    return {"results": [
+        {"op": operation.op, "scheme_id": operation.scheme_id, "status": status}
+        for operation, status in zip(operations, statuses)
+    ]}
+
+def encode_cursor(value: str) -> str:
+    return base64.urlsafe_b64encode(value.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> str:
+    # validate=True rejects characters outside the URL-safe alphabet, which
+    # would otherwise be dropped and decode to a cursor for the first page.
+    try:
+        value = base64.b64decode(cursor + '=' * (-len(cursor) % 4), altchars=b'-_', validate=True).decode('utf-8')
+    except (binascii.Error, UnicodeDecodeError):
+        value = ''
+    if not value:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value
+
 @api_router.get("/schemes/saved")
-async def get_saved_schemes(user: dict = Depends(get_current_user)):
-    saved = await db.saved_schemes.find({"user_id": user['user_id']}, {"_id": 0}).to_list(100)
-    saved_ids = [s['scheme_id'] for s in saved]
+async def get_saved_schemes(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=200),
+    ids_only: bool = False,
+    user: dict = Depends(get_current_user)
+):
+    # Walks the (user_id, scheme_id) unique index in scheme_id order, so
+    # each page is a bounded index range scan whatever the total count.
+    query = {"user_id": user['user_id']}
+    if cursor:
+        query["scheme_id"] = {"$gt": decode_cursor(cursor)}
+    saved = await db.saved_schemes.find(query, {"_id": 0, "scheme_id": 1}).sort("scheme_id", 1).to_list(limit + 1)
     
-    schemes = [s for s in HARDCODED_SCHEMES if s['id'] in saved_ids]
-    result = []
-    for scheme in schemes:
-        scheme_copy = scheme.copy()
-        if 'eligibility' in scheme_copy:
-            del scheme_copy['eligibility']
-        result.append(scheme_copy)
+    page = saved[:limit]
+    next_cursor = encode_cursor(page[-1]['scheme_id']) if len(saved) > limit else None
+    catalog = catalog_store.snapshot
+    positions = catalog.positions
+    if ids_only:
+        return {"scheme_ids": [s['scheme_id'] for s in page if s['scheme_id'] in positions], "next_cursor": next_cursor}
+    schemes = Fragments(catalog.public_json[positions[s['scheme_id']]] for s in page if s['scheme_id'] in positions)
     
-    return {"schemes": result}
+    return FragmentJSONResponse({"schemes": schemes, "next_cursor": next_cursor})
 
 @api_router.delete("/schemes/unsave/{scheme_id}")
 async def unsave_scheme(scheme_id: str, user: dict = Depends(get_current_user)):
@@ -319,6 +745,130 @@ async def unsave_scheme(scheme_id: str, user: dict = Depends(get_current_user)):
     })
     return {"message": "Scheme removed from saved"}
 
+@api_router.get("/schemes")
+async def list_schemes(request: Request):
+    return conditional_response(request, catalog_store.snapshot.catalog_body, CATALOG_CACHE_CONTROL)
+
+@api_router.get("/schemes/search")
+async def search_schemes(q: str = Query(..., min_length=1, max_length=200), limit: int = Query(10, ge=1, le=50),
+                         prefix: bool = True):
+    # The snapshot's own search index, so every hit is in this catalog.
+    catalog = catalog_store.snapshot
+    with SECTION_LATENCY.time('search'):
+        hits, suggestions = catalog.search.search(q, limit=limit, prefix=prefix)
+    results = []
+    for scheme_id, score in hits:
+        # Parse just the hits; a mapped snapshot never parses its whole scheme list.
+        scheme = orjson.loads(catalog.public_json[catalog.positions[scheme_id]])
+        results.append({"id": scheme_id, "name": scheme.get('name'), "category": scheme.get('category'), "score": score})
+    return {"query": q, "catalog_version": catalog.version, "results": results, "suggestions": suggestions}
+
+@api_router.get("/schemes/{scheme_id}")
+async def get_scheme(scheme_id: str, request: Request):
+    catalog = catalog_store.snapshot
+    position = catalog.positions.get(scheme_id)
+    if position is None:
+        raise HTTPException(status_code=404, detail="Scheme not found")
+    return conditional_response(request, catalog.scheme_body(position), CATALOG_CACHE_CONTROL)
+
+@api_router.get("/admin/write-behind", dependencies=[Depends(require_admin)])
+async def write_behind_stats():
+    if not quiz_writer:
+        return {"enabled": False}
+    return {"enabled": True, **quiz_writer.stats(), "user_results": result_writer.stats()}
+
+def stored_match_count(doc: dict) -> int:
+    """Eligible schemes for a stored submission under the current catalog."""
+    try:
+        quiz = QuizSubmission(**{f: doc.get(f) for f in QUIZ_FIELDS})
+    except ValidationError:
+        return 0
+    return len(catalog_store.snapshot.index.match(quiz))
+
+@api_router.get("/admin/analytics/rollups", dependencies=[Depends(require_admin)])
+async def analytics_rollups(dimension: str = TOTAL, start: Optional[str] = None, end: Optional[str] = None):
+    if dimension not in (TOTAL, *DIMENSIONS):
+        raise HTTPException(status_code=400, detail=f"dimension must be one of {', '.join((TOTAL, *DIMENSIONS))}")
+    try:
+        end = date.fromisoformat(end or today())
+        start = date.fromisoformat(start) if start else end - timedelta(days=29)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start and end must be YYYY-MM-DD dates")
+    return await read_rollups(db.quiz_rollups, dimension, start.isoformat(), end.isoformat())
+
+@api_router.get("/admin/analytics/backfill", dependencies=[Depends(require_admin)])
+async def analytics_backfill_status():
+    return {"backfill": rollup_backfill.status, "aggregator": rollups.stats()}
+
+@api_router.post("/admin/analytics/backfill", status_code=202, dependencies=[Depends(require_admin)])
+async def start_analytics_backfill():
+    started = rollup_backfill.start()
+    return {"started": started, "backfill": rollup_backfill.status}
+
+@api_router.get("/admin/results/rematch", dependencies=[Depends(require_admin)])
+async def result_rematch_status():
+    return {"rematch": result_rematcher.status,
+            "jobs": await db.result_rematch_jobs.find({}).sort("started_at", -1).limit(10).to_list(10)}
+
+@api_router.post("/admin/results/rematch", status_code=202, dependencies=[Depends(require_admin)])
+async def start_result_rematch():
+    """Run (or resume) the re-match for the current catalog; a no-op once
+    it has finished."""
+    started = await result_rematcher.start(catalog_store.snapshot)
+    return {"started": started, "rematch": result_rematcher.status}
+
+@api_router.get("/admin/export/{collection}", dependencies=[Depends(require_admin)])
+async def export_collection(
+    collection: str,
+    format: str = "ndjson",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    state: Optional[str] = None,
+    after: Optional[str] = None,
+):
+    # A dropped export resumes with after=<_id of the last row received>.
+    spec = EXPORTS.get(collection)
+    if spec is None:
+        raise HTTPException(status_code=404, detail="Unknown export")
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+    if state and not spec['state_index']:
+        raise HTTPException(status_code=400, detail=f"{collection} cannot be filtered by state")
+    try:
+        start = date.fromisoformat(start) if start else None
+        end = date.fromisoformat(end) if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start and end must be YYYY-MM-DD dates")
+
+    date_field = spec['date_field']
+    query = export_query(date_field, start, end, {"state": state})
+    if after:
+        checkpoint = await db[collection].find_one({"_id": parse_id(after)}, {date_field: 1})
+        if checkpoint is None:
+            raise HTTPException(status_code=400, detail="Unknown checkpoint")
+        query = resume_query(query, date_field, checkpoint)
+    cursor = db[collection].find(query, {c: 1 for c in spec['columns']}).sort([(date_field, 1), ("_id", 1)])
+    cursor = cursor.hint(spec['state_index'] if state else spec['index']).batch_size(EXPORT_BATCH_SIZE)
+    return StreamingResponse(
+        stream_export(cursor, spec['columns'], format, EXPORT_BATCH_SIZE),
+        media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{collection}.{format}"'},
+    )
+
+@api_router.post("/admin/catalog/reload", dependencies=[Depends(require_admin)])
+async def reload_catalog():
+    try:
+        changed = await catalog_watcher.reload()
+    except (CatalogError, OSError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"changed": changed, "version": catalog_store.snapshot.version}
+
+@api_router.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    if not profile_store:
+        return {"enabled": False}
+    return {"enabled": True, "directory": str(profile_store.directory), "routes": profile_store.listing()}
+
 app.include_router(api_router)
 
 app.add_middleware(
@@ -329,15 +879,193 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+# Installed only when enabled so unprofiled deployments pay nothing per request.
+if PROFILING_ENABLED:
+    profile_store = ProfileStore(
+        Path(os.environ.get('PROFILE_DIR', ROOT_DIR / 'profiles')),
+        keep=int(os.environ.get('PROFILE_KEEP', 5)),
+    )
+    app.add_middleware(
+        ProfilingMiddleware,
+        profiler=SamplingProfiler(float(os.environ.get('PROFILE_INTERVAL', 0.005))),
+        store=profile_store,
+        sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+        admin_token=ADMIN_TOKEN,
+    )
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
+app.add_middleware(MetricsMiddleware, latency=REQUEST_LATENCY, in_flight=REQUESTS_IN_FLIGHT)
+
+def collect_component_stats():
+    quiz = quiz_result_cache.stats()
+    tokens = token_cache.stats()
+    yield 'quiz_cache_entries', 'gauge', 'Cached quiz results', {(): quiz['size']}
+    yield 'quiz_cache_lookups_total', 'counter', 'Quiz result cache lookups', {
+        (('result', 'hit'),): quiz['hits'], (('result', 'miss'),): quiz['misses']}
+    yield 'quiz_cache_invalidations_total', 'counter', 'Quiz cache flushes on catalog change', {(): quiz['invalidations']}
+    yield 'token_cache_entries', 'gauge', 'Cached verified JWTs', {(): tokens['size']}
+    yield 'token_cache_lookups_total', 'counter', 'Verified JWT cache lookups', {
+        (('result', 'hit'),): tokens['hits'], (('result', 'miss'),): tokens['misses']}
+    yield 'result_tokens', 'gauge', 'Live quiz result tokens for re-evaluation', {(): len(result_tokens)}
+    yield 'password_hash_pending', 'gauge', 'bcrypt operations queued or running', {(): password_hasher.pending}
+    if admission:
+        yield 'auth_admitted_in_flight', 'gauge', 'Auth requests holding an admission slot', {(): admission.in_flight}
+    catalog = catalog_store.snapshot
+    yield 'catalog_schemes', 'gauge', 'Schemes in the serving catalog', {(('version', catalog.version),): len(catalog)}
+    if rollups:
+        yield 'rollup_pending_buckets', 'gauge', 'Rollup buckets waiting for the next flush', {
+            (): rollups.stats()['pending_buckets']}
+    if result_rematcher:
+        yield 'result_rematch_profiles_total', 'counter', 'Stored results re-matched after catalog changes', {
+            (('outcome', 'checked'),): result_rematcher.processed, (('outcome', 'changed'),): result_rematcher.changed}
+    if quiz_writer:
+        writers = {w.collection.name: w.stats() for w in (quiz_writer, result_writer)}
+        yield 'write_behind_queue_depth', 'gauge', 'Documents waiting to be flushed', {
+            (('collection', name),): stats['queue_depth'] for name, stats in writers.items()}
+        yield 'write_behind_documents_total', 'counter', 'Documents flushed or dropped', {
+            (('collection', name), ('outcome', outcome)): stats[outcome]
+            for name, stats in writers.items() for outcome in ('written', 'dropped')}
+        yield 'write_behind_last_flush_seconds', 'gauge', 'Duration of the latest flush', {
+            (('collection', name),): stats['last_flush_seconds'] for name, stats in writers.items()}
+    pools = pool_monitor.stats()
+    if pools:
+        yield 'mongo_pool_connections', 'gauge', 'Mongo pool connections by state', {
+            (('server', server), ('state', state)): pool[state]
+            for server, pool in pools.items() for state in ('in_use', 'idle')}
+        yield 'mongo_pool_checkout_failures_total', 'counter', 'Mongo connection checkouts that failed', {
+            (('server', server),): pool['checkout_failures'] for server, pool in pools.items()}
+    yield 'ready', 'gauge', 'Whether warm-up has finished and /ready returns 200', {(): int(readiness['ready'])}
+
+metrics.add_collector(collect_component_stats)
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    # For load balancers: 503 until the pool is warm and indexes exist.
+    return JSONResponse(readiness, status_code=200 if readiness['ready'] else 503)
+
+@app.get("/health", include_in_schema=False)
+async def health():
+    return {
+        "status": "ok",
+        **readiness,
+        "catalog_version": catalog_store.snapshot.version,
+        "mongo_pool": {
+            "options": MONGO_POOL_OPTIONS,
+            "servers": pool_monitor.stats(),
+        },
+    }
+
+async def watch_catalog_source() -> CatalogWatcher:
+    if SCHEMES_SOURCE == 'mongo':
+        source = MongoCatalogSource(db[os.environ.get('SCHEMES_COLLECTION', 'schemes')], CATALOG_POLL_INTERVAL)
+    else:
+        source = FileCatalogSource(SCHEMES_FILE, CATALOG_POLL_INTERVAL)
+    watcher = CatalogWatcher(catalog_store, source)
+    if SCHEMES_SOURCE == 'mongo':
+        # The bundled file stays in service until Mongo has a valid catalog.
+        await watcher.prime()
+    watcher.start()
+    return watcher
+
+async def warm_up():
+    """Build Mongo indexes and open MONGO_MIN_POOL_SIZE connections, retrying
+    until Mongo answers; /ready reports ready only after this."""
+    start = time.perf_counter()
+    while True:
+        try:
+            if not readiness['indexes']:
+                await ensure_indexes(db)
+                readiness.update(indexes=True, missing_indexes=None)
+            # Concurrent pings each need their own connection, so the pool
+            # opens them in parallel instead of on the first real requests.
+            await asyncio.gather(*(db.command('ping') for _ in range(max(1, MONGO_POOL_OPTIONS['minPoolSize']))))
+            break
+        except MissingIndexError as e:
+            # Usually duplicates in existing data; /ready stays 503 until an
+            # operator cleans them up.
+            logger.error("%s; retrying in %ds", e, INDEX_RETRY_SECONDS)
+            readiness['missing_indexes'] = sorted(f"{c}.{n}" for c, names in e.missing.items() for n in names)
+            await asyncio.sleep(INDEX_RETRY_SECONDS)
+        except PyMongoError as e:
+            logger.warning("Mongo warm-up failed, retrying: %s", e)
+            await asyncio.sleep(1)
+    readiness.update(ready=True, pool_warm=True, warm_up_seconds=round(time.perf_counter() - start, 3))
+    logger.info("Warm: %d Mongo connections open after %.2fs",
+                pool_monitor.open_connections(), readiness['warm_up_seconds'])
+    # Picks up a re-match a previous run left unfinished; a no-op once the
+    # current catalog has been done.
+    await result_rematcher.start(catalog_store.snapshot)
+
+def rematch_on_swap(snapshot, previous):
+    if result_rematcher:
+        asyncio.get_running_loop().create_task(result_rematcher.start(snapshot))
+
+catalog_store.add_listener(rematch_on_swap)
+
+async def start_services():
+    global catalog_watcher, quiz_writer, result_writer, rollups, rollup_backfill, result_rematcher, warm_up_task
+    # The catalog, eligibility index and search index are already built at
+    # import, before the server accepts any connection.
+    if SERVE_FROM_SNAPSHOT:
+        # The supervisor watches the source and publishes snapshots.
+        catalog_watcher = SnapshotFollower(catalog_store, CATALOG_SNAPSHOT_DIR, CATALOG_POLL_INTERVAL)
+        catalog_watcher.start()
+    else:
+        catalog_watcher = await watch_catalog_source()
+
+    if TOKEN_REVOCATION_STORE == 'mongo':
+        token_cache.revoked = MongoRevocationStore(db.revoked_tokens)
+
+    if QUIZ_WRITE_BEHIND:
+        options = dict(
+            max_queue=int(os.environ.get('QUIZ_WRITE_BEHIND_QUEUE', 10000)),
+            batch_size=int(os.environ.get('QUIZ_WRITE_BEHIND_BATCH', 500)),
+            flush_interval=float(os.environ.get('QUIZ_WRITE_BEHIND_INTERVAL', 0.5)),
+        )
+        quiz_writer = WriteBehindQueue(db.quiz_submissions, **options)
+        quiz_writer.start()
+        result_writer = UpsertBehindQueue(db.user_results, **options)
+        result_writer.start()
+
+    rollups = RollupAggregator(db.quiz_rollups, flush_interval=ANALYTICS_FLUSH_INTERVAL)
+    rollups.start()
+    rollup_backfill = RollupBackfill(
+        db.quiz_submissions, db.quiz_rollups, stored_match_count, match_fields=QUIZ_FIELDS,
+        chunk_size=int(os.environ.get('ROLLUP_BACKFILL_CHUNK', 1000)),
+        aggregator=rollups, drain=quiz_writer.drain if quiz_writer else None,
+    )
+
+    result_rematcher = ResultRematcher(
+        db.user_results, db.result_rematch_jobs, QUIZ_FIELDS,
+        chunk_size=int(os.environ.get('RESULT_REMATCH_CHUNK', 5000)),
+        lease=float(os.environ.get('RESULT_REMATCH_LEASE', 60)),
+    )
+    warm_up_task = asyncio.create_task(warm_up())
+
+async def stop_services():
+    if warm_up_task and not warm_up_task.done():
+        warm_up_task.cancel()
+        try:
+            await warm_up_task
+        except asyncio.CancelledError:
+            pass
+    if catalog_watcher:
+        await catalog_watcher.stop()
+    if rollup_backfill:
+        await rollup_backfill.stop()
+    if result_rematcher:
+        await result_rematcher.stop()
+    if quiz_writer:
+        await quiz_writer.stop()
+        await result_writer.stop()
+    if rollups:
+        await rollups.stop()
     client.close()
+    password_hasher.shutdown()
+
 import uvicorn
 
 if __name__ == "__main__":
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import mmap
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import orjson
+
+from catalog import CatalogError, CatalogSnapshot, EncodedBody
+from matching import EligibilityIndex
+from search import CompiledSearchIndex
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SCHEMECATALOG\x00v1'
+ALIGN = 64
+POINTER = 'CURRENT'
+FRAGMENTS = ('public_json', 'eligible_json', 'fallback_json')
+
+
+class FragmentTable:
+    """Read-only sequence of JSON fragments stored back to back in one
+    buffer; items are memoryview slices, so nothing is copied."""
+
+    __slots__ = ('buffer', 'offsets')
+
+    def __init__(self, buffer, offsets: np.ndarray):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position: int):
+        if not -len(self) <= position < len(self):
+            raise IndexError(position)
+        position %= len(self)
+        return self.buffer[int(self.offsets[position]):int(self.offsets[position + 1])]
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+
+def _pack(fragments) -> tuple:
+    offsets = np.zeros(len(fragments) + 1, dtype=np.int64)
+    np.cumsum([len(f) for f in fragments], out=offsets[1:])
+    return b''.join(fragments), offsets
+
+
+def snapshot_name(version: str) -> str:
+    return f"catalog-{version}.snap"
+
+
+def write_snapshot_file(snapshot: CatalogSnapshot, path: Path):
+    """Compile everything a CatalogSnapshot serves from into one file.
+
+    Layout: a 16-byte magic, then 64-byte aligned sections (the eligibility
+    and search index arrays, the scheme fragments back to back with their offsets, the
+    encoded catalog bodies and the raw schemes), then a JSON header naming
+    every section's offset, dtype and shape, then the header's offset as a
+    little-endian u64.
+    """
+    arrays = dict(snapshot.index.arrays())
+    search, search_arrays = snapshot.search.compile(snapshot.ids)
+    arrays.update({f'search/{name}': array for name, array in search_arrays.items()})
+    blobs = {'schemes': orjson.dumps(list(snapshot.schemes))}
+    for name in FRAGMENTS:
+        blobs[name], arrays[f'{name}/offsets'] = _pack(getattr(snapshot, name))
+    for coding, body in snapshot.catalog_body.bodies.items():
+        blobs[f'catalog_body/{coding}'] = body
+
+    header = {'version': snapshot.version, 'index': snapshot.index.meta(), 'search': search, 'arrays': {}, 'blobs': {}}
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+
+        def section(data) -> int:
+            f.write(b'\0' * (-f.tell() % ALIGN))
+            offset = f.tell()
+            f.write(data)
+            return offset
+
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            header['arrays'][name] = [section(array.data), array.dtype.str, list(array.shape)]
+        for name, blob in blobs.items():
+            header['blobs'][name] = [section(blob), len(blob)]
+        offset = section(orjson.dumps(header))
+        f.write(offset.to_bytes(8, 'little'))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def load_snapshot(path: Path) -> CatalogSnapshot:
+    """Map a snapshot file read-only and build a CatalogSnapshot over it.
+
+    Index arrays are numpy views and fragments memoryviews of the mapping,
+    so every worker mapping the same file shares one copy in the page
+    cache. The raw schemes are parsed only if something asks for them;
+    files written before the search index was compiled in still need
+    them, to build one.
+    """
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(mapped) < len(MAGIC) + 8 or mapped[:len(MAGIC)] != MAGIC:
+        raise CatalogError(f"{path} is not a catalog snapshot")
+    buffer = memoryview(mapped)
+    header = orjson.loads(buffer[int.from_bytes(mapped[-8:], 'little'):-8])
+
+    arrays = {}
+    for name, (offset, dtype, shape) in header['arrays'].items():
+        count = int(np.prod(shape, dtype=np.int64))
+        arrays[name] = np.frombuffer(mapped, dtype=np.dtype(dtype), count=count, offset=offset).reshape(shape)
+    blobs = {name: buffer[offset:offset + length] for name, (offset, length) in header['blobs'].items()}
+
+    schemes = None
+    if 'rule_eligibility' not in header['index'] or 'search' not in header:
+        schemes = orjson.loads(blobs['schemes'])
+    index = EligibilityIndex.from_arrays(schemes, header['index'], arrays)
+    search = None
+    if 'search' in header:
+        search_arrays = {name.partition('/')[2]: array for name, array in arrays.items() if name.startswith('search/')}
+        search = CompiledSearchIndex(index.ids, header['search'], search_arrays)
+    fragments = [FragmentTable(blobs[name], arrays[f'{name}/offsets']) for name in FRAGMENTS]
+    bodies = {name.partition('/')[2]: blob for name, blob in blobs.items() if name.startswith('catalog_body/')}
+    return CatalogSnapshot.from_parts(
+        blobs['schemes'] if schemes is None else schemes, header['version'], index, search, *fragments, EncodedBody.from_bodies(bodies, header['version']))
+
+
+def read_pointer(directory: Path) -> tuple:
+    """(snapshot path, activation time) from CURRENT; the time is a Unix
+    timestamp, 0 when the snapshot is to be served right away."""
+    name, _, activate_at = (Path(directory) / POINTER).read_text().strip().partition('\n')
+    return Path(directory) / name.strip(), float(activate_at or 0)
+
+
+def current_snapshot(directory: Path) -> Path:
+    return read_pointer(directory)[0]
+
+
+def publish_snapshot(snapshot: CatalogSnapshot, directory: Path, keep: int = 3, activate_at: float = 0) -> Path:
+    """Compile a snapshot into `directory` and point CURRENT at it.
+
+    Both the file and the pointer are written aside and renamed into place,
+    so a reader sees the old snapshot or the new one, never a partial
+    write. Superseded files beyond the newest `keep` are deleted; workers
+    still mapping one keep their mapping until they swap.
+
+    With `activate_at`, followers load the snapshot as soon as they see it
+    but swap it in at that time, so they all change version together.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / snapshot_name(snapshot.version)
+    if not path.exists():
+        partial = directory / f".{path.name}.{os.getpid()}"
+        write_snapshot_file(snapshot, partial)
+        os.replace(partial, path)
+    pointer = directory / f".{POINTER}.{os.getpid()}"
+    pointer.write_text(f"{path.name}\n{activate_at}\n" if activate_at else path.name)
+    os.replace(pointer, directory / POINTER)
+    os.utime(path)
+
+    published = sorted(directory.glob('catalog-*.snap'), key=lambda p: p.stat().st_mtime_ns, reverse=True)
+    for old in published[keep:]:
+        try:
+            old.unlink()
+        except OSError:
+            pass
+    logger.info("Published scheme catalog %s to %s", snapshot.version, path)
+    return path
+
+
+class SnapshotFollower:
+    """Worker-side counterpart of CatalogWatcher: swaps in whichever
+    snapshot CURRENT names, checking every poll_interval seconds.
+
+    A snapshot published with an activation time is loaded ahead and
+    swapped in at that time, so workers that poll at different moments
+    still serve one catalog version (and one ETag) at a time.
+    """
+
+    def __init__(self, store, directory: Path, poll_interval: float = 1.0):
+        self.store = store
+        self.directory = Path(directory)
+        self.poll_interval = poll_interval
+        self._task = None
+
+    async def reload(self) -> bool:
+        path, activate_at = read_pointer(self.directory)
+        if path.name == snapshot_name(self.store.snapshot.version):
+            return False
+        snapshot = await asyncio.to_thread(load_snapshot, path)
+        delay = activate_at - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+            if read_pointer(self.directory)[0] != path:
+                # Superseded while waiting; the next poll picks up the newer one.
+                return False
+        self.store.swap(snapshot)
+        return True
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.reload()
+            except (CatalogError, OSError, ValueError) as e:
+                logger.error("Ignoring unreadable catalog snapshot: %s", e)
+            except Exception:
+                logger.exception("Catalog snapshot reload failed")
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
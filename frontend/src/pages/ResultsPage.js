@@ -13,17 +13,23 @@ const ResultsPage = () => {
   const [savedSchemes, setSavedSchemes] = useState(new Set());
   const [savingScheme, setSavingScheme] = useState(null);
 
-  const results = location.state;
+  const [results, setResults] = useState(location.state);
 
   useEffect(() => {
-    if (!results) {
-      navigate('/quiz');
-    }
+    if (results) return;
+    // Revisiting the page: show the latest stored results, re-checked
+    // against the current schemes, instead of asking for the quiz again.
+    const token = localStorage.getItem('token');
+    axios
+      .get(`${BACKEND_URL}/api/quiz/latest`, { headers: { Authorization: `Bearer ${token}` } })
+      .then((response) => setResults(response.data))
+      .catch(() => navigate('/quiz'));
   }, [results, navigate]);
 
   if (!results) return null;
 
-  const { eligible_schemes = [], fallback_schemes = [] } = results;
+  const { eligible_schemes = [], fallback_schemes = [], new_scheme_ids = [] } = results;
+  const newSchemes = new Set(new_scheme_ids);
   const allSchemes = [...eligible_schemes, ...fallback_schemes];
 
   const handleSave = async (schemeId) => {
@@ -114,6 +120,7 @@ const ResultsPage = () => {
                 <SchemeCard
                   key={scheme.id}
                   scheme={scheme}
+                  isNew={newSchemes.has(scheme.id)}
                   isSaved={savedSchemes.has(scheme.id)}
                   onSave={handleSave}
                   isSaving={savingScheme === scheme.id}
@@ -148,7 +155,7 @@ const ResultsPage = () => {
   );
 };
 
-const SchemeCard = ({ scheme, isSaved, onSave, isSaving, delay }) => {
+const SchemeCard = ({ scheme, isNew, isSaved, onSave, isSaving, delay }) => {
   return (
     <motion.div
       initial={{ opacity: 0, y: 20 }}
@@ -162,6 +169,11 @@ const SchemeCard = ({ scheme, isSaved, onSave, isSaving, delay }) => {
           Eligible
         </div>
       )}
+      {isNew && (
+        <div className="absolute top-0 left-0 bg-[#ea580c] text-white px-3 py-1 text-xs font-medium rounded-br-lg">
+          New
+        </div>
+      )}
       
       <div className="mb-4">
         <span className="inline-block bg-blue-100 text-[#1e3a8a] px-3 py-1 rounded-full text-sm font-medium mb-3">
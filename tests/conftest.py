@@ -0,0 +1,11 @@
+import os
+import sys
+from pathlib import Path
+
+# The backend is run from its own directory with flat imports.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+# Importing server builds a Motor client, which connects lazily; nothing
+# here talks to Mongo.
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
@@ -0,0 +1,35 @@
+import asyncio
+import time
+
+from benchmarks.memory_db import MemoryDatabase
+from cache import MemoryRevocationStore, MongoRevocationStore, TokenCache, token_digest
+
+
+def test_memory_revocations_expire_and_stay_bounded():
+    async def run():
+        store = MemoryRevocationStore(max_entries=3)
+        now = time.time()
+        for i in range(5):
+            await store.revoke(token_digest(f"token{i}"), now + 60 + i)
+        await store.revoke(token_digest("expired"), now - 1)
+        return store, [await store.is_revoked(token_digest(f"token{i}")) for i in range(5)]
+
+    store, revoked = asyncio.run(run())
+    # The soonest to expire are dropped first.
+    assert revoked == [False, False, True, True, True]
+    assert len(store) == 3
+
+
+def test_logout_reaches_every_process_sharing_the_store():
+    digest = token_digest("token")
+    payload = {'user_id': 'u1', 'exp': time.time() + 60}
+
+    async def run():
+        store = MongoRevocationStore(MemoryDatabase().revoked_tokens)
+        workers = [TokenCache(10, store), TokenCache(10, store)]
+        for cache in workers:
+            cache.put(digest, payload)
+        await workers[0].revoke(digest, payload['exp'])
+        return [await cache.is_revoked(digest) for cache in workers]
+
+    assert asyncio.run(run()) == [True, True]
@@ -0,0 +1,66 @@
+import random
+
+import pandas as pd
+import pytest
+
+import matching
+from benchmarks.synthetic import make_profiles, make_schemes
+from matching import EligibilityIndex
+from server import QUIZ_FIELDS, QuizSubmission, check_eligibility
+
+# Ages around the bounds make_schemes and make_rule draw from, plus the
+# extremes QuizSubmission accepts.
+AGES = [0, 13, 14, 15, 17, 18, 20, 21, 22, 24, 25, 26, 30, 31, 35, 36, 44, 45, 46, 58, 59, 60, 61, 65, 70, 71, 100, 150]
+
+
+def profiles(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [QuizSubmission(**{**p, 'age': rng.choice(AGES)}) for p in make_profiles(count, seed=seed)]
+
+
+def expected(quiz, schemes: list) -> list:
+    return [i for i, scheme in enumerate(schemes) if check_eligibility(quiz, scheme)]
+
+
+@pytest.mark.parametrize("seed, rules", [(1, 0.0), (2, 0.5), (3, 1.0)])
+def test_match_agrees_with_check_eligibility(seed, rules):
+    schemes = make_schemes(300, seed=seed, rules=rules)
+    index = EligibilityIndex(schemes)
+    for quiz in profiles(200, seed):
+        assert index.match(quiz) == expected(quiz, schemes)
+
+
+@pytest.mark.parametrize("seed, rules", [(4, 0.0), (5, 0.5)])
+def test_match_batch_agrees_with_check_eligibility(seed, rules):
+    schemes = make_schemes(300, seed=seed, rules=rules)
+    index = EligibilityIndex(schemes)
+    quizzes = profiles(200, seed)
+    frame = pd.DataFrame([q.model_dump() for q in quizzes], columns=QUIZ_FIELDS)
+    for quiz, (eligible, _) in zip(quizzes, index.match_batch(frame, fallback=0)):
+        assert eligible == expected(quiz, schemes)
+
+
+def test_match_batch_reuses_results_across_chunks(monkeypatch):
+    # Chunks of 7 rows, and recent results holding about 2000 positions.
+    monkeypatch.setattr(matching, 'BATCH_CELLS', 300 * 7)
+    index = EligibilityIndex(make_schemes(300, seed=9, rules=0.5))
+    pool = profiles(30, 9)
+    quizzes = random.Random(9).choices(pool, k=300)
+    frame = pd.DataFrame([q.model_dump() for q in quizzes], columns=QUIZ_FIELDS)
+    assert list(index.match_batch(frame)) == [index.match_with_fallback(q) for q in quizzes]
+
+
+@pytest.mark.parametrize("seed, rules", [(6, 0.0), (7, 0.5), (8, 1.0)])
+def test_reevaluate_agrees_with_check_eligibility(seed, rules):
+    rng = random.Random(seed)
+    schemes = make_schemes(300, seed=seed, rules=rules)
+    index = EligibilityIndex(schemes)
+    quizzes = profiles(300, seed)
+    for before, other in zip(quizzes, reversed(quizzes)):
+        changed = rng.sample(QUIZ_FIELDS, rng.randint(1, 3))
+        after = QuizSubmission(**{**before.model_dump(), **{f: getattr(other, f) for f in changed}})
+        eligible = index.match(before)
+        added, removed = index.reevaluate(before, after, eligible)
+        assert not set(added) & set(eligible)
+        assert set(removed) <= set(eligible)
+        assert sorted(set(eligible) - set(removed) | set(added)) == expected(after, schemes)
@@ -0,0 +1,61 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.synthetic import INCOMES, RULE_VOCABULARY, make_rule, make_schemes
+from rules import compile_rules, evaluate, parse_rule, scheme_rule
+from server import check_eligibility
+
+
+def quizzes(rng: random.Random, count: int) -> list:
+    return [SimpleNamespace(age=rng.randint(0, 100), **{f: rng.choice(v) for f, v in RULE_VOCABULARY.items()})
+            for _ in range(count)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_compiled_rules_agree_with_evaluate(seed):
+    rng = random.Random(seed)
+    rules = [make_rule(rng, depth=4) for _ in range(200)]
+    predicates = compile_rules([parse_rule(rule) for rule in rules])
+    for quiz in quizzes(rng, 100):
+        for rule, predicate in zip(rules, predicates):
+            assert predicate(quiz) == evaluate(rule, quiz), rule
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_simplified_scheme_rules_agree_where_flat_criteria_hold(seed):
+    rng = random.Random(seed)
+    ruled = make_schemes(300, seed=seed, rules=1.0)
+    predicates = compile_rules([scheme_rule(s) for s in ruled])
+    # Simplification may drop tests the scheme's flat criteria already
+    # decide, so compare only where those criteria pass.
+    flat = [{**s, 'eligibility': {k: v for k, v in s['eligibility'].items() if k != 'rule'}} for s in ruled]
+    for quiz in quizzes(rng, 100):
+        for scheme, flat_scheme, predicate in zip(ruled, flat, predicates):
+            if check_eligibility(quiz, flat_scheme):
+                assert predicate(quiz) == evaluate(scheme['eligibility']['rule'], quiz)
+
+
+def test_income_ranges_follow_brackets():
+    rule = {"field": "income", "max": 300_000}
+    predicate, = compile_rules([parse_rule(rule)])
+    accepted = [income for income in INCOMES if predicate(SimpleNamespace(income=income))]
+    assert accepted == [income for income in INCOMES if evaluate(rule, SimpleNamespace(income=income))]
+    assert accepted == INCOMES[:2]
+
+
+@pytest.mark.parametrize("rule", [
+    {},
+    {"all": {"field": "state", "in": ["Kerala"]}},
+    {"any": [], "all": []},
+    {"xor": []},
+    {"field": "state", "min": 3},
+    {"field": "age", "in": ["18"]},
+    {"field": "state", "in": "Kerala"},
+    {"field": "age"},
+    "state == Kerala",
+])
+def test_parse_rule_rejects_malformed_rules(rule):
+    with pytest.raises(ValueError):
+        parse_rule(rule)
@@ -0,0 +1,66 @@
+import random
+
+from benchmarks.synthetic import WORDS, make_schemes
+from search import SearchIndex
+
+QUERIES = ["farmer pension", "women health insurance", "student scholar", "rural housing lo", "p", "sk"]
+
+
+def build(schemes) -> SearchIndex:
+    index = SearchIndex()
+    index.update(schemes)
+    return index
+
+
+def results(index: SearchIndex) -> list:
+    return [index.search(q, limit=1000) for q in QUERIES]
+
+
+def hits(index: SearchIndex) -> list:
+    return [(sorted(i for i, _ in found), suggestions) for found, suggestions in results(index)]
+
+
+def edits(rng: random.Random, schemes: list, longer: bool = False) -> list:
+    changed = [dict(s) for s in schemes if rng.random() > 0.05]
+    if longer:
+        # Enough to move the average length past AVGDL_DRIFT.
+        changed = [{**s, 'description': s['description'] + ' ' + ' '.join(rng.sample(WORDS, 8))} for s in changed]
+    for scheme in rng.sample(changed, 20):
+        scheme['description'] += f" and {rng.choice(WORDS)}"
+    return changed + [{**s, 'id': f"new_{rng.random()}"} for s in make_schemes(10, seed=rng.randint(0, 999))]
+
+
+def test_updating_a_copy_leaves_the_original_serving():
+    rng = random.Random(3)
+    schemes = make_schemes(500)
+    live, in_place = build(schemes), build(schemes)
+    # Enough rounds of removals to compact the document numbers.
+    for round in range(30):
+        before = results(live)
+        schemes = edits(rng, schemes, longer=round == 10)
+        updated = live.copy()
+        assert updated.update(schemes) == in_place.update(schemes)
+        assert results(live) == before
+        assert results(updated) == results(in_place)
+        # Impacts are renormalized only once the average length drifts, so
+        # scores may differ from a fresh build but the hits may not.
+        assert hits(updated) == hits(build(schemes))
+        live = updated
+
+
+def test_hindi_and_english_queries_find_each_other():
+    index = build([
+        {"id": "a", "name": "Old Age Pension Scheme", "description": "Monthly pension for seniors"},
+        {"id": "b", "name": "Post Matric Scholarship", "description": "Scholarships for students"},
+        {"id": "c", "name": "वृद्धावस्था पेंशन योजना", "description": "बुजुर्गों के लिए पेंशन"},
+        {"id": "d", "name": "Kisan Credit Card", "description": "Loans for farmers"},
+    ])
+
+    def found(query):
+        return sorted(i for i, _ in index.search(query)[0])
+
+    assert found("पेंशन") == found("pension") == ["a", "c"]
+    assert found("छात्रवृत्ति") == found("scholarship") == ["b"]
+    assert found("स्कॉलरशिप") == ["b"]
+    assert found("किसान") == found("farmer") == ["d"]
+    assert found("pension ") == ["a", "c"]
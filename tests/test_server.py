@@ -0,0 +1,96 @@
+import json
+
+import pandas as pd
+import pytest
+from fastapi import Request
+from fastapi.testclient import TestClient
+from pymongo.errors import BulkWriteError
+
+import server
+from benchmarks.memory_db import MemoryDatabase
+from benchmarks.synthetic import make_profiles
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(server, 'db', MemoryDatabase())
+    return TestClient(server.app)
+
+
+def auth(user_id: str = 'user-1') -> dict:
+    return {'Authorization': f"Bearer {server.create_token(user_id, f'{user_id}@example.com')}"}
+
+
+def test_expired_result_token_is_refused_even_when_cached(client, monkeypatch):
+    quiz = make_profiles(1)[0]
+    token = client.post('/api/quiz/submit?ids_only=true', json=quiz, headers=auth()).json()['result_token']
+    changes = {'age': quiz['age'] + 1}
+    response = client.post('/api/quiz/reevaluate?ids_only=true', json={'result_token': token, 'changes': changes}, headers=auth())
+    assert response.status_code == 200
+
+    # Still cached, but a day later.
+    exp = server.result_tokens.get(token)[4]
+    monkeypatch.setattr(server.time, 'time', lambda: exp + 1)
+    response = client.post('/api/quiz/reevaluate?ids_only=true', json={'result_token': token, 'changes': changes}, headers=auth())
+    assert response.status_code == 404
+    assert server.result_tokens.get(token) is None
+
+
+def test_batch_results_follow_input_row_order(client):
+    rows = make_profiles(6)
+    for row in (rows[1], rows[4]):
+        row['age'] = 'unknown'
+    upload = pd.DataFrame(rows, columns=server.QUIZ_FIELDS).to_csv(index=False).encode()
+    response = client.post('/api/quiz/batch', files={'file': ('quiz.csv', upload)}, headers=auth())
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line['row'] for line in lines] == list(range(6))
+    assert [i for i, line in enumerate(lines) if 'error' in line] == [1, 4]
+
+
+@pytest.mark.parametrize("cursor", ["%%%", "not base64!", "_w", "a"])
+def test_malformed_saved_schemes_cursor_is_a_400(client, cursor):
+    response = client.get('/api/schemes/saved', params={'cursor': cursor}, headers=auth())
+    assert response.status_code == 400
+
+
+def test_saved_batch_reports_a_status_per_item(client, monkeypatch):
+    monkeypatch.setitem(server.readiness, 'indexes', True)
+    first, second, third = server.catalog_store.snapshot.ids[:3]
+    operations = [
+        {'op': 'add', 'scheme_id': first},
+        {'op': 'remove', 'scheme_id': first},
+        {'op': 'add', 'scheme_id': 'no-such-scheme'},
+        {'op': 'add', 'scheme_id': second},
+        {'op': 'remove', 'scheme_id': third},
+        {'op': 'add', 'scheme_id': first},
+    ]
+    response = client.post('/api/schemes/saved:batch', json={'operations': operations}, headers=auth())
+    assert [r['status'] for r in response.json()['results']] == [
+        'superseded', 'superseded', 'unknown_scheme', 'saved', 'not_saved', 'saved']
+
+    operations = [{'op': 'add', 'scheme_id': first}, {'op': 'remove', 'scheme_id': second}, {'op': 'add', 'scheme_id': third}]
+    bulk_write = server.db.saved_schemes.bulk_write
+
+    async def lose_race(requests, ordered):
+        # Another request saves `third` between our find and our upsert.
+        await bulk_write(requests[:2], ordered=ordered)
+        raise BulkWriteError({'writeErrors': [{'index': 2, 'code': 11000, 'errmsg': 'duplicate key'}], 'upserted': []})
+
+    monkeypatch.setattr(server.db.saved_schemes, 'bulk_write', lose_race)
+    response = client.post('/api/schemes/saved:batch', json={'operations': operations}, headers=auth())
+    assert [r['status'] for r in response.json()['results']] == ['already_saved', 'removed', 'already_saved']
+
+
+@pytest.mark.parametrize("trusted, forwarded, expected", [
+    (0, '203.0.113.9', '10.0.0.2'),
+    (1, '203.0.113.9', '203.0.113.9'),
+    (1, '198.51.100.7, 203.0.113.9', '203.0.113.9'),
+    (2, '198.51.100.7, 203.0.113.9, 10.0.0.1', '203.0.113.9'),
+    (2, '203.0.113.9', '10.0.0.2'),
+    (1, '', '10.0.0.2'),
+])
+def test_client_ip_trusts_only_the_configured_proxies(monkeypatch, trusted, forwarded, expected):
+    monkeypatch.setattr(server, 'AUTH_TRUSTED_PROXIES', trusted)
+    request = Request({'type': 'http', 'headers': [(b'x-forwarded-for', forwarded.encode())],
+                       'client': ('10.0.0.2', 50000)})
+    assert server.client_ip(request) == expected
@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_profiles, make_schemes
+from catalog import CatalogSnapshot, CatalogStore
+from server import QuizSubmission
+from snapshot_file import SnapshotFollower, load_snapshot, publish_snapshot, read_pointer, write_snapshot_file
+
+
+def test_snapshot_round_trip(tmp_path):
+    snapshot = CatalogSnapshot(make_schemes(200, rules=0.5))
+    path = tmp_path / 'catalog.snap'
+    write_snapshot_file(snapshot, path)
+    loaded = load_snapshot(path)
+
+    assert loaded.version == snapshot.version
+    assert loaded.schemes == snapshot.schemes
+    assert loaded.ids == snapshot.ids
+    for name in ('public_json', 'eligible_json', 'fallback_json'):
+        assert [bytes(f) for f in getattr(loaded, name)] == list(getattr(snapshot, name))
+    assert {k: bytes(v) for k, v in loaded.catalog_body.bodies.items()} == snapshot.catalog_body.bodies
+
+    for name, array in snapshot.index.arrays().items():
+        assert np.array_equal(loaded.index.arrays()[name], array), name
+    quizzes = [QuizSubmission(**p) for p in make_profiles(100)]
+    for before, after in zip(quizzes, reversed(quizzes)):
+        eligible = snapshot.index.match(before)
+        assert loaded.index.match(before) == eligible
+        assert loaded.index.reevaluate(before, after, eligible) == snapshot.index.reevaluate(before, after, eligible)
+
+
+def test_snapshot_search_matches_the_live_index(tmp_path):
+    first = CatalogSnapshot(make_schemes(300, seed=3))
+    schemes = [s for s in make_schemes(300, seed=4) if not s['id'].endswith('7')]
+    # An updated copy still holds slots for the removed schemes.
+    snapshot = CatalogSnapshot(schemes, previous=first)
+    write_snapshot_file(snapshot, tmp_path / 'catalog.snap')
+    loaded = load_snapshot(tmp_path / 'catalog.snap')
+    assert 'schemes' not in vars(loaded)
+
+    for query in ("farmer pension", "women health insurance", "student scholar", "rural housing lo", "p", "sk"):
+        live, live_suggestions = snapshot.search.search(query, limit=1000)
+        found, suggestions = loaded.search.search(query, limit=1000)
+        assert sorted(found) == sorted(live), query
+        assert suggestions == live_suggestions, query
+    assert 'schemes' not in vars(loaded)
+
+
+def test_follower_swaps_at_activation_time(tmp_path):
+    first = CatalogSnapshot(make_schemes(20, seed=1))
+    second = CatalogSnapshot(make_schemes(20, seed=2))
+    publish_snapshot(first, tmp_path)
+    assert read_pointer(tmp_path)[1] == 0
+    store = CatalogStore(load_snapshot(read_pointer(tmp_path)[0]))
+
+    activate_at = time.time() + 0.3
+    publish_snapshot(second, tmp_path, activate_at=activate_at)
+    assert read_pointer(tmp_path) == (tmp_path / f"catalog-{second.version}.snap", activate_at)
+
+    assert asyncio.run(SnapshotFollower(store, tmp_path).reload())
+    assert time.time() >= activate_at
+    assert store.snapshot.version == second.version